@@ -0,0 +1,36 @@
+import scgenome.synthetic
+import scgenome.snpdata
+
+
+class AlleleInference(object):
+    """ Time and peak memory of inferring clone allele specific copy number.
+    """
+    params = [100, 1000]
+    param_names = ['num_cells']
+    timeout = 600
+
+    bin_size = 500000
+
+    def setup(self, num_cells):
+        cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+            num_cells=num_cells, bin_size=self.bin_size, num_clones=5, seed=num_cells)
+        allele_data = scgenome.synthetic.simulate_allele_data(cn_data, seed=num_cells)
+
+        self.clone_cn_data = (
+            cn_data.merge(clusters)
+            .groupby(['chr', 'start', 'end', 'cluster_id'])['state']
+            .median().astype(int).rename('integer_copy_number').reset_index())
+
+        self.hap_data = scgenome.snpdata.calculate_cluster_allele_counts(
+            allele_data, clusters, self.bin_size).rename(columns={
+                'chromosome': 'chr',
+                'total': 'total_counts_sum',
+                'allele_1': 'allele_1_sum',
+                'allele_2': 'allele_2_sum',
+            })
+
+    def time_infer_allele_cn(self, num_cells):
+        scgenome.snpdata.infer_allele_cn(self.clone_cn_data, self.hap_data)
+
+    def peakmem_infer_allele_cn(self, num_cells):
+        scgenome.snpdata.infer_allele_cn(self.clone_cn_data, self.hap_data)
@@ -0,0 +1,33 @@
+import scgenome.synthetic
+import scgenome.cnmatrix
+import scgenome.cnclones
+import scgenome.cncluster
+
+
+class CloneInference(object):
+    """ Time and peak memory of clustering cells and comparing cells to clones.
+    """
+    params = [100, 1000]
+    param_names = ['num_cells']
+    timeout = 600
+
+    def setup(self, num_cells):
+        self.cn_data, self.clusters = scgenome.synthetic.simulate_cn_data(
+            num_cells=num_cells, num_clones=5, seed=num_cells)
+        self.cn = scgenome.cnmatrix.get_cn_matrix(self.cn_data)
+
+    def time_calculate_cell_clone_distances(self, num_cells):
+        scgenome.cnclones.calculate_cell_clone_distances(self.cn, self.clusters, None)
+
+    def peakmem_calculate_cell_clone_distances(self, num_cells):
+        scgenome.cnclones.calculate_cell_clone_distances(self.cn, self.clusters, None)
+
+    def time_kmeans_cluster(self, num_cells):
+        scgenome.cncluster.kmeans_cluster(self.cn, max_k=10)
+
+    def peakmem_kmeans_cluster(self, num_cells):
+        scgenome.cncluster.kmeans_cluster(self.cn, max_k=10)
+
+    def time_get_cn_matrix(self, num_cells):
+        scgenome.cnmatrix.get_cn_matrix(self.cn_data)
+
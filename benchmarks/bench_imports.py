@@ -0,0 +1,11 @@
+class ImportTime(object):
+    """ Time of importing modules in a fresh interpreter.
+    """
+    def timeraw_import_loaders_qc(self):
+        return 'import scgenome.loaders.qc'
+
+    def timeraw_import_cnplot(self):
+        return 'import scgenome.cnplot'
+
+    def timeraw_refgenome_info(self):
+        return 'import scgenome.refgenome; scgenome.refgenome.info'
@@ -0,0 +1,43 @@
+import os
+
+import scgenome.synthetic
+import scgenome.loaders.qc
+import scgenome.loaders.snv
+
+
+num_cells_params = [100, 1000]
+
+
+class LoadResults(object):
+    """ Time and peak memory of loading synthetic qc and pseudobulk results.
+    """
+    params = num_cells_params
+    param_names = ['num_cells']
+    timeout = 600
+
+    def setup_cache(self):
+        results_dirs = {}
+        for num_cells in num_cells_params:
+            results_dir = os.path.abspath(f'synthetic_{num_cells}')
+            scgenome.synthetic.generate_results(
+                results_dir, num_cells=num_cells, num_snvs=10 * num_cells, seed=num_cells)
+            results_dirs[num_cells] = results_dir
+        return results_dirs
+
+    def time_load_qc_data(self, results_dirs, num_cells):
+        scgenome.loaders.qc.load_qc_data(results_dirs[num_cells])
+
+    def peakmem_load_qc_data(self, results_dirs, num_cells):
+        scgenome.loaders.qc.load_qc_data(results_dirs[num_cells])
+
+    def time_load_qc_data_compact(self, results_dirs, num_cells):
+        scgenome.loaders.qc.load_qc_data(results_dirs[num_cells], memory_profile='compact')
+
+    def peakmem_load_qc_data_compact(self, results_dirs, num_cells):
+        scgenome.loaders.qc.load_qc_data(results_dirs[num_cells], memory_profile='compact')
+
+    def time_load_snv_data(self, results_dirs, num_cells):
+        scgenome.loaders.snv.load_snv_data(results_dirs[num_cells])
+
+    def peakmem_load_snv_data(self, results_dirs, num_cells):
+        scgenome.loaders.snv.load_snv_data(results_dirs[num_cells])
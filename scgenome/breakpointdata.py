@@ -5,8 +5,6 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 
-import wgs_analysis.plots.rearrangement
-
 
 def get_index_cols(is_lumpy=False):
     if is_lumpy:
@@ -125,6 +123,9 @@ def filter_breakpoint_data(
 def plot_library_portrait(breakpoint_data, figures_prefix=None):
     """ Plot a library level portrait of breakpoint features.
     """
+    import wgs_analysis.plots.rearrangement
+    import wgs_analysis.plots.snv
+    import wgs_analysis.annotation.position
 
     breakpoint_data['log_num_reads'] = np.log10(breakpoint_data['num_reads'].astype(float))
     breakpoint_data['log_num_split'] = np.log10(breakpoint_data['num_split'].astype(float))
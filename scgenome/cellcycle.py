@@ -1,11 +1,11 @@
 import pickle
-import pkg_resources
+import importlib.resources
 import scipy.stats
 import numpy as np
 import pandas as pd
 
 
-classifier_filename = pkg_resources.resource_filename('scgenome', 'data/cell_state_classifier')
+classifier_filename = str(importlib.resources.files('scgenome').joinpath('data/cell_state_classifier'))
 
     
 def predict(cn_data):
@@ -1,7 +1,7 @@
 import logging
+import concurrent.futures
 import scipy.stats
-import seaborn
-import umap
+import scipy.spatial.distance
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -9,99 +9,156 @@ import matplotlib.pyplot as plt
 import scgenome.cncluster
 import scgenome.cnplot
 import scgenome.cnfilter
+import scgenome.cnmatrix
 
 
-def calculate_umap_hdbscan_clones(cn_data, metrics_data, results_prefix=None):
-    """ Cluster copy number data.
+def _get_embedding_cache(results_prefix):
+    """ Directory of cached umap embeddings next to results.
     """
-    logging.info('creating copy number matrix')
-    cn = (
-        cn_data
-            .set_index(['chr', 'start', 'end', 'cell_id'])['copy']
-            .unstack(level='cell_id').fillna(0)
-    )
+    if results_prefix is None:
+        return None
+    return results_prefix + 'umap_embeddings'
 
-    logging.info('clustering copy number')
-    clusters = scgenome.cncluster.umap_hdbscan_cluster(cn)
 
-    num_clusters = len(clusters['cluster_id'].unique())
+def _get_plot_filename(results_prefix, suffix):
+    """ Filename of a plot, or None if plots are not saved.
+    """
+    if results_prefix is None:
+        return None
+    return results_prefix + suffix
+
+
+def _should_plot(plots, results_prefix):
+    """ Whether to draw plots, which are only drawn when they can be saved.
+    """
+    if not plots:
+        return False
+
+    if results_prefix is None:
+        if isinstance(plots, scgenome.cnplot.DeferredPlots):
+            raise ValueError('deferred plots require a results prefix')
+        return False
+
+    return True
+
 
+def _plot_umap_clusters(clusters):
     fig = plt.figure(figsize=(4, 4))
-    scgenome.cncluster.plot_umap_clusters(plt.gca(), clusters)
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'cn_umap.pdf', bbox_inches='tight')
+    scgenome.cncluster.plot_umap_clusters(fig.gca(), clusters)
+    return fig
 
+
+def _plot_clone_sizes(clusters):
+    import seaborn
+
+    num_clusters = len(clusters['cluster_id'].unique())
     fig = plt.figure(figsize=(num_clusters/4, 4))
-    seaborn.barplot(x='cluster_id', y='count', data=clusters.groupby('cluster_id').size().rename('count').reset_index())
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'clone_size.pdf', bbox_inches='tight')
+    seaborn.barplot(ax=fig.gca(), x='cluster_id', y='count', data=clusters.groupby('cluster_id').size().rename('count').reset_index())
+    return fig
+
+
+def _plot_clone_sample_sizes(plot_data):
+    import seaborn
+
+    fig = plt.figure(figsize=(2, len(plot_data.columns)/4))
+    seaborn.heatmap(plot_data.T, annot=True, fmt="d", linewidths=.5, ax=fig.gca())
+    return fig
+
+
+def _plot_clusters(clusters, metrics_data, results_prefix, plots):
+    """ Plot umap embedding, clone sizes and clone sizes per sample.
+    """
+    if not _should_plot(plots, results_prefix):
+        return
+
+    plot_clusters = clusters[['cell_id', 'cluster_id', 'umap1', 'umap2']]
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'cn_umap.pdf'),
+        _plot_umap_clusters, plot_clusters)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'clone_size.pdf'),
+        _plot_clone_sizes, plot_clusters)
 
     plot_data = (clusters
         .merge(metrics_data[['cell_id', 'sample_id']].drop_duplicates())
         .groupby(['cluster_id', 'sample_id']).size().unstack(fill_value=0).T)
-    fig = plt.figure(figsize=(2, num_clusters/4))
-    seaborn.heatmap(plot_data.T, annot=True, fmt="d", linewidths=.5)
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'clone_sample_size.pdf', bbox_inches='tight')
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'clone_sample_size.pdf'),
+        _plot_clone_sample_sizes, plot_data)
+
+
+def calculate_umap_hdbscan_clones(cn_data, metrics_data, results_prefix=None, pca_components=None, plots=True):
+    """ Cluster copy number data.
+
+    Args:
+        cn_data (pandas.DataFrame or scgenome.cnmatrix.CNMatrix): copy number data
+        metrics_data (pandas.DataFrame): cell metrics
+
+    KwArgs:
+        results_prefix (str): prefix of plots and cached umap embeddings. Defaults to None.
+        pca_components (int): reduce to this many principal components before umap. Defaults to None.
+        plots (bool or scgenome.cnplot.DeferredPlots): draw plots, skip plots if False, or record plots
+            for drawing later. Plots are only drawn if results_prefix is given. Defaults to True.
+    """
+    logging.info('creating copy number matrix')
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data)
+
+    logging.info('clustering copy number')
+    clusters = scgenome.cncluster.umap_hdbscan_cluster(
+        cn, pca_components=pca_components, embedding_cache=_get_embedding_cache(results_prefix))
+
+    _plot_clusters(clusters, metrics_data, results_prefix, plots)
 
-    logging.info('merging clusters')
-    cn_data = cn_data.merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
+    if _should_plot(plots, results_prefix):
+        logging.info('merging clusters')
+        cn_data = scgenome.cnmatrix.get_cn_data(cn_data)
+        cn_data = cn_data.merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
 
-    plot_clones(cn_data, 'cluster_id', plots_prefix=results_prefix)
+        plot_clones(cn_data, 'cluster_id', plots_prefix=results_prefix, plots=plots)
 
     return clusters
 
 
-def calculate_kmeans_clones(cn_data, metrics_data, results_prefix=None):
+def calculate_kmeans_clones(cn_data, metrics_data, results_prefix=None, pca_components=None, plots=True):
     """ Cluster copy number data.
+
+    Args:
+        cn_data (pandas.DataFrame or scgenome.cnmatrix.CNMatrix): copy number data
+        metrics_data (pandas.DataFrame): cell metrics
+
+    KwArgs:
+        results_prefix (str): prefix of plots and cached umap embeddings. Defaults to None.
+        pca_components (int): reduce to this many principal components before umap. Defaults to None.
+        plots (bool or scgenome.cnplot.DeferredPlots): draw plots, skip plots if False, or record plots
+            for drawing later. Plots are only drawn if results_prefix is given. Defaults to True.
     """
     logging.info('creating copy number matrix')
-    cn = (
-        cn_data
-            .set_index(['chr', 'start', 'end', 'cell_id'])['copy']
-            .unstack(level='cell_id').fillna(0)
-    )
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data)
 
     logging.info('clustering copy number')
     clusters = scgenome.cncluster.kmeans_cluster(cn)
 
-    embedding = umap.UMAP(
-        n_neighbors=15,
-        min_dist=0.1,
-        n_components=2,
-        random_state=42,
-        metric='euclidean',
-    ).fit_transform(cn.fillna(0).values.T)
+    embedding = scgenome.cncluster.compute_umap_embedding(
+        cn.get_values('copy', fill_value=0, dtype=np.float64).T,
+        pca_components=pca_components,
+        embedding_cache=_get_embedding_cache(results_prefix),
+    )
 
     clusters = clusters.merge(pd.DataFrame({
-        'cell_id': cn.columns,
+        'cell_id': cn.cell_ids,
         'umap1': embedding[:, 0], 'umap2': embedding[:, 1]
     }))
 
-    num_clusters = len(clusters['cluster_id'].unique())
+    _plot_clusters(clusters, metrics_data, results_prefix, plots)
 
-    fig = plt.figure(figsize=(4, 4))
-    scgenome.cncluster.plot_umap_clusters(plt.gca(), clusters)
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'cn_umap.pdf', bbox_inches='tight')
+    if _should_plot(plots, results_prefix):
+        logging.info('merging clusters')
+        cn_data = scgenome.cnmatrix.get_cn_data(cn_data)
+        cn_data = cn_data.merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
 
-    fig = plt.figure(figsize=(num_clusters/4, 4))
-    seaborn.barplot(x='cluster_id', y='count', data=clusters.groupby('cluster_id').size().rename('count').reset_index())
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'clone_size.pdf', bbox_inches='tight')
-
-    plot_data = (clusters
-        .merge(metrics_data[['cell_id', 'sample_id']].drop_duplicates())
-        .groupby(['cluster_id', 'sample_id']).size().unstack(fill_value=0).T)
-    fig = plt.figure(figsize=(2, num_clusters/4))
-    seaborn.heatmap(plot_data.T, annot=True, fmt="d", linewidths=.5)
-    if results_prefix is not None:
-        fig.savefig(results_prefix + 'clone_sample_size.pdf', bbox_inches='tight')
-
-    logging.info('merging clusters')
-    cn_data = cn_data.merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
-
-    plot_clones(cn_data, 'cluster_id', plots_prefix=results_prefix)
+        plot_clones(cn_data, 'cluster_id', plots_prefix=results_prefix, plots=plots)
 
     return clusters
 
@@ -127,12 +184,41 @@ def breakpoint_filter(metrics_data, clusters, max_breakpoints, results_prefix):
     return clusters
 
 
+def _plot_cluster_distances(cluster_annotation, plot_metric):
+    import seaborn
+
+    g = seaborn.catplot(
+        x='cluster_id', y=plot_metric,
+        hue='is_original', kind='strip',
+        dodge=True, data=cluster_annotation, aspect=3)
+    return g.fig
+
+
+def _plot_clone_s_phase(s_plot_data):
+    import seaborn
+
+    fig = plt.figure(figsize=(6, 4))
+    ax = fig.add_subplot(211)
+    seaborn.barplot(ax=ax, x='clone', y='proportion', data=s_plot_data, color='0.5')
+    seaborn.despine(fig=fig)
+    ax = fig.add_subplot(212)
+    seaborn.barplot(ax=ax, x='clone', y='len', data=s_plot_data, color='0.5')
+    seaborn.despine(fig=fig)
+    fig.tight_layout()
+    return fig
+
+
 def finalize_clusters(
         cn_data, metrics_data, clusters, filter_metrics,
         cell_clone_distances, results_prefix,
         is_original_cluster_mean_threshold=0.5,
-        cluster_size_threshold=50):
+        cluster_size_threshold=50,
+        plots=True):
     """ Generate finalized filtered clusters
+
+    KwArgs:
+        plots (bool or scgenome.cnplot.DeferredPlots): draw plots, skip plots if False, or record plots
+            for drawing later. Plots are only drawn if results_prefix is given. Defaults to True.
     """
 
     # Calculate the cluster assignment based on correlation
@@ -150,11 +236,9 @@ def finalize_clusters(
     # Plot the cityblock distance distribution of each cluster separated
     # by whether the assigned cluster equals the correlation cluster
     plot_metric = 'cityblock'
-    g = seaborn.factorplot(
-        x='cluster_id', y=plot_metric,
-        hue='is_original', kind='strip',
-        dodge=True, data=cluster_annotation, aspect=3)
-    g.fig.savefig(results_prefix + 'cluster_cityblock_distance.pdf', bbox_inches='tight')
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'cluster_cityblock_distance.pdf'),
+        _plot_cluster_distances, cluster_annotation[['cluster_id', plot_metric, 'is_original']], plot_metric)
 
     # Calculate the proportion of each cluster that would be assigned to
     # that cluster by maximizing correlation
@@ -212,30 +296,29 @@ def finalize_clusters(
 
     # Plotting
     #
-    
+
+    metrics_data['is_s_phase'] = metrics_data['is_s_phase'].astype(bool)
+
+    if not _should_plot(plots, results_prefix):
+        return final_clusters
+
     # Plot final clusters heatmap
-    logging.info('plotting clusters to {}*'.format(results_prefix + 'final_'))
+    final_prefix = _get_plot_filename(results_prefix, 'final_')
+    logging.info('plotting clusters to {}*'.format(final_prefix))
     plot_cn_data = cn_data.merge(
         final_clusters[['cell_id', 'cluster_id']])
-    plot_clones(plot_cn_data, 'cluster_id', results_prefix + 'final_')
+    plot_clones(plot_cn_data, 'cluster_id', final_prefix, plots=plots)
 
     # Plot s phase proportions
-    metrics_data['is_s_phase'] = metrics_data['is_s_phase'].astype(bool)
     s_plot_data = (
         metrics_data
         .merge(final_clusters[['cell_id', 'cluster_id']].drop_duplicates())
         .groupby('cluster_id').agg({'is_s_phase': (np.sum, len, np.mean)}).reset_index())
     s_plot_data.columns = ['clone', 'sum', 'len', 'proportion']
 
-    fig = plt.figure(figsize=(6, 4))
-    ax = fig.add_subplot(211)
-    seaborn.barplot(ax=ax, x='clone', y='proportion', data=s_plot_data, color='0.5')
-    seaborn.despine()
-    ax = fig.add_subplot(212)
-    seaborn.barplot(ax=ax, x='clone', y='len', data=s_plot_data, color='0.5')
-    seaborn.despine()
-    plt.tight_layout()
-    fig.savefig(results_prefix + 'clone_s_phase.pdf', bbox_inches='tight')
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'clone_s_phase.pdf'),
+        _plot_clone_s_phase, s_plot_data)
 
     return final_clusters
 
@@ -258,98 +341,138 @@ def recalculate_distances(distance_metric, distance_method, clone_cn_matrix, cel
     return distances
 
 
-def calculate_cell_clone_distances(cn_data, clusters, results_prefix):
-    """ Calculate the distance to the closest clone for multiple metrics.
+def _standardize_rows(values):
+    """ Center and scale rows to unit norm, rows with zero variance become nan.
     """
+    values = values - values.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return values / np.where(norms > 0, norms, np.nan)
 
-    logging.info('Create clone copy number table')
-    clone_cn_data = (
-        cn_data
-            .merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
-            .groupby(['chr', 'start', 'end', 'cluster_id'])
-            .agg({'copy': np.mean, 'state': np.median})
-            .reset_index()
-    )
-    clone_cn_data['state'] = clone_cn_data['state'].round().astype(int)
 
-    logging.info('Create matrix of cn data for all cells')
-    cell_cn_matrix = (
-        cn_data
-            .set_index(['chr', 'start', 'end', 'cell_id'])['copy']
-            .unstack(level=['cell_id']).fillna(0)
-    )
+def _rank_rows(values):
+    return scipy.stats.rankdata(values, axis=1)
 
-    logging.info('Create a matrix of cn data for filtered clones')
-    clone_cn_matrix = (
-        clone_cn_data
-            .set_index(['chr', 'start', 'end', 'cluster_id'])['copy']
-            .unstack(level=['cluster_id']).fillna(0)
-    )
 
-    pearsonr_distances = recalculate_distances(
-        'pearsonr',
-        lambda u, v: 1. - scipy.stats.pearsonr(u, v)[0],
-        clone_cn_matrix,
-        cell_cn_matrix,
-    )
+def _correlation_distances(cell_values, clone_values):
+    return 1. - np.clip(cell_values @ clone_values.T, -1., 1.)
 
-    spearmanr_distances = recalculate_distances(
-        'spearmanr',
-        lambda u, v: 1. - scipy.stats.spearmanr(u, v)[0],
-        clone_cn_matrix,
-        cell_cn_matrix,
-    )
 
-    cityblock_distances = recalculate_distances(
-        'cityblock',
-        scipy.spatial.distance.cityblock,
-        clone_cn_matrix,
-        cell_cn_matrix,
-    )
+def _cityblock_distances(cell_values, clone_values):
+    return scipy.spatial.distance.cdist(cell_values, clone_values, metric='cityblock')
 
-    clone_cell_distances = pd.concat([
-        pearsonr_distances.set_index(['cell_id', 'cluster_id']),
-        spearmanr_distances.set_index(['cell_id', 'cluster_id']),
-        cityblock_distances.set_index(['cell_id', 'cluster_id']),
-    ], axis=1).reset_index()
 
-    return clone_cell_distances
+# Transform applied to rows of cell and clone matrices, and distance
+# computed between transformed cells and clones
+distance_metrics = {
+    'pearsonr': (_standardize_rows, _correlation_distances),
+    'spearmanr': (lambda values: _standardize_rows(_rank_rows(values)), _correlation_distances),
+    'cityblock': (lambda values: values, _cityblock_distances),
+}
 
 
-def plot_clones(cn_data, cluster_col, plots_prefix=None):
-    plot_data = cn_data.copy()
-    bin_filter = (plot_data['gc'] <= 0) | (plot_data['copy'].isnull())
-    plot_data.loc[bin_filter, 'state'] = 0
-    plot_data.loc[plot_data['copy'] > 5, 'copy'] = 5.
-    plot_data.loc[plot_data['copy'] < 0, 'copy'] = 0.
+def calculate_distance_matrices(cell_values, clone_values, metrics=tuple(distance_metrics), chunk_size=1000, max_workers=None):
+    """ Calculate distances between all cells and all clones for multiple metrics.
+
+    Args:
+        cell_values (numpy.ndarray): cells by bins matrix
+        clone_values (numpy.ndarray): clones by bins matrix
+
+    KwArgs:
+        metrics (list of str): metrics from distance_metrics. Defaults to all metrics.
+        chunk_size (int): number of cells per chunk, bounds memory of transformed cells. Defaults to 1000.
+        max_workers (int): number of threads for processing chunks, None or 1 for serial. Defaults to None.
+
+    Returns:
+        dict: numpy.ndarray of cells by clones distances keyed by metric
+    """
+    for metric in metrics:
+        if metric not in distance_metrics:
+            raise ValueError(f'unknown metric {metric}, expected one of {list(distance_metrics)}')
+
+    clone_values = np.asarray(clone_values, dtype=np.float64)
+    transformed_clone_values = {metric: distance_metrics[metric][0](clone_values) for metric in metrics}
+
+    def calculate_chunk(start):
+        chunk_values = np.asarray(cell_values[start:start + chunk_size], dtype=np.float64)
+        chunk_distances = {}
+        for metric in metrics:
+            transform, distance = distance_metrics[metric]
+            chunk_distances[metric] = distance(transform(chunk_values), transformed_clone_values[metric])
+        return chunk_distances
+
+    chunk_starts = range(0, cell_values.shape[0], chunk_size)
+
+    if max_workers is None or max_workers <= 1:
+        chunks = [calculate_chunk(start) for start in chunk_starts]
+
+    else:
+        # Matrix products and cdist release the GIL
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            chunks = list(executor.map(calculate_chunk, chunk_starts))
+
+    distances = {}
+    for metric in metrics:
+        distances[metric] = np.concatenate(
+            [chunk[metric] for chunk in chunks] + [np.zeros((0, clone_values.shape[0]))])
+
+    return distances
+
+
+def calculate_cell_clone_distances(cn_data, clusters, results_prefix, chunk_size=1000, max_workers=None):
+    """ Calculate the distance to the closest clone for multiple metrics.
+
+    Args:
+        cn_data (pandas.DataFrame or scgenome.cnmatrix.CNMatrix): copy number data
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    KwArgs:
+        chunk_size (int): number of cells per chunk. Defaults to 1000.
+        max_workers (int): number of threads for calculating distances. Defaults to None.
+
+    Returns:
+        pandas.DataFrame: pearsonr, spearmanr and cityblock distance for each cell_id and cluster_id
+    """
+
+    logging.info('Create matrix of cn data for all cells')
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data)
 
-    num_clusters = len(cn_data[cluster_col].unique())
+    logging.info('Create a matrix of cn data for filtered clones')
+    profiles = cn.get_clone_profiles(clusters)
+    cluster_ids = list(profiles.cell_ids)
+    clone_copy = profiles.get_values('copy', fill_value=0, dtype=np.float64).T
+
+    logging.info(f'Calculating distances for {cn.shape[1]} cells and {len(cluster_ids)} clones')
+    cell_copy = cn.get_values('copy', fill_value=0, dtype=np.float64).T
+    distances = calculate_distance_matrices(
+        cell_copy, clone_copy, chunk_size=chunk_size, max_workers=max_workers)
+
+    clone_cell_distances = pd.DataFrame({
+        'cell_id': np.repeat(np.asarray(cn.cell_ids), len(cluster_ids)),
+        'cluster_id': np.tile(np.array(cluster_ids), cn.shape[1]),
+    })
+    for metric, values in distances.items():
+        clone_cell_distances[metric] = values.ravel()
+
+    return clone_cell_distances
+
+
+def _plot_clone_cn_matrix(plot_data, cluster_col):
+    num_clusters = len(plot_data[cluster_col].unique())
     fig = plt.figure(figsize=(15, num_clusters/8))
     scgenome.cnplot.plot_cluster_cn_matrix(
         fig, plot_data, 'state', cluster_field_name=cluster_col)
-    if plots_prefix is not None:
-        fig.savefig(plots_prefix + 'clone_cn.pdf', bbox_inches='tight')
+    return fig
 
-    fig = plt.figure(figsize=(20, 30))
-    matrix_data = scgenome.cnplot.plot_clustered_cell_cn_matrix_figure(
-        fig, plot_data, 'copy', cluster_field_name=cluster_col, raw=True)
-    if plots_prefix is not None:
-        fig.savefig(plots_prefix + 'raw_cn.pdf', bbox_inches='tight')
 
+def _plot_cell_cn_matrix(plot_data, field, cluster_col, raw=False):
     fig = plt.figure(figsize=(20, 30))
-    matrix_data = scgenome.cnplot.plot_clustered_cell_cn_matrix_figure(
-        fig, plot_data, 'state', cluster_field_name=cluster_col)
-    if plots_prefix is not None:
-        fig.savefig(plots_prefix + 'cn_state.pdf', bbox_inches='tight')
-
-    clone_cn_data = (
-        cn_data
-            .groupby(['chr', 'start', 'end', 'cluster_id'])
-            .agg({'copy': np.mean, 'state': np.median})
-            .reset_index()
-    )
-    clone_cn_data['state'] = clone_cn_data['state'].astype(float).round().astype(int)
+    scgenome.cnplot.plot_clustered_cell_cn_matrix_figure(
+        fig, plot_data, field, cluster_field_name=cluster_col, raw=raw)
+    return fig
 
+
+def _plot_clone_cn_profiles(clone_cn_data):
     num_clusters = len(clone_cn_data['cluster_id'].unique())
     fig = plt.figure(figsize=(20, 4 * num_clusters))
     idx = 1
@@ -359,85 +482,252 @@ def plot_clones(cn_data, cluster_col, plots_prefix=None):
             ax, plot_data, 'copy', 'state')
         ax.set_ylabel(f'Clone {cluster_id} Total CN')
         idx += 1
-    if plots_prefix is not None:
-        fig.savefig(plots_prefix + 'total_cn_profiles.pdf', bbox_inches='tight')
+    return fig
 
 
-def calculate_mitotic_errors(
+def plot_clones(cn_data, cluster_col, plots_prefix=None, plots=True):
+    """ Plot clone and cell copy number heatmaps and clone copy number profiles.
+
+    Args:
+        cn_data (pandas.DataFrame): copy number table with cluster column
+        cluster_col (str): cluster column
+
+    KwArgs:
+        plots_prefix (str): prefix of saved plots, plots are skipped if None. Defaults to None.
+        plots (bool or scgenome.cnplot.DeferredPlots): draw plots, skip plots if False, or record plots
+            for drawing later. Defaults to True.
+    """
+    if not _should_plot(plots, plots_prefix):
+        return
+
+    plot_data = cn_data.copy()
+    bin_filter = (plot_data['gc'] <= 0) | (plot_data['copy'].isnull())
+    plot_data.loc[bin_filter, 'state'] = 0
+    plot_data.loc[plot_data['copy'] > 5, 'copy'] = 5.
+    plot_data.loc[plot_data['copy'] < 0, 'copy'] = 0.
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(plots_prefix, 'clone_cn.pdf'),
+        _plot_clone_cn_matrix, plot_data, cluster_col)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(plots_prefix, 'raw_cn.pdf'),
+        _plot_cell_cn_matrix, plot_data, 'copy', cluster_col, raw=True)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(plots_prefix, 'cn_state.pdf'),
+        _plot_cell_cn_matrix, plot_data, 'state', cluster_col)
+
+    clone_cn_data = scgenome.cnmatrix.get_clone_cn_data(
+        cn_data, cn_data[['cell_id', 'cluster_id']].drop_duplicates())
+    clone_cn_data['state'] = clone_cn_data['state'].astype(float).round().astype(int)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(plots_prefix, 'total_cn_profiles.pdf'),
+        _plot_clone_cn_profiles, clone_cn_data)
+
+
+def compute_mitotic_errors(
         cn_data,
         clusters,
-        results_prefix,
         chromosome_state_diff_threshold=0.75,
         include_y_chrom=False,
+        chunk_size=1000,
     ):
+    """ Identify chromosomes of each cell mis-segregated with respect to the cell's clone.
 
-    # Calculate raw and integer copy state per cluster
-    clone_cn_data = (
-    cn_data
-        .merge(clusters)
-        .groupby(['chr', 'start', 'end', 'cluster_id'])
-        .agg({'copy': np.mean, 'state': np.median})
-        .reset_index()
-    )
-    clone_cn_data['state'] = clone_cn_data['state'].round().astype(int)
-
-    # Create clone / cell cn table 
-    clone_cell_cn = cn_data.merge(clusters[['cell_id', 'cluster_id']])
-    clone_cell_cn = clone_cell_cn.merge(
-        clone_cn_data[['chr', 'start', 'end', 'cluster_id', 'state']].rename(columns={'state': 'clone_cn'}),
-        on=['chr', 'start', 'end', 'cluster_id'])
-    clone_cell_cn['state_diff'] = clone_cell_cn['state'] - clone_cell_cn['clone_cn']
-    clone_cell_cn['bin_size'] = clone_cell_cn['end'] - clone_cell_cn['start'] + 1
-
-    # Calculate proportion of each chromosome for each cell that has
-    # a different state from the clone (mean_diff)
-    size_state_diff = clone_cell_cn.set_index('state_diff', append=True).groupby(['chr', 'cell_id', 'state_diff'])['bin_size'].sum().rename('state_size').reset_index()
-    size_total = clone_cell_cn.groupby(['chr', 'cell_id'])['bin_size'].sum().astype(float).rename('total_size').reset_index()
-    mean_state_diff = size_state_diff.merge(size_total)
+    The size of each chromosome in each cell at each difference between the cell
+    state and the clone consensus state is computed with a weighted bincount over
+    the bins by cells state matrix, in chunks of cells.
+
+    Args:
+        cn_data (pandas.DataFrame or CNMatrix): copy number data
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    KwArgs:
+        chromosome_state_diff_threshold (float): minimum proportion of a chromosome at a state difference
+        include_y_chrom (bool): include the Y chromosome
+        chunk_size (int): number of cells per chunk
+
+    Returns:
+        pandas.DataFrame: table with columns chr, cell_id, state_diff, state_size, total_size, mean_diff
+    """
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data, fields=('copy', 'state'))
+
+    # Integer copy state per cluster
+    profiles = cn.get_clone_profiles(clusters)
+    clone_state = np.round(profiles.data['state'])
+
+    cell_clusters = clusters[['cell_id', 'cluster_id']].drop_duplicates()
+    cell_clusters = cell_clusters[cell_clusters['cell_id'].isin(cn.cell_ids)]
+    cell_idx = cn.cell_ids.get_indexer(cell_clusters['cell_id'])
+    clone_idx = profiles.cell_ids.get_indexer(cell_clusters['cluster_id'])
+
+    chromosomes = cn.bins['chr'].cat.categories
+    chr_codes = cn.bins['chr'].cat.codes.values.astype(np.int64)
+    bin_size = (cn.bins['end'] - cn.bins['start'] + 1).values.astype(np.int64)
+    num_chr = len(chromosomes)
+
+    cell_state = cn.get_values('state', dtype=np.float64)
+
+    # Size of each chromosome with data per cell, summed over the cell's clusters
+    total_size = np.zeros((num_chr, cn.shape[1]))
+
+    chr_sizes = []
+    for chunk_start in range(0, len(cell_idx), chunk_size):
+        chunk_cells = cell_idx[chunk_start:chunk_start + chunk_size]
+        chunk_clones = clone_idx[chunk_start:chunk_start + chunk_size]
+        num_chunk_cells = len(chunk_cells)
+
+        state_diff = cell_state[:, chunk_cells] - clone_state[:, chunk_clones]
+        bin_idx, col_idx = np.nonzero(~np.isnan(state_diff))
+        state_diff = state_diff[bin_idx, col_idx].astype(np.int64)
+        if len(state_diff) == 0:
+            continue
+
+        # Size of each chromosome at each state difference per cell,
+        # keyed by chromosome, cell and offset state difference
+        min_diff = state_diff.min()
+        num_diffs = state_diff.max() - min_diff + 1
+        chr_cell = chr_codes[bin_idx] * num_chunk_cells + col_idx
+        key = chr_cell * num_diffs + (state_diff - min_diff)
+        state_size = np.bincount(
+            key, weights=bin_size[bin_idx], minlength=num_chr * num_chunk_cells * num_diffs)
+
+        chunk_total = np.bincount(
+            chr_cell, weights=bin_size[bin_idx], minlength=num_chr * num_chunk_cells)
+        np.add.at(total_size, (slice(None), chunk_cells), chunk_total.reshape(num_chr, num_chunk_cells))
+
+        key = np.flatnonzero(state_size)
+        chr_cell = key // num_diffs
+        chr_sizes.append(pd.DataFrame({
+            'chr': chr_cell // num_chunk_cells,
+            'cell': chunk_cells[chr_cell % num_chunk_cells],
+            'state_diff': key % num_diffs + min_diff,
+            'state_size': state_size[key].astype(np.int64),
+        }))
+
+    if len(chr_sizes) > 0:
+        mean_state_diff = pd.concat(chr_sizes, ignore_index=True)
+    else:
+        mean_state_diff = pd.DataFrame({col: np.zeros(0, dtype=np.int64) for col in ('chr', 'cell', 'state_diff', 'state_size')})
+
+    # Cells assigned to multiple clusters have one row per chromosome and state difference
+    if len(np.unique(cell_idx)) < len(cell_idx):
+        mean_state_diff = mean_state_diff.groupby(['chr', 'cell', 'state_diff'], as_index=False)['state_size'].sum()
+
+    mean_state_diff['total_size'] = total_size[mean_state_diff['chr'].values, mean_state_diff['cell'].values]
+    mean_state_diff['total_size'] = mean_state_diff['total_size'].astype(float)
     mean_state_diff['mean_diff'] = mean_state_diff['state_size'] / mean_state_diff['total_size']
 
+    mean_state_diff = mean_state_diff.sort_values(['chr', 'cell', 'state_diff'])
+    mean_state_diff.insert(0, 'chr', np.asarray(chromosomes)[mean_state_diff.pop('chr').values.astype(np.int64)])
+    mean_state_diff.insert(1, 'cell_id', np.asarray(cn.cell_ids)[mean_state_diff.pop('cell').values.astype(np.int64)])
+    mean_state_diff = mean_state_diff.reset_index(drop=True)
+
     # Filtering and threshold at 0.75 of a chromosome as a mis-segregation
     if not include_y_chrom:
         mean_state_diff = mean_state_diff[mean_state_diff['chr'] != 'Y']
     mean_state_diff = mean_state_diff[mean_state_diff['state_diff'] != 0]
     mean_state_diff = mean_state_diff[mean_state_diff['mean_diff'] > chromosome_state_diff_threshold]
 
-    # Count per state diff
+    return mean_state_diff
+
+
+def _plot_misseg_state_diff_counts(mean_state_diff):
+    import seaborn
+
     fig = plt.figure(figsize=(3, 2))
     plot_data = mean_state_diff.groupby('state_diff').size().rename('count').reset_index()
-    seaborn.barplot(x='state_diff', y='count', data=plot_data)
-    fig.savefig(results_prefix + 'misseg_state_diff_counts.pdf', bbox_inches='tight')
+    seaborn.barplot(ax=fig.gca(), x='state_diff', y='count', data=plot_data)
+    return fig
+
+
+def _plot_misseg_state_diff_proportions(mean_state_diff, num_cells):
+    import seaborn
 
-    # Count per state diff
     fig = plt.figure(figsize=(4, 2))
     ax = fig.add_subplot(111)
     plot_data = mean_state_diff.groupby('cell_id').size().rename('chr_count').reset_index()
     plot_data = plot_data.groupby('chr_count').size().rename('cell_count').reset_index()
-    plot_data['proportion'] = plot_data['cell_count'] / len(clone_cell_cn['cell_id'].unique())
+    plot_data['proportion'] = plot_data['cell_count'] / num_cells
     plot_data = plot_data.query('chr_count > 0')
-    chr_counts = range(1, plot_data['chr_count'].max() + 1)
+    chr_counts = range(1, plot_data['chr_count'].max() + 1 if len(plot_data.index) > 0 else 1)
     seaborn.barplot(ax=ax, x='chr_count', y='proportion', data=plot_data, order=chr_counts, color='0.75')
     ax.set_xlabel('Num. chromosomes')
     ax.set_ylabel('Prop. cells')
-    seaborn.despine(trim=True)
-    fig.savefig(results_prefix + 'misseg_state_diff_proportions.pdf', bbox_inches='tight')
+    seaborn.despine(ax=ax, trim=True)
+    return fig
+
+
+def _plot_misseg_chr_counts(mean_state_diff, include_y_chrom=False):
+    import seaborn
 
-    # Count per chromosome
     chromosomes = [str(a) for a in range(1, 23)] + ['X']
     if include_y_chrom:
         chromosomes.append('Y')
     fig = plt.figure(figsize=(7, 2.5))
     ax = fig.add_subplot(111)
     plot_data = mean_state_diff.query('state_diff > 0').groupby('chr').size().rename('count').reset_index()
-    seaborn.barplot(x='chr', y='count', data=plot_data, order=chromosomes, color=seaborn.desaturate('red', 0.75))
+    seaborn.barplot(ax=ax, x='chr', y='count', data=plot_data, order=chromosomes, color=seaborn.desaturate('red', 0.75))
     plot_data = mean_state_diff.query('state_diff < 0').groupby('chr').size().rename('count').reset_index()
     plot_data['count'] = -plot_data['count']
-    seaborn.barplot(x='chr', y='count', data=plot_data, order=chromosomes, color=seaborn.desaturate('blue', 0.75))
+    seaborn.barplot(ax=ax, x='chr', y='count', data=plot_data, order=chromosomes, color=seaborn.desaturate('blue', 0.75))
     ax.set_xlabel('Chromosome')
     ax.set_ylabel('Count')
-    seaborn.despine(trim=True)
+    seaborn.despine(ax=ax, trim=True)
     ax.set_yticklabels([int(abs(a)) for a in ax.get_yticks()])
-    fig.savefig(results_prefix + 'misseg_chr_counts.pdf', bbox_inches='tight')
+    return fig
+
+
+def plot_mitotic_errors(mean_state_diff, num_cells, results_prefix, include_y_chrom=False, plots=True):
+    """ Plot counts of mis-segregated chromosomes.
+
+    Args:
+        mean_state_diff (pandas.DataFrame): mis-segregations from compute_mitotic_errors
+        num_cells (int): number of cells considered
+        results_prefix (str): prefix of plot filenames, plots are skipped if None
+
+    KwArgs:
+        include_y_chrom (bool): include the Y chromosome
+        plots (bool or scgenome.cnplot.DeferredPlots): draw plots, skip plots if False, or record plots
+            for drawing later. Defaults to True.
+    """
+    if not _should_plot(plots, results_prefix):
+        return
+
+    plot_data = mean_state_diff[['chr', 'cell_id', 'state_diff']]
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'misseg_state_diff_counts.pdf'),
+        _plot_misseg_state_diff_counts, plot_data)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'misseg_state_diff_proportions.pdf'),
+        _plot_misseg_state_diff_proportions, plot_data, num_cells)
+
+    scgenome.cnplot.make_plot(
+        plots, _get_plot_filename(results_prefix, 'misseg_chr_counts.pdf'),
+        _plot_misseg_chr_counts, plot_data, include_y_chrom=include_y_chrom)
+
+
+def calculate_mitotic_errors(
+        cn_data,
+        clusters,
+        results_prefix,
+        chromosome_state_diff_threshold=0.75,
+        include_y_chrom=False,
+        plots=True,
+    ):
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data, fields=('copy', 'state'))
+
+    mean_state_diff = compute_mitotic_errors(
+        cn, clusters,
+        chromosome_state_diff_threshold=chromosome_state_diff_threshold,
+        include_y_chrom=include_y_chrom)
+
+    num_cells = clusters.loc[clusters['cell_id'].isin(cn.cell_ids), 'cell_id'].nunique()
+    plot_mitotic_errors(mean_state_diff, num_cells, results_prefix, include_y_chrom=include_y_chrom, plots=plots)
 
     return mean_state_diff
 
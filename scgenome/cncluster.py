@@ -1,15 +1,144 @@
-import umap
-import hdbscan
-import seaborn
+import os
+import json
+import uuid
+import hashlib
 import logging
 import itertools
+import multiprocessing
+import concurrent.futures
 import pandas as pd
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
-import sklearn.cluster
-import scipy.spatial
-from adjustText import adjust_text
+import scipy.special
+
+import scgenome.cnmatrix
+
+
+def _get_cell_features(cn, dtype=np.float64):
+    """ Cell ids and cells by bins copy number matrix, with missing values as 0.
+    """
+    if isinstance(cn, scgenome.cnmatrix.CNMatrix):
+        return cn.cell_ids, cn.get_values('copy', fill_value=0, dtype=dtype).T
+
+    return cn.columns, cn.fillna(0).values.astype(dtype, copy=False).T
+
+
+# Increment to invalidate existing embedding caches when embedding changes
+_embedding_cache_version = 1
+
+default_scalable_pca_components = 50
+
+
+def _get_embedding_cache_key(X, **params):
+    """ Hash of a features matrix and embedding parameters.
+    """
+    # Hash the underlying buffer of transposed matrices without copying
+    data = X
+    if not X.flags.c_contiguous and X.flags.f_contiguous:
+        data = X.T
+    data = np.ascontiguousarray(data)
+
+    key = hashlib.sha1()
+    key.update(json.dumps({
+        'cache_version': _embedding_cache_version,
+        'shape': X.shape,
+        'dtype': str(X.dtype),
+        'c_contiguous': bool(X.flags.c_contiguous),
+        'params': params,
+    }, sort_keys=True, default=str).encode())
+    key.update(memoryview(data).cast('B'))
+
+    return key.hexdigest()
+
+
+def compute_umap_embedding(
+        X,
+        n_components=2,
+        n_neighbors=15,
+        min_dist=0.1,
+        random_state=42,
+        pca_components=None,
+        embedding_cache=None,
+        randomized_pca=False,
+        precompute_knn=False,
+        n_jobs=None,
+    ):
+    """ UMAP embedding of cells, optionally of a PCA basis, optionally cached on disk.
+
+    Args:
+        X (numpy.ndarray): cells by features matrix
+
+    KwArgs:
+        n_components (int): umap dimensions. Defaults to 2.
+        n_neighbors (int): umap number of neighbors. Defaults to 15.
+        min_dist (float): umap min distance. Defaults to 0.1.
+        random_state (int): random seed for umap and pca. Defaults to 42.
+        pca_components (int): reduce to this many principal components before umap. Defaults to None.
+        embedding_cache (str): directory of cached embeddings keyed by a hash of X and parameters. Defaults to None.
+        randomized_pca (bool): use randomized svd for pca. Defaults to False.
+        precompute_knn (bool): compute the approximate nearest neighbor graph with pynndescent before umap,
+            requires umap-learn 0.5 or later. Defaults to False.
+        n_jobs (int): number of threads for the nearest neighbor graph, None for all cores. Defaults to None.
+
+    Returns:
+        numpy.ndarray: cells by n_components embedding
+    """
+    import umap
+    import numba
+    import sklearn.decomposition
+
+    params = dict(
+        n_components=n_components,
+        n_neighbors=n_neighbors,
+        min_dist=min_dist,
+        random_state=random_state,
+        pca_components=pca_components,
+        randomized_pca=randomized_pca,
+        precompute_knn=precompute_knn,
+    )
+
+    cache_filename = None
+    if embedding_cache is not None:
+        os.makedirs(embedding_cache, exist_ok=True)
+        cache_filename = os.path.join(embedding_cache, 'umap_' + _get_embedding_cache_key(X, **params) + '.npy')
+
+        if os.path.exists(cache_filename):
+            logging.info(f'loaded umap embedding from {cache_filename}')
+            return np.load(cache_filename)
+
+    if pca_components is not None and pca_components < min(X.shape):
+        logging.info(f'reducing {X.shape[1]} features to {pca_components} principal components')
+        svd_solver = 'randomized' if randomized_pca else 'auto'
+        X = sklearn.decomposition.PCA(
+            n_components=pca_components, svd_solver=svd_solver, random_state=random_state).fit_transform(X)
+
+    umap_params = {}
+    if precompute_knn:
+        logging.info(f'calculating {n_neighbors} nearest neighbors of {X.shape[0]} cells')
+        # pynndescent threads are limited to the numba thread pool
+        knn_n_jobs = -1 if n_jobs is None else min(n_jobs, numba.config.NUMBA_NUM_THREADS)
+        umap_params['precomputed_knn'] = umap.umap_.nearest_neighbors(
+            X, n_neighbors, 'euclidean', {}, False, random_state, n_jobs=knn_n_jobs)
+
+    embedding = umap.UMAP(
+        n_neighbors=n_neighbors,
+        min_dist=min_dist,
+        n_components=n_components,
+        random_state=random_state,
+        metric='euclidean',
+        **umap_params,
+    ).fit_transform(X)
+
+    if cache_filename is not None:
+        # Write to a temporary file first so that concurrent runs never
+        # observe a partially written embedding
+        temp_filename = cache_filename + '.' + uuid.uuid4().hex + '.tmp.npy'
+        np.save(temp_filename, embedding)
+        os.replace(temp_filename, cache_filename)
+        logging.info(f'cached umap embedding to {cache_filename}')
+
+    return embedding
 
 
 def umap_hdbscan_cluster(
@@ -17,11 +146,32 @@ def umap_hdbscan_cluster(
         n_components=2,
         n_neighbors=15,
         min_dist=0.1,
+        min_samples=10,
+        min_cluster_size=30,
+        pca_components=None,
+        embedding_cache=None,
+        scalable=False,
+        n_jobs=None,
     ):
     """ Cluster using umap and hdbscan.
 
+    The scalable mode, intended for tens of thousands of cells, uses float32 features, randomized
+    pca to pca_components (default 50) dimensions, a precomputed approximate nearest neighbor graph
+    for umap, and n_jobs threads for hdbscan core distances. It requires umap-learn 0.5 or later.
+
     Args:
-        cn: data frame columns as cell ids, rows as segments
+        cn: data frame columns as cell ids, rows as segments, or scgenome.cnmatrix.CNMatrix
+
+    KwArgs:
+        n_components (int): umap dimensions. Defaults to 2.
+        n_neighbors (int): umap number of neighbors. Defaults to 15.
+        min_dist (float): umap min distance. Defaults to 0.1.
+        min_samples (int): hdbscan min samples. Defaults to 10.
+        min_cluster_size (int): hdbscan min cluster size. Defaults to 30.
+        pca_components (int): reduce to this many principal components before umap. Defaults to None.
+        embedding_cache (str): directory of cached umap embeddings. Defaults to None.
+        scalable (bool): use the scalable mode. Defaults to False.
+        n_jobs (int): number of threads for nearest neighbors and hdbscan core distances. Defaults to None.
 
     Returns:
         data frame with columns:
@@ -31,21 +181,40 @@ def umap_hdbscan_cluster(
             umap2
 
     """
-    embedding = umap.UMAP(
+    if scalable:
+        cell_ids, X = _get_cell_features(cn, dtype=np.float32)
+        if pca_components is None:
+            pca_components = default_scalable_pca_components
+
+    else:
+        cell_ids, X = _get_cell_features(cn)
+
+    embedding = compute_umap_embedding(
+        X,
+        n_components=n_components,
         n_neighbors=n_neighbors,
         min_dist=min_dist,
-        n_components=n_components,
-        random_state=42,
-        metric='euclidean',
-    ).fit_transform(cn.fillna(0).values.T)
+        pca_components=pca_components,
+        embedding_cache=embedding_cache,
+        randomized_pca=scalable,
+        precompute_knn=scalable,
+        n_jobs=n_jobs,
+    )
+
+    import hdbscan
+
+    hdbscan_params = {}
+    if n_jobs is not None:
+        hdbscan_params['core_dist_n_jobs'] = n_jobs
 
     clusters = hdbscan.HDBSCAN(
-        min_samples=10,
-        min_cluster_size=30,
+        min_samples=min_samples,
+        min_cluster_size=min_cluster_size,
+        **hdbscan_params,
     ).fit_predict(embedding)
 
     df = pd.DataFrame({
-        'cell_id': cn.columns, 'cluster_id': clusters,
+        'cell_id': cell_ids, 'cluster_id': clusters,
         'umap1': embedding[:, 0], 'umap2': embedding[:, 1]
     })
     df = df[['cell_id', 'cluster_id', 'umap1', 'umap2']]
@@ -54,6 +223,37 @@ def umap_hdbscan_cluster(
     return df
 
 
+def _kmeans_log_likelihood(kmeans, X):
+    """ Log likelihood of data under a spherical gaussian model of a kmeans clustering
+
+    Args:
+        kmeans: a fitted kmeans clustering object
+        X: data for which to calculate the likelihood
+
+    Returns:
+        float: log likelihood
+        int: number of parameters
+    """
+    labels = kmeans.labels_
+    n_clusters = kmeans.n_clusters
+    cluster_sizes = np.bincount(labels, minlength=n_clusters)
+    N, d = X.shape
+
+    # Pooled variance of distances to assigned cluster centers
+    residuals = X - kmeans.cluster_centers_[labels]
+    cl_var = np.einsum('ij,ij->', residuals, residuals) / (N - n_clusters) / d
+
+    log_likelihood = np.sum(
+        scipy.special.xlogy(cluster_sizes, cluster_sizes) -
+        cluster_sizes * np.log(N) -
+        ((cluster_sizes * d) / 2) * np.log(2 * np.pi * cl_var) -
+        ((cluster_sizes - 1) * d / 2))
+
+    num_params = n_clusters * (d + 1)
+
+    return log_likelihood, num_params
+
+
 def compute_bic(kmeans, X):
     """ Computes the BIC metric for a given k means clustering
 
@@ -66,53 +266,192 @@ def compute_bic(kmeans, X):
     
     Reference: https://stats.stackexchange.com/questions/90769/using-bic-to-estimate-the-number-of-k-in-kmeans
     """
-    centers = [kmeans.cluster_centers_]
-    labels  = kmeans.labels_
-    n_clusters = kmeans.n_clusters
-    cluster_sizes = np.bincount(labels)
-    N, d = X.shape
+    log_likelihood, num_params = _kmeans_log_likelihood(kmeans, X)
+    N = X.shape[0]
 
-    # Compute variance for all clusters
-    cl_var = (1.0 / (N - n_clusters) / d) * sum([sum(scipy.spatial.distance.cdist(X[np.where(labels == i)], [centers[0][i]], 
-             'euclidean')**2) for i in range(n_clusters)])
+    bic = log_likelihood - 0.5 * num_params * np.log(N)
 
-    const_term = 0.5 * n_clusters * np.log(N) * (d+1)
+    return bic
 
-    bic = np.sum([cluster_sizes[i] * np.log(cluster_sizes[i]) -
-               cluster_sizes[i] * np.log(N) -
-             ((cluster_sizes[i] * d) / 2) * np.log(2*np.pi*cl_var) -
-             ((cluster_sizes[i] - 1) * d/ 2) for i in range(n_clusters)]) - const_term
 
-    return bic
+def compute_aic(kmeans, X):
+    """ Computes the AIC metric for a given k means clustering, negated such that higher is better as for bic
+
+    Args:
+        kmeans: a fitted kmeans clustering object
+        X: data for which to calculate aic
+
+    Returns:
+        float: aic
+    """
+    log_likelihood, num_params = _kmeans_log_likelihood(kmeans, X)
+
+    aic = log_likelihood - num_params
+
+    return aic
+
+
+def compute_silhouette(kmeans, X, sample_size=1000, random_state=None):
+    """ Computes the silhouette score for a given k means clustering on a sample of cells
+
+    Args:
+        kmeans: a fitted kmeans clustering object
+        X: data for which to calculate the silhouette score
+
+    KwArgs:
+        sample_size (int): number of cells to sample. Defaults to 1000.
+        random_state (int): random seed for sampling. Defaults to None.
+
+    Returns:
+        float: silhouette score
+    """
+    import sklearn.metrics
+
+    sample_size = min(sample_size, X.shape[0])
+
+    return sklearn.metrics.silhouette_score(
+        X, kmeans.labels_, sample_size=sample_size, random_state=random_state)
+
+
+kmeans_scorers = {
+    'bic': compute_bic,
+    'aic': compute_aic,
+    'silhouette': compute_silhouette,
+}
+
+
+_kmeans_worker_features = None
+
+
+def _init_kmeans_worker(X):
+    import threadpoolctl
+
+    global _kmeans_worker_features
+    _kmeans_worker_features = X
+
+    # Parallelism is across k, limit each worker to a single openmp / blas
+    # thread to avoid max_workers times n_cores threads
+    threadpoolctl.threadpool_limits(1)
+
+
+def _fit_kmeans(X, k, minibatch=False, random_state=None, score='bic'):
+    """ Fit kmeans for a given k, returning labels and score.
+    """
+    import sklearn.cluster
+
+    if minibatch:
+        model = sklearn.cluster.MiniBatchKMeans(n_clusters=k, init="k-means++", random_state=random_state).fit(X)
+    else:
+        model = sklearn.cluster.KMeans(n_clusters=k, init="k-means++", random_state=random_state).fit(X)
+
+    # Only the silhouette score is sampled and requires a seed
+    score_kwargs = {}
+    if score == 'silhouette':
+        score_kwargs['random_state'] = random_state
+
+    model_score = kmeans_scorers[score](model, X, **score_kwargs)
+
+    return model.labels_, model_score
+
+
+def _fit_kmeans_worker(k, minibatch=False, random_state=None, score='bic'):
+    return _fit_kmeans(_kmeans_worker_features, k, minibatch=minibatch, random_state=random_state, score=score)
+
+
+def _iter_kmeans_fits(X, ks, minibatch=False, random_state=None, score='bic', max_workers=None):
+    """ Fit kmeans for each k in order, in batches of max_workers processes if requested.
+    """
+    if max_workers is None or max_workers <= 1:
+        for k in ks:
+            logging.info(f'trying with k={k}')
+            yield (k,) + _fit_kmeans(X, k, minibatch=minibatch, random_state=random_state, score=score)
+        return
+
+    # Features are sent to each worker once, rather than with each k. Workers
+    # are spawned as forking after umap has started numba threads can deadlock
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_kmeans_worker, initargs=(X,)) as executor:
+        for batch_start in range(0, len(ks), max_workers):
+            batch_ks = ks[batch_start:batch_start + max_workers]
+            logging.info(f'trying with k={list(batch_ks)}')
+            futures = [executor.submit(_fit_kmeans_worker, k, minibatch=minibatch, random_state=random_state, score=score)
+                for k in batch_ks]
+            for k, future in zip(batch_ks, futures):
+                yield (k,) + future.result()
 
 
 def kmeans_cluster(
         cn,
         min_k=2,
         max_k=100,
+        max_workers=None,
+        patience=None,
+        minibatch=False,
+        pca_components=None,
+        random_state=None,
+        score='bic',
     ):
-    """ Cluster using kmeans and bic.
+    """ Cluster using kmeans and bic, or another score from kmeans_scorers.
+
+    For large numbers of cells, eg more than 5000, consider minibatch=True and pca_components=50,
+    together with patience to stop the sweep once bic has peaked.
+
+    Args:
+        cn: data frame columns as cell ids, rows as segments, or scgenome.cnmatrix.CNMatrix
+
+    KwArgs:
+        min_k (int): minimum number of clusters. Defaults to 2.
+        max_k (int): maximum number of clusters. Defaults to 100.
+        max_workers (int): number of processes fitting different k in parallel, None or 1 for serial. Defaults to None.
+        patience (int): stop after this many consecutive k without improvement in score, None to try all k. Defaults to None.
+        minibatch (bool): use MiniBatchKMeans. Defaults to False.
+        pca_components (int): cluster on this many principal components rather than all bins. Defaults to None.
+        random_state (int): random seed for kmeans and pca. Defaults to None.
+        score (str): score to maximize, one of bic, aic, silhouette. Defaults to bic.
+
+    Returns:
+        pandas.DataFrame: cluster_id for each cell_id
     """
 
-    X = cn.T.values
+    if score not in kmeans_scorers:
+        raise ValueError(f'unknown score {score}, expected one of {list(kmeans_scorers)}')
+
+    cell_ids, X = _get_cell_features(cn)
+
+    if pca_components is not None and pca_components < min(X.shape):
+        import sklearn.decomposition
+        logging.info(f'reducing {X.shape[1]} bins to {pca_components} principal components')
+        X = sklearn.decomposition.PCA(n_components=pca_components, random_state=random_state).fit_transform(X)
+
+    # bic requires fewer clusters than cells
+    max_k = min(max_k, X.shape[0] - 1)
     ks = range(min_k, max_k + 1)
 
     logging.info(f'trying with max k={max_k}')
 
-    kmeans = []
-    bics = []
-    for k in ks:
-        logging.info(f'trying with k={k}')
-        model = sklearn.cluster.KMeans(n_clusters=k, init="k-means++").fit(X)
-        bic = compute_bic(model, X)
-        kmeans.append(model)
-        bics.append(bic)
+    best_k = None
+    best_score = -np.inf
+    best_labels = None
+    num_without_improvement = 0
+
+    kmeans_fits = _iter_kmeans_fits(
+        X, ks, minibatch=minibatch, random_state=random_state, score=score, max_workers=max_workers)
 
-    opt_k = np.array(bics).argmax()
-    logging.info(f'selected k={opt_k}')
+    for k, labels, k_score in kmeans_fits:
+        if k_score > best_score:
+            best_k, best_score, best_labels = k, k_score, labels
+            num_without_improvement = 0
+        else:
+            num_without_improvement += 1
 
-    model = kmeans[opt_k]
-    clusters = pd.Series(model.labels_, index=cn.columns).rename('cluster_id').reset_index()
+        if patience is not None and num_without_improvement >= patience:
+            logging.info(f'stopping at k={k}, no improvement in {score} since k={best_k}')
+            break
+
+    logging.info(f'selected k={best_k}')
+
+    clusters = pd.Series(best_labels, index=cell_ids).rename('cluster_id').reset_index()
 
     return clusters
 
@@ -182,6 +521,9 @@ def plot_umap_clusters(ax, df):
             umap2
 
     """
+    import seaborn
+    from adjustText import adjust_text
+
     labels = cluster_labels(df['cluster_id'])
     color_map = get_cluster_color_map(df['cluster_id'].values)
 
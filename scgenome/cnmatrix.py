@@ -0,0 +1,394 @@
+import hashlib
+import warnings
+import numpy as np
+import pandas as pd
+
+from scgenome import refgenome
+
+
+default_fields = ('copy', 'state', 'reads')
+
+field_dtypes = {
+    'copy': np.float32,
+    'reads': np.float32,
+    'state': np.int8,
+}
+
+
+def _get_chromosome_order(chromosomes):
+    """ Order chromosomes by the reference genome, others sorted by name after.
+    """
+    chromosomes = [str(a) for a in chromosomes]
+    ref_chromosomes = [a for a in refgenome.info.chromosomes if a in chromosomes]
+    other_chromosomes = sorted(set(chromosomes) - set(ref_chromosomes))
+    return ref_chromosomes + other_chromosomes
+
+
+def get_bin_index(cn_data):
+    """ Integer index of the bin of each row of a copy number table, in genome order.
+
+    Args:
+        cn_data (pandas.DataFrame): copy number table with columns chr, start, end
+
+    Returns:
+        numpy.ndarray: bin index of each row
+        list of str: chromosomes in genome order
+    """
+    chr_codes, chr_values = pd.factorize(cn_data['chr'])
+    chromosomes = _get_chromosome_order(chr_values)
+    chr_rank = pd.Index(chromosomes).get_indexer([str(a) for a in chr_values])
+
+    bin_keys = pd.DataFrame({
+        'chr_rank': chr_rank[chr_codes],
+        'start': cn_data['start'].values,
+        'end': cn_data['end'].values,
+    })
+    bin_index = bin_keys.groupby(['chr_rank', 'start', 'end'], sort=True).ngroup().values
+
+    return bin_index, chromosomes
+
+
+def _get_cell_codes(cell_ids):
+    """ Integer codes of observed cell ids, in category order for categoricals.
+    """
+    if cell_ids.dtype.name == 'category':
+        codes = cell_ids.cat.codes.values
+        used = np.unique(codes[codes >= 0])
+        remap = np.full(len(cell_ids.cat.categories) + 1, -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        return remap[codes], cell_ids.cat.categories[used]
+
+    codes, categories = pd.factorize(cell_ids, sort=True)
+    return codes, categories
+
+
+class CNMatrix(object):
+    def __init__(self, bins, cell_ids, data, present=None):
+        """ Dense bins by cells copy number matrices.
+
+        Args:
+            bins (pandas.DataFrame): table of chr, start, end of each matrix row, in genome order
+            cell_ids (list of str): cell id of each matrix column
+            data (dict): numpy.ndarray of shape (bins, cells) keyed by field
+
+        KwArgs:
+            present (numpy.ndarray): boolean matrix of bins with data for each cell. Defaults to all present.
+        """
+        self.bins = bins.reset_index(drop=True)
+        self.cell_ids = pd.Index(cell_ids, name='cell_id')
+        self.data = data
+
+        if present is None:
+            present = np.ones(self.shape, dtype=bool)
+        self.present = present
+
+        self._bin_index = None
+        self._clone_profiles = {}
+        self._clone_profiles_data_key = None
+
+    @classmethod
+    def from_cn_data(cls, cn_data, fields=default_fields, bin_fields=('gc',)):
+        """ Create from a long copy number table such as hmmcopy reads.
+
+        Args:
+            cn_data (pandas.DataFrame): copy number table with columns chr, start, end, cell_id
+
+        KwArgs:
+            fields (list of str): per cell fields to create matrices for, if present in cn_data
+            bin_fields (list of str): per bin fields to add to the bins table, if present in cn_data
+
+        Returns:
+            CNMatrix: copy number matrices
+        """
+        cn_data = cn_data[cn_data['cell_id'].notnull()]
+
+        bin_codes, chromosomes = get_bin_index(cn_data)
+        num_bins = bin_codes.max() + 1 if len(bin_codes) > 0 else 0
+
+        bin_rows = np.zeros(num_bins, dtype=np.int64)
+        bin_rows[bin_codes] = np.arange(len(bin_codes))
+
+        bin_cols = ['chr', 'start', 'end'] + [col for col in bin_fields if col in cn_data]
+        bins = cn_data[bin_cols].iloc[bin_rows].reset_index(drop=True)
+        bins['chr'] = pd.Categorical(bins['chr'].astype(str), categories=chromosomes)
+
+        cell_codes, cell_ids = _get_cell_codes(cn_data['cell_id'])
+
+        shape = (num_bins, len(cell_ids))
+
+        present = np.zeros(shape, dtype=bool)
+        present[bin_codes, cell_codes] = True
+
+        if present.sum() != len(bin_codes):
+            raise ValueError('duplicate bins for one or more cells')
+
+        data = {}
+        for field in fields:
+            if field not in cn_data:
+                continue
+
+            dtype = field_dtypes.get(field, np.float32)
+            values = cn_data[field].values
+
+            # Integer fields with missing values are stored as float so that
+            # missing values remain nan rather than a valid integer
+            if np.issubdtype(dtype, np.integer) and pd.isnull(values).any():
+                dtype = np.float32
+
+            if np.issubdtype(dtype, np.integer):
+                values = values.astype(float)
+                info = np.iinfo(dtype)
+                if len(values) > 0 and (values.min() < info.min or values.max() > info.max):
+                    raise ValueError(f'{field} values outside range of {np.dtype(dtype).name}')
+                data[field] = np.zeros(shape, dtype=dtype)
+            else:
+                data[field] = np.full(shape, np.nan, dtype=dtype)
+
+            data[field][bin_codes, cell_codes] = values
+
+        return cls(bins, cell_ids, data, present=present)
+
+    @property
+    def shape(self):
+        return (len(self.bins.index), len(self.cell_ids))
+
+    @property
+    def fields(self):
+        return list(self.data.keys())
+
+    @property
+    def bin_index(self):
+        """ pandas.MultiIndex of chr, start, end for matrix rows
+        """
+        if self._bin_index is None:
+            self._bin_index = pd.MultiIndex.from_frame(self.bins[['chr', 'start', 'end']])
+        return self._bin_index
+
+    def get_values(self, field, fill_value=np.nan, dtype=None):
+        """ Matrix of a field with missing values filled.
+
+        Args:
+            field (str): field to obtain
+
+        KwArgs:
+            fill_value (scalar): value for bins without data or with nan values. Defaults to nan.
+            dtype (numpy.dtype): dtype of the matrix, defaults to the field dtype promoted to hold fill_value
+
+        Returns:
+            numpy.ndarray: bins by cells matrix, not copied if no values are missing
+        """
+        values = self.data[field]
+
+        missing = ~self.present
+        if values.dtype.kind == 'f':
+            missing = missing | np.isnan(values)
+
+        if dtype is None:
+            dtype = np.result_type(values.dtype, fill_value)
+
+        if not missing.any():
+            return values.astype(dtype, copy=False)
+
+        values = values.astype(dtype)
+        values[missing] = fill_value
+
+        return values
+
+    def get_frame(self, field, fill_value=np.nan, dtype=None):
+        """ Bins by cells table of a field, as produced by unstacking a long table on cell_id.
+
+        Args:
+            field (str): field to obtain
+
+        KwArgs:
+            fill_value (scalar): value for bins without data or with nan values. Defaults to nan.
+            dtype (numpy.dtype): dtype of the table, defaults to the field dtype promoted to hold fill_value
+
+        Returns:
+            pandas.DataFrame: table indexed by chr, start, end with cell ids as columns
+        """
+        return pd.DataFrame(
+            self.get_values(field, fill_value=fill_value, dtype=dtype),
+            index=self.bin_index, columns=self.cell_ids)
+
+    def subset_cells(self, cell_ids):
+        """ Matrices restricted to a subset of cells.
+
+        Args:
+            cell_ids (list of str): cells to select, in the order given
+
+        Returns:
+            CNMatrix: copy number matrices of selected cells
+        """
+        idx = self.cell_ids.get_indexer(cell_ids)
+        if (idx < 0).any():
+            raise ValueError('cell ids not in matrix')
+
+        data = {field: values[:, idx] for field, values in self.data.items()}
+
+        return CNMatrix(self.bins, self.cell_ids[idx], data, present=self.present[:, idx])
+
+    def _get_data_key(self):
+        """ Hash of the matrices, so that memoized results are recalculated after in place changes.
+        """
+        data_hash = hashlib.sha1()
+        for field, values in sorted(self.data.items()):
+            data_hash.update(field.encode())
+            data_hash.update(np.ascontiguousarray(values).view(np.uint8))
+        data_hash.update(np.ascontiguousarray(self.present).view(np.uint8))
+        return data_hash.hexdigest()
+
+    def get_clone_profiles(self, clusters):
+        """ Mean copy and median state of each clone, memoized per clustering and matrix values.
+
+        Args:
+            clusters (pandas.DataFrame): cluster_id for each cell_id
+
+        Returns:
+            CNMatrix: bins by clones matrices with cluster ids in place of cell ids
+        """
+        # Profiles of previous matrix values are discarded
+        data_key = self._get_data_key()
+        if data_key != self._clone_profiles_data_key:
+            self._clone_profiles = {}
+            self._clone_profiles_data_key = data_key
+
+        key = _get_clusters_key(clusters)
+        if key not in self._clone_profiles:
+            self._clone_profiles[key] = self._calculate_clone_profiles(clusters)
+        return self._clone_profiles[key]
+
+    def _calculate_clone_profiles(self, clusters):
+        cell_clusters = clusters[['cell_id', 'cluster_id']].drop_duplicates()
+        cell_clusters = cell_clusters[cell_clusters['cell_id'].isin(self.cell_ids)]
+
+        cluster_codes, cluster_ids = pd.factorize(cell_clusters['cluster_id'], sort=True)
+        cell_idx = self.cell_ids.get_indexer(cell_clusters['cell_id'])
+
+        # Sort cells by cluster so that each clone is a contiguous block of columns
+        order = np.argsort(cluster_codes, kind='stable')
+        cluster_codes = cluster_codes[order]
+        cell_idx = cell_idx[order]
+
+        num_bins = self.shape[0]
+
+        if len(cell_idx) == 0:
+            empty = np.zeros((num_bins, 0))
+            return CNMatrix(self.bins, cluster_ids, {field: empty for field in self.data}, present=empty.astype(bool))
+
+        starts = np.flatnonzero(np.concatenate([[True], cluster_codes[1:] != cluster_codes[:-1]]))
+        ends = np.concatenate([starts[1:], [len(cluster_codes)]])
+
+        present = np.logical_or.reduceat(self.present[:, cell_idx], starts, axis=1)
+
+        data = {}
+
+        if 'copy' in self.data:
+            values = self.get_values('copy', dtype=np.float64)[:, cell_idx]
+            is_value = ~np.isnan(values)
+            counts = np.add.reduceat(is_value, starts, axis=1)
+            sums = np.add.reduceat(np.where(is_value, values, 0.), starts, axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                data['copy'] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+        if 'state' in self.data:
+            values = self.get_values('state', dtype=np.float64)[:, cell_idx]
+            data['state'] = np.full((num_bins, len(starts)), np.nan)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                for idx, (start, end) in enumerate(zip(starts, ends)):
+                    data['state'][:, idx] = np.nanmedian(values[:, start:end], axis=1)
+
+        return CNMatrix(self.bins, cluster_ids, data, present=present)
+
+    def to_cn_data(self):
+        """ Long copy number table of bins with data.
+
+        Returns:
+            pandas.DataFrame: copy number table with bin columns, cell_id and fields
+        """
+        bin_idx, cell_idx = np.nonzero(self.present)
+
+        cn_data = self.bins.iloc[bin_idx].reset_index(drop=True)
+        cn_data['cell_id'] = pd.Categorical.from_codes(cell_idx, categories=self.cell_ids)
+
+        for field, values in self.data.items():
+            cn_data[field] = values[bin_idx, cell_idx]
+
+        return cn_data
+
+
+def get_cn_matrix(cn_data, fields=default_fields):
+    """ Get copy number matrices from a long copy number table or copy number matrices.
+
+    Args:
+        cn_data (pandas.DataFrame or CNMatrix): copy number data
+
+    KwArgs:
+        fields (list of str): per cell fields to create matrices for when given a table
+
+    Returns:
+        CNMatrix: copy number matrices
+    """
+    if isinstance(cn_data, CNMatrix):
+        return cn_data
+
+    return CNMatrix.from_cn_data(cn_data, fields=fields)
+
+
+def _get_clusters_key(clusters):
+    """ Hash of the cell_id, cluster_id pairs of a clustering.
+    """
+    hashes = pd.util.hash_pandas_object(clusters[['cell_id', 'cluster_id']], index=False).values
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+def get_clone_profiles(cn_data, clusters):
+    """ Mean copy and median state of each clone, memoized for copy number matrices.
+
+    Args:
+        cn_data (pandas.DataFrame or CNMatrix): copy number data
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    Returns:
+        CNMatrix: bins by clones matrices with cluster ids in place of cell ids
+    """
+    return get_cn_matrix(cn_data, fields=('copy', 'state')).get_clone_profiles(clusters)
+
+
+def get_clone_cn_data(cn_data, clusters):
+    """ Long table of mean copy and median state of each clone for bins with data.
+
+    Args:
+        cn_data (pandas.DataFrame or CNMatrix): copy number data
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    Returns:
+        pandas.DataFrame: table with columns chr, start, end, cluster_id, copy, state
+    """
+    profiles = get_clone_profiles(cn_data, clusters)
+
+    bin_idx, clone_idx = np.nonzero(profiles.present)
+
+    clone_cn_data = profiles.bins.iloc[bin_idx][['chr', 'start', 'end']].reset_index(drop=True)
+    clone_cn_data['cluster_id'] = np.asarray(profiles.cell_ids)[clone_idx]
+
+    for field, values in profiles.data.items():
+        clone_cn_data[field] = values[bin_idx, clone_idx]
+
+    return clone_cn_data
+
+
+def get_cn_data(cn_data):
+    """ Get a long copy number table from a long copy number table or copy number matrices.
+
+    Args:
+        cn_data (pandas.DataFrame or CNMatrix): copy number data
+
+    Returns:
+        pandas.DataFrame: copy number table
+    """
+    if isinstance(cn_data, CNMatrix):
+        return cn_data.to_cn_data()
+
+    return cn_data
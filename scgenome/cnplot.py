@@ -1,19 +1,20 @@
+import os
 import logging
+import multiprocessing
+import concurrent.futures
 import matplotlib
-import seaborn
-import random
-import scipy
+import matplotlib.collections
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import scipy.cluster.hierarchy as sch
 import scipy.spatial.distance as dst
-from sklearn.decomposition import PCA
 from matplotlib.colors import ListedColormap
 
 from scgenome import refgenome
 from scgenome import utils
 from scgenome import cncluster
+from scgenome import cnmatrix
 
 
 def hex_to_rgb(h):
@@ -46,21 +47,164 @@ def plot_cbar(ax):
     ax.set_yticklabels(np.arange(len(color_reference))[::-1])
 
 
-def _secondary_clustering(data):
-    D = dst.squareform(dst.pdist(data.T, 'cityblock'))
-    Y = sch.linkage(D, method='complete')
-    Z = sch.dendrogram(Y, color_threshold=-1, no_plot=True)
-    idx = np.array(Z['leaves'])
-    ordering = np.zeros(idx.shape[0], dtype=int)
-    ordering[idx] = np.arange(idx.shape[0])
+secondary_clustering_max_size = 5000
+
+
+def _get_leaf_order(X, max_size=secondary_clustering_max_size):
+    """ Order of rows of X from complete linkage of cityblock distances,
+    or from the first principal component for more than max_size rows.
+    """
+    if X.shape[0] <= 2:
+        return np.arange(X.shape[0])
+
+    if X.shape[0] > max_size:
+        from sklearn.decomposition import PCA
+        logging.info(f'ordering {X.shape[0]} cells by first principal component')
+        pc1 = PCA(n_components=1, svd_solver='randomized', random_state=0).fit_transform(X)[:, 0]
+        return np.argsort(pc1, kind='stable')
+
+    Y = sch.linkage(dst.pdist(X, 'cityblock'), method='complete')
+    return sch.leaves_list(Y)
+
+
+def _secondary_clustering(data, cluster_ids=None, max_size=secondary_clustering_max_size):
+    """ Order of cells within each cluster.
+
+    Args:
+        data (numpy.ndarray): bins by cells matrix
+
+    KwArgs:
+        cluster_ids (numpy.ndarray): cluster of each cell, cells are ordered within each cluster independently
+        max_size (int): maximum cluster size for hierarchical clustering, larger clusters are ordered by pca
+
+    Returns:
+        numpy.ndarray: position of each cell in the ordering, comparable between cells of the same cluster
+    """
+    if cluster_ids is None:
+        cluster_ids = np.zeros(data.shape[1], dtype=int)
+
+    ordering = np.zeros(data.shape[1], dtype=int)
+    for cell_idx in pd.Series(np.arange(data.shape[1])).groupby(np.asarray(cluster_ids)).indices.values():
+        idx = cell_idx[_get_leaf_order(data[:, cell_idx].T, max_size=max_size)]
+        ordering[idx] = np.arange(len(idx))
+
     return ordering
 
 
-def plot_clustered_cell_cn_matrix(ax, cn_data, cn_field_name, cluster_field_name='cluster_id', raw=False, max_cn=13):
-    plot_data = cn_data.merge(utils.chrom_idxs)
-    plot_data = plot_data.set_index(['chr_index', 'start', 'cell_id', cluster_field_name])[cn_field_name].unstack(level=['cell_id', cluster_field_name]).fillna(0)
+def _get_clustered_cell_matrix(cn_data, cn_field_name, cluster_field_name='cluster_id', clusters=None):
+    if isinstance(cn_data, cnmatrix.CNMatrix):
+        if clusters is None:
+            raise ValueError('clusters are required for plotting a CNMatrix')
+        cn = cn_data
+    else:
+        clusters = cn_data[['cell_id', cluster_field_name]]
+        cn = cnmatrix.CNMatrix.from_cn_data(cn_data, fields=[cn_field_name])
+
+    cell_clusters = clusters[['cell_id', cluster_field_name]].drop_duplicates().set_index('cell_id')[cluster_field_name]
+    cn = cn.subset_cells(cn.cell_ids[cn.cell_ids.isin(cell_clusters.index)])
+    cell_clusters = cell_clusters.reindex(cn.cell_ids)
+
+    bins = cn.bins[['chr', 'start']].merge(utils.chrom_idxs, how='left')
+    bin_filter = bins['chr_index'].notnull().values
+
+    return pd.DataFrame(
+        cn.get_values(cn_field_name, fill_value=0)[bin_filter],
+        index=pd.MultiIndex.from_arrays(
+            [bins['chr_index'].values[bin_filter].astype(int), bins['start'].values[bin_filter]],
+            names=['chr_index', 'start']),
+        columns=pd.MultiIndex.from_arrays(
+            [cn.cell_ids, cell_clusters.values],
+            names=['cell_id', cluster_field_name]))
+
+
+def get_cn_rgba(states):
+    """ Map copy number states to colors with a lookup table.
+
+    Args:
+        states (numpy.ndarray): integer copy number states
 
-    ordering = _secondary_clustering(plot_data.values)
+    Returns:
+        numpy.ndarray: rgba values with an additional last dimension of size 4
+    """
+    lut = np.array([matplotlib.colors.to_rgba(color_reference[cn]) for cn in sorted(color_reference)])
+    return lut[np.clip(states.astype(int), 0, len(lut) - 1)]
+
+
+def get_raw_rgba(values, vmin, vmax):
+    """ Map raw values to colors of the default colormap.
+
+    Args:
+        values (numpy.ndarray): raw values, nan values are mapped to the colormap bad color
+        vmin (float): value mapped to the bottom of the colormap
+        vmax (float): value mapped to the top of the colormap
+
+    Returns:
+        numpy.ndarray: rgba values with an additional last dimension of size 4
+    """
+    cmap = matplotlib.colormaps[matplotlib.rcParams['image.cmap']]
+    return cmap(matplotlib.colors.Normalize(vmin=vmin, vmax=vmax)(values))
+
+
+def _get_block_starts(size, num_blocks):
+    return np.unique(np.linspace(0, size, num_blocks + 1)[:-1].astype(int))
+
+
+def downsample_matrix(values, shape, raw=False):
+    """ Aggregate a matrix into blocks so that it is at most a given shape.
+
+    Args:
+        values (numpy.ndarray): matrix to aggregate
+        shape (tuple of int): maximum number of rows and columns
+
+    KwArgs:
+        raw (bool): take the mean of each block rather than the most frequent state
+
+    Returns:
+        numpy.ndarray: aggregated matrix
+    """
+    row_starts = _get_block_starts(values.shape[0], shape[0])
+    col_starts = _get_block_starts(values.shape[1], shape[1])
+
+    if len(row_starts) == values.shape[0] and len(col_starts) == values.shape[1]:
+        return values
+
+    def block_sums(block_values):
+        block_values = np.add.reduceat(block_values, row_starts, axis=0, dtype=np.float64)
+        return np.add.reduceat(block_values, col_starts, axis=1)
+
+    if raw:
+        is_value = ~np.isnan(values)
+        counts = block_sums(is_value)
+        sums = block_sums(np.where(is_value, values, 0.))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+    mode = np.zeros((len(row_starts), len(col_starts)), dtype=values.dtype)
+    mode_counts = np.zeros(mode.shape)
+    for state in np.unique(values):
+        counts = block_sums(values == state)
+        is_mode = counts > mode_counts
+        mode[is_mode] = state
+        mode_counts[is_mode] = counts[is_mode]
+
+    return mode
+
+
+def _get_axis_pixels(ax, dpi=None):
+    """ Height and width of an axis in pixels at a given dpi.
+    """
+    fig = ax.get_figure()
+    bbox = ax.get_window_extent()
+    scale = 1. if dpi is None else dpi / fig.dpi
+    return int(np.ceil(bbox.height * scale)), int(np.ceil(bbox.width * scale))
+
+
+def _get_ordered_cell_matrix(cn_data, cn_field_name, cluster_field_name='cluster_id', max_cn=13, clusters=None):
+    plot_data = _get_clustered_cell_matrix(
+        cn_data, cn_field_name, cluster_field_name=cluster_field_name, clusters=clusters)
+
+    ordering = _secondary_clustering(
+        plot_data.values, cluster_ids=plot_data.columns.get_level_values(cluster_field_name).values)
     ordering = pd.Series(ordering, index=plot_data.columns, name='cell_order')
     plot_data = plot_data.T.set_index(ordering, append=True).T
 
@@ -68,21 +212,53 @@ def plot_clustered_cell_cn_matrix(ax, cn_data, cn_field_name, cluster_field_name
     if max_cn is not None:
         plot_data[plot_data > max_cn] = max_cn
 
+    return plot_data
+
+
+def _get_cell_matrix_rgba(values, raw=False, vmin=None, vmax=None):
+    if raw:
+        return get_raw_rgba(values, vmin, vmax)
+    return get_cn_rgba(values)
+
+
+def plot_clustered_cell_cn_matrix(ax, cn_data, cn_field_name, cluster_field_name='cluster_id', raw=False, max_cn=13, clusters=None, downsample=True, dpi=None):
+    """ Plot a cell by bin copy number heatmap ordered by cluster
+
+    The heatmap is drawn as a single rasterized image, aggregated to the pixel size
+    of the axis if the matrix is larger than the axis.
+
+    Args:
+        ax: matplotlib axis
+        cn_data: copy number table with a cluster column, or scgenome.cnmatrix.CNMatrix
+        cn_field_name: field to plot
+
+    Kwargs:
+        cluster_field_name: cluster column
+        raw: plot raw values rather than colored by copy number state
+        max_cn: maximum copy number to plot
+        clusters: table of cell_id and cluster column, required if cn_data is a CNMatrix
+        downsample: aggregate cells and bins to the pixels of the axis, most frequent state or mean raw value
+        dpi: resolution of the saved figure used to calculate the axis size in pixels, defaults to the figure dpi
+    """
+    plot_data = _get_ordered_cell_matrix(
+        cn_data, cn_field_name, cluster_field_name=cluster_field_name, max_cn=max_cn, clusters=clusters)
+
     mat_chrom_idxs = plot_data.index.get_level_values(0).values
     chrom_boundaries = np.array([0] + list(np.where(mat_chrom_idxs[1:] != mat_chrom_idxs[:-1])[0]) + [plot_data.shape[0] - 1])
     chrom_sizes = chrom_boundaries[1:] - chrom_boundaries[:-1]
     chrom_mids = chrom_boundaries[:-1] + chrom_sizes / 2
 
-    mat_cluster_ids = plot_data.columns.get_level_values(1).values
-    cluster_boundaries = np.array([0] + list(np.where(mat_cluster_ids[1:] != mat_cluster_ids[:-1])[0]) + [plot_data.shape[1] - 1])
-    cluster_sizes = cluster_boundaries[1:] - cluster_boundaries[:-1]
-    cluster_mids = cluster_boundaries[:-1] + cluster_sizes / 2
+    values = plot_data.values.T.astype(float)
+    vmin, vmax = np.nanmin(values), np.nanmax(values)
 
-    cmap = None
-    if not raw:
-        cmap = get_cn_cmap(plot_data.values)
+    if downsample:
+        values = downsample_matrix(values, _get_axis_pixels(ax, dpi=dpi), raw=raw)
 
-    im = ax.imshow(plot_data.astype(float).T, aspect='auto', cmap=cmap)
+    num_cells, num_bins = plot_data.shape[1], plot_data.shape[0]
+    ax.imshow(
+        _get_cell_matrix_rgba(values, raw=raw, vmin=vmin, vmax=vmax),
+        aspect='auto', interpolation='nearest', rasterized=True,
+        extent=(-0.5, num_bins - 0.5, num_cells - 0.5, -0.5))
 
     ax.set(xticks=chrom_mids)
     ax.set(xticklabels=utils.chrom_names)
@@ -93,15 +269,69 @@ def plot_clustered_cell_cn_matrix(ax, cn_data, cn_field_name, cluster_field_name
     return plot_data
 
 
-def plot_clustered_cell_cn_matrix_figure(fig, cn_data, cn_field_name, cluster_field_name='cluster_id', raw=False, max_cn=13):
+def write_clustered_cell_cn_matrix_tiles(cn_data, cn_field_name, tiles_dir, cluster_field_name='cluster_id', raw=False, max_cn=13, clusters=None, tile_size=256):
+    """ Write a cell by bin copy number heatmap ordered by cluster as a multi-resolution set of png tiles
+
+    Level 0 has one pixel per cell and bin, and each subsequent level halves the
+    number of rows and columns, until a level fits in a single tile.  Tiles are
+    written to tiles_dir/{level}/{row}_{col}.png.
+
+    Args:
+        cn_data: copy number table with a cluster column, or scgenome.cnmatrix.CNMatrix
+        cn_field_name: field to plot
+        tiles_dir: directory of tiles
+
+    Kwargs:
+        cluster_field_name: cluster column
+        raw: plot raw values rather than colored by copy number state
+        max_cn: maximum copy number to plot
+        clusters: table of cell_id and cluster column, required if cn_data is a CNMatrix
+        tile_size: height and width of tiles in pixels
+
+    Returns:
+        pandas.DataFrame: ordered cell matrix as returned by plot_clustered_cell_cn_matrix
+    """
+    plot_data = _get_ordered_cell_matrix(
+        cn_data, cn_field_name, cluster_field_name=cluster_field_name, max_cn=max_cn, clusters=clusters)
+
+    values = plot_data.values.T.astype(float)
+    vmin, vmax = np.nanmin(values), np.nanmax(values)
+
+    level = 0
+    while True:
+        level_dir = os.path.join(tiles_dir, str(level))
+        os.makedirs(level_dir, exist_ok=True)
+
+        rgba = _get_cell_matrix_rgba(values, raw=raw, vmin=vmin, vmax=vmax)
+        for row in range(0, values.shape[0], tile_size):
+            for col in range(0, values.shape[1], tile_size):
+                plt.imsave(
+                    os.path.join(level_dir, f'{row // tile_size}_{col // tile_size}.png'),
+                    rgba[row:row + tile_size, col:col + tile_size])
+
+        if values.shape[0] <= tile_size and values.shape[1] <= tile_size:
+            break
+
+        values = downsample_matrix(
+            values, ((values.shape[0] + 1) // 2, (values.shape[1] + 1) // 2), raw=raw)
+        level += 1
+
+    logging.info(f'wrote {level + 1} levels of tiles to {tiles_dir}')
+
+    return plot_data
+
+
+def plot_clustered_cell_cn_matrix_figure(fig, cn_data, cn_field_name, cluster_field_name='cluster_id', raw=False, max_cn=13, clusters=None, downsample=True, dpi=None):
     ax = fig.add_axes([0.1,0.0,0.9,1.])
-    plot_data = plot_clustered_cell_cn_matrix(ax, cn_data, cn_field_name, cluster_field_name=cluster_field_name, raw=raw, max_cn=max_cn)
+    plot_data = plot_clustered_cell_cn_matrix(
+        ax, cn_data, cn_field_name, cluster_field_name=cluster_field_name, raw=raw, max_cn=max_cn, clusters=clusters,
+        downsample=downsample, dpi=dpi)
 
     cluster_ids = plot_data.columns.get_level_values(1).values
     color_mat = cncluster.get_cluster_colors(cluster_ids)
 
     ax = fig.add_axes([0.0,0.0,0.05,1.])
-    ax.imshow(np.array(color_mat)[::-1, np.newaxis], aspect='auto', origin='lower')
+    ax.imshow(np.array(color_mat)[::-1, np.newaxis], aspect='auto', origin='lower', rasterized=True)
     ax.grid(False)
     ax.set_xticks([])
     ax.set_yticks([])
@@ -129,28 +359,29 @@ def plot_cell_cn_profile(ax, cn_data, value_field_name, cn_field_name=None, max_
         - start
         - end
     """
-    chromosome_info = refgenome.info.chromosome_info[['chr', 'chromosome_start', 'chromosome_end']].copy()
-    chromosome_info['chr'] = pd.Categorical(chromosome_info['chr'], categories=cn_data['chr'].cat.categories)
-    plot_data = cn_data.merge(chromosome_info)
-    plot_data = plot_data[plot_data['chr'].isin(refgenome.info.chromosomes)]
-    plot_data['start'] = plot_data['start'] + plot_data['chromosome_start']
-    plot_data['end'] = plot_data['end'] + plot_data['chromosome_start']
+    import seaborn
+
+    chr_codes = refgenome.info.get_chromosome_codes(cn_data['chr'])
+    is_ref = chr_codes >= 0
+    start = refgenome.info.to_genome_coords(chr_codes[is_ref], cn_data['start'].values[is_ref])
+    values = cn_data[value_field_name].values[is_ref]
 
     if cn_field_name is not None:
+        states = cn_data[cn_field_name].values[is_ref]
         ax.scatter(
-            plot_data['start'], plot_data[value_field_name],
-            c=plot_data[cn_field_name], s=s,
-            cmap=get_cn_cmap(plot_data[cn_field_name].astype(int).values),
+            start, values,
+            c=states, s=s,
+            cmap=get_cn_cmap(states.astype(int)),
         )
     else:
         ax.scatter(
-            plot_data['start'], plot_data[value_field_name], s=s,
+            start, values, s=s,
         )
 
     if chromosome is not None:
-        chromosome_length = refgenome.info.chromosome_info.set_index('chr').loc[chromosome, 'chromosome_length']
-        chromosome_start = refgenome.info.chromosome_info.set_index('chr').loc[chromosome, 'chromosome_start']
-        chromosome_end = refgenome.info.chromosome_info.set_index('chr').loc[chromosome, 'chromosome_end']
+        chromosome_length = refgenome.info.chromosome_length[chromosome]
+        chromosome_start = refgenome.info.chromosome_start[chromosome]
+        chromosome_end = refgenome.info.chromosome_end[chromosome]
         xticks = np.arange(0, chromosome_length, 1e7)
         xticklabels = ['{0:d}M'.format(int(x / 1e6)) for x in xticks]
         xminorticks = np.arange(0, chromosome_length, 1e6)
@@ -174,16 +405,16 @@ def plot_cell_cn_profile(ax, cn_data, value_field_name, cn_field_name=None, max_
     if cn_field_name is not None:
         ax.set_ylim((-0.5, max_cn))
         ax.set_yticks(np.arange(0, max_cn, 2))
-    
+
     if chromosome is not None:
         seaborn.despine(ax=ax, offset=10, trim=False)
     else:
         seaborn.despine(ax=ax, offset=10, trim=True)
 
-    return chromosome_info
+    return refgenome.info.chromosome_info[['chr', 'chromosome_start', 'chromosome_end']]
 
 
-def plot_breakends(ax, breakends, lw=0.5):
+def plot_breakends(ax, breakends, lw=0.5, random_state=0):
     """ Plot breakpoint flags and arcs on a genome axis
 
     Args:
@@ -192,6 +423,7 @@ def plot_breakends(ax, breakends, lw=0.5):
     
     Kwargs:
         lw: line width for arcs
+        random_state: seed for the assignment of colors to predictions and the heights of flags
 
     The breakends table should have the following columns:
         - prediction_id
@@ -200,12 +432,13 @@ def plot_breakends(ax, breakends, lw=0.5):
         - strand
 
     """
-    chromosome_info = refgenome.info.chromosome_info[['chr', 'chromosome_start']].copy()
-    chromosome_info['chromosome'] = chromosome_info['chr']
+    import seaborn
 
-    plot_data = breakends.merge(chromosome_info)
-    plot_data = plot_data[plot_data['chr'].isin(refgenome.info.chromosomes)]
-    plot_data['plot_position'] = plot_data['position'] + plot_data['chromosome_start']
+    chr_codes = refgenome.info.get_chromosome_codes(breakends['chromosome'])
+    is_ref = chr_codes >= 0
+    plot_data = breakends.loc[is_ref, ['prediction_id', 'strand']].reset_index(drop=True)
+    plot_data['plot_position'] = refgenome.info.to_genome_coords(
+        chr_codes[is_ref], breakends['position'].values[is_ref])
 
     xlim = ax.get_xlim()
     xrng = xlim[1] - xlim[0]
@@ -218,35 +451,52 @@ def plot_breakends(ax, breakends, lw=0.5):
     head_width = yrng / 30.
     head_length = xrng / 100.
 
-    prediction_ids = list(plot_data['prediction_id'].unique())
-    random.shuffle(prediction_ids)
-    color_palette = seaborn.color_palette('hls', len(prediction_ids))
-    prediction_colors = dict(zip(prediction_ids, color_palette))
-
-    for idx in plot_data.index:
-        prediction_id = plot_data.loc[idx, 'prediction_id']
-        x = plot_data.loc[idx, 'plot_position']
-        strand = plot_data.loc[idx, 'strand']
-        y = np.random.uniform(ylim[0] + 0.75*yrng, ylim[0] + 0.95*yrng)
-        offset = (arrow_length, -arrow_length)[strand == '+']
-        color = prediction_colors[prediction_id]
-        ax.arrow(x, y, offset, 0, color=color, lw=lw, alpha=1.0, head_width=head_width, head_length=head_length)
-        ax.plot([x, x], [ylim[0], ylim[1]], color=color, lw=lw, ls='-', alpha=1.0)
-
-    for prediction_id, pred_breakends in plot_data.groupby('prediction_id'):
-        if len(pred_breakends.index) != 2:
-            continue
-        pos1 = pred_breakends['plot_position'].min()
-        pos2 = pred_breakends['plot_position'].max()
-        posmid = (pos1 + pos2) / 2.
-        height = 0.5 * yrng * (pos2 - pos1) / xrng
-        ypos = ylim[1]
-        yposmid = ypos + height
-        spl = scipy.interpolate.make_interp_spline([pos1, posmid, pos2], [ypos, yposmid, ypos], k=2)
-        pos = np.linspace(pos1, pos2, 100)
-        color = prediction_colors[prediction_id]
-        ax.plot(pos, spl(pos), ls='-', lw=lw, color=color)
-
+    rng = np.random.RandomState(random_state)
+
+    prediction_ids = rng.permutation(plot_data['prediction_id'].unique())
+    color_palette = np.array(seaborn.color_palette('hls', len(prediction_ids)))
+    prediction_codes = pd.Categorical(plot_data['prediction_id'], categories=prediction_ids).codes
+    colors = color_palette[prediction_codes]
+
+    # Flags pointing away from the strand of each breakend, drawn as
+    # a shaft and a triangular head, and a vertical line at each breakend
+    x = plot_data['plot_position'].values.astype(float)
+    y = rng.uniform(ylim[0] + 0.75*yrng, ylim[0] + 0.95*yrng, size=len(x))
+    direction = np.where(plot_data['strand'].values == '+', -1., 1.)
+    shaft_end = x + direction * arrow_length
+
+    shafts = np.stack([np.stack([x, y], axis=1), np.stack([shaft_end, y], axis=1)], axis=1)
+    heads = np.stack([
+        np.stack([shaft_end, y + head_width / 2.], axis=1),
+        np.stack([shaft_end + direction * head_length, y], axis=1),
+        np.stack([shaft_end, y - head_width / 2.], axis=1),
+    ], axis=1)
+    lines = np.stack([
+        np.stack([x, np.full(len(x), ylim[0])], axis=1),
+        np.stack([x, np.full(len(x), ylim[1])], axis=1),
+    ], axis=1)
+
+    ax.add_collection(matplotlib.collections.LineCollection(shafts, colors=colors, linewidths=lw))
+    ax.add_collection(matplotlib.collections.PolyCollection(heads, facecolors=colors, edgecolors=colors, linewidths=lw))
+    ax.add_collection(matplotlib.collections.LineCollection(lines, colors=colors, linewidths=lw, linestyles='-'))
+
+    # Quadratic arcs between the two breakends of each prediction
+    prediction_positions = plot_data.groupby('prediction_id')['plot_position'].agg(['min', 'max', 'size'])
+    prediction_positions = prediction_positions[prediction_positions['size'] == 2]
+
+    pos1 = prediction_positions['min'].values.astype(float)[:, np.newaxis]
+    pos2 = prediction_positions['max'].values.astype(float)[:, np.newaxis]
+    height = 0.5 * yrng * (pos2 - pos1) / xrng
+    t = np.linspace(-1., 1., 100)[np.newaxis, :]
+    arcs = np.stack([
+        (pos1 + pos2) / 2. + t * (pos2 - pos1) / 2.,
+        ylim[1] + height * (1. - t ** 2),
+    ], axis=2)
+    arc_colors = color_palette[pd.Categorical(prediction_positions.index, categories=prediction_ids).codes]
+
+    ax.add_collection(matplotlib.collections.LineCollection(arcs, colors=arc_colors, linewidths=lw, linestyles='-'))
+
+    ax.autoscale_view(scaley=False)
     ax.set_ylim((ylim[0], ylim[1] + 5))
 
 
@@ -293,17 +543,18 @@ def plot_cluster_cn_matrix(fig, cn_data, cn_field_name, cluster_field_name='clus
 
 def plot_pca_components(cn_data, n_components=4, plots_prefix=None):
     """ Plot the first n components of a PCA
+
+    Args:
+        cn_data: copy number table, or scgenome.cnmatrix.CNMatrix
     """
-    cn_matrix = (
-        cn_data
-        .set_index(['cell_id', 'chr', 'start', 'end'])['copy']
-        .unstack(level=[1, 2, 3]))
-    cn_matrix.shape
+    cn_matrix = cnmatrix.get_cn_matrix(cn_data).get_frame('copy', dtype=np.float64).T
 
     num_null = cn_matrix.isnull().sum(axis=1)
     cn_matrix = cn_matrix[num_null <= 800]
     cn_matrix = cn_matrix.dropna(axis='columns')
 
+    from sklearn.decomposition import PCA
+
     pca = PCA()
     pca.fit(cn_matrix.values)
 
@@ -322,3 +573,107 @@ def plot_pca_components(cn_data, n_components=4, plots_prefix=None):
     if plots_prefix is not None:
         fig.savefig(plots_prefix + 'pca_components.pdf', bbox_inches='tight')
 
+
+
+def render_plot(filename, plot_func, *args, **kwargs):
+    """ Draw a figure and save it, closing the figure once saved.
+
+    Args:
+        filename (str): filename of the saved figure, or None to return the open figure
+        plot_func (callable): function of args and kwargs returning a matplotlib figure
+
+    Returns:
+        str or matplotlib.figure.Figure: saved filename, or the figure if not saved
+    """
+    fig = plot_func(*args, **kwargs)
+
+    if filename is None:
+        return fig
+
+    fig.savefig(filename, bbox_inches='tight')
+    plt.close(fig)
+
+    return filename
+
+
+def _init_plot_worker():
+    plt.switch_backend('agg')
+
+
+class DeferredPlots(object):
+    def __init__(self):
+        """ Record of figures to draw and save on demand.
+        """
+        self.plots = []
+
+    def add(self, filename, plot_func, *args, **kwargs):
+        """ Record a figure to be saved to a file.
+
+        Args:
+            filename (str): filename of the saved figure
+            plot_func (callable): module level function of args and kwargs returning a matplotlib figure
+        """
+        if filename is None:
+            raise ValueError('deferred plots require a filename')
+
+        self.plots.append((filename, plot_func, args, kwargs))
+
+    def render(self, max_workers=None):
+        """ Draw and save recorded figures, in a process pool if requested.
+
+        KwArgs:
+            max_workers (int): number of worker processes, defaults to drawing in this process
+
+        Returns:
+            list of str: saved filenames
+        """
+        plots, self.plots = self.plots, []
+
+        if max_workers is None or max_workers <= 1:
+            return [render_plot(filename, plot_func, *args, **kwargs)
+                for filename, plot_func, args, kwargs in plots]
+
+        # Plots are typically rendered after clustering, spawn rather than fork
+        # workers as forking after umap has started numba threads can deadlock
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_plot_worker) as executor:
+            futures = [executor.submit(render_plot, filename, plot_func, *args, **kwargs)
+                for filename, plot_func, args, kwargs in plots]
+            return [future.result() for future in futures]
+
+
+def make_plot(plots, filename, plot_func, *args, return_figure=False, **kwargs):
+    """ Draw, defer or skip a figure according to a plots switch.
+
+    Figures without a filename are skipped, so that no figures are left open,
+    unless return_figure is set.
+
+    Args:
+        plots (bool or DeferredPlots): draw figures now if True, skip if False,
+            or record figures with a filename for drawing later
+        filename (str): filename of the saved figure, or None
+        plot_func (callable): function of args and kwargs returning a matplotlib figure
+
+    KwArgs:
+        return_figure (bool): draw a figure without a filename now and return it open. Defaults to False.
+
+    Returns:
+        matplotlib.figure.Figure: the open figure if drawn without a filename, otherwise None
+    """
+    if not plots:
+        return None
+
+    if filename is None:
+        if return_figure:
+            return plot_func(*args, **kwargs)
+        if isinstance(plots, DeferredPlots):
+            raise ValueError('deferred plots require a filename')
+        return None
+
+    if isinstance(plots, DeferredPlots):
+        plots.add(filename, plot_func, *args, **kwargs)
+    else:
+        render_plot(filename, plot_func, *args, **kwargs)
+
+    return None
@@ -56,6 +56,53 @@ class CsvWriterError(Exception):
     pass
 
 
+def _import_parquet():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.compute
+        import pyarrow.dataset
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def _get_filter_values(values, filter_values):
+    """
+    values selected by a filter
+    :param values: unique values of the filtered column
+    :type values: array like
+    :param filter_values: values to select, or a function of the unique values returning a boolean mask
+    :type filter_values: list or callable
+    :return: selected values
+    :rtype: list
+    """
+    if callable(filter_values):
+        values = pd.Series(values)
+        return list(values[np.asarray(filter_values(values), dtype=bool)])
+    return list(filter_values)
+
+
+def _get_filter_mask(df, filters):
+    """
+    rows of a dataframe selected by a set of filters
+    :param df: data to filter
+    :type df: pandas.DataFrame
+    :param filters: values to select, or functions of unique values, keyed by column
+    :type filters: dict
+    :return: boolean mask of selected rows
+    :rtype: numpy.ndarray
+    """
+    mask = np.ones(len(df.index), dtype=bool)
+    for column, filter_values in filters.items():
+        if df[column].dtype.name == 'category':
+            values = df[column].cat.categories
+        else:
+            values = pd.unique(df[column])
+        mask &= df[column].isin(_get_filter_values(values, filter_values)).values
+    return mask
+
+
 def get_dtypes_from_df(df, na_rep='NA'):
     pandas_to_std_types = {
         "bool": "bool",
@@ -79,17 +126,20 @@ def get_dtypes_from_df(df, na_rep='NA'):
 
 
 class CsvInput(object):
-    def __init__(self, filepath, na_rep='NA'):
+    def __init__(self, filepath, na_rep='NA', use_columnar=True):
         """
         csv file and all related metadata
         :param filepath: path to csv
         :type filepath: str
         :param na_rep: replace na with this
         :type na_rep: str
+        :param use_columnar: read the parquet sibling of the csv if present
+        :type use_columnar: bool
         """
         self.filepath = filepath
         self.compression = self.__get_compression_type_pandas()
         self.na_rep = na_rep
+        self.use_columnar = use_columnar
 
         if os.path.exists(self.yaml_file):
             metadata = self.__parse_metadata()
@@ -102,6 +152,32 @@ class CsvInput(object):
     def yaml_file(self):
         return self.filepath + '.yaml'
 
+    @property
+    def columnar_file(self):
+        return self.filepath + '.parquet'
+
+    @property
+    def has_columnar(self):
+        """
+        whether an up to date parquet sibling of the csv can be read
+        :return: True if the parquet file exists and is not older than the csv
+        :rtype: bool
+        """
+        if not self.use_columnar or not os.path.exists(self.columnar_file):
+            return False
+
+        if os.path.exists(self.filepath) and os.path.getmtime(self.columnar_file) < os.path.getmtime(self.filepath):
+            logging.getLogger("single_cell.utils.csv").warning(
+                "ignoring {}, older than {}".format(self.columnar_file, self.filepath))
+            return False
+
+        if _import_parquet() is None:
+            logging.getLogger("single_cell.utils.csv").warning(
+                "pyarrow is not installed, ignoring {}".format(self.columnar_file))
+            return False
+
+        return True
+
     def __detect_sep_from_header(self, header):
         """
         detect whether file is tab or comma separated from header
@@ -192,7 +268,86 @@ class CsvInput(object):
             dtypes = self.__generate_dtypes(sep=sep)
             return header, sep, dtypes, columns
 
-    def read_csv(self, chunksize=None, dtypes_override=None, usecols=None):
+    def __recast_columnar(self, df, dtypes):
+        # match the dtypes produced by the csv reader
+        for column in df.columns:
+            dtype = dtypes.get(column)
+            if dtype is None or dtype == 'int':
+                continue
+            if dtype == 'category':
+                if df[column].dtype.name != 'category':
+                    df[column] = df[column].astype('category')
+            elif dtype in ('str', 'bool'):
+                df[column] = df[column].astype(object)
+                df.loc[df[column].isnull(), column] = np.nan
+            else:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    def __read_columnar(self, dtypes, chunksize=None, usecols=None, filters=None):
+        pyarrow = _import_parquet()
+
+        columns = self.columns
+        if usecols is not None:
+            columns = [col for col in self.columns if col in usecols]
+
+        # Categorical overrides are read directly as arrow dictionaries
+        read_dictionary = [col for col in columns if dtypes.get(col) == 'category']
+
+        try:
+            dataset = pyarrow.dataset.dataset(
+                self.columnar_file,
+                format=pyarrow.dataset.ParquetFileFormat(
+                    read_options=pyarrow.dataset.ParquetReadOptions(dictionary_columns=read_dictionary)))
+        except Exception:
+            logging.getLogger("single_cell.utils.csv").exception(
+                f'loading failed for {self.columnar_file} with columns {columns}')
+            raise
+
+        # Filters are pushed down to the parquet reader, skipping row groups
+        # using column statistics where possible
+        expression = None
+        for column, filter_values in (filters or {}).items():
+            if callable(filter_values):
+                values = dataset.to_table(columns=[column]).column(column)
+                values = pyarrow.compute.unique(values).to_pandas()
+                filter_values = _get_filter_values(values, filter_values)
+            value_type = dataset.schema.field(column).type
+            if pyarrow.types.is_dictionary(value_type):
+                value_type = value_type.value_type
+            column_expression = pyarrow.dataset.field(column).isin(
+                pyarrow.array(list(filter_values), type=value_type))
+            if expression is None:
+                expression = column_expression
+            else:
+                expression = expression & column_expression
+
+        def convert(table):
+            return self.__recast_columnar(table.to_pandas(), dtypes)
+
+        if chunksize:
+            return (
+                convert(batch) for batch in dataset.to_batches(
+                    batch_size=chunksize, columns=columns, filter=expression)
+                if batch.num_rows > 0)
+        else:
+            return convert(dataset.to_table(columns=columns, filter=expression))
+
+    def read_csv(self, chunksize=None, dtypes_override=None, usecols=None, filters=None):
+        """
+        read the csv, or its parquet sibling if present
+        :param chunksize: read in chunks of this many rows and return an iterator
+        :type chunksize: int
+        :param dtypes_override: dtypes replacing those in the yaml metadata
+        :type dtypes_override: dict
+        :param usecols: subset of columns to read
+        :type usecols: list
+        :param filters: values to select, or functions of unique values returning a
+            boolean mask, keyed by column
+        :type filters: dict
+        :return: data or iterator of data chunks
+        :rtype: pandas.DataFrame
+        """
         dtypes = {k: v for k, v in self.dtypes.items() if v != "NA"}
 
         if dtypes_override is not None:
@@ -200,49 +355,74 @@ class CsvInput(object):
                 if name in dtypes:
                     dtypes[name] = dtype
 
-        if self.header:
-            header = 0
-            names = None
+        if filters:
+            for column in filters:
+                if column not in self.columns:
+                    raise ValueError(f'filter column {column} not in columns')
 
-        else:
-            header = None
-            names = self.columns
+        # Filter columns are read and dropped after filtering if not requested
+        read_usecols = usecols
+        drop_cols = []
+        if filters and usecols is not None:
+            drop_cols = [col for col in filters if col not in usecols]
+            read_usecols = list(usecols) + drop_cols
 
-        dtypes_read = dtypes.copy()
-        for column in dtypes_read:
-            if dtypes_read[column] == 'int':
-                dtypes_read[column] = 'float'
-            if dtypes_read[column] == 'bool':
-                dtypes_read[column] = 'object'
+        filter_chunks = False
 
-        try:
-            data = pd.read_csv(
-                self.filepath, compression=self.compression, chunksize=chunksize,
-                sep=self.sep, header=header, names=names, usecols=usecols, dtype=dtypes_read)
-        except pd.errors.EmptyDataError:
-            data = pd.DataFrame(columns=self.columns)
-        except Exception:
-           logging.getLogger("single_cell.utils.csv").exception(
-               f'loading failed for {self.filepath} with columns {names} and dtypes {dtypes}')
-           raise
+        if self.has_columnar:
+            data = self.__read_columnar(dtypes, chunksize=chunksize, usecols=read_usecols, filters=filters)
+
+        else:
+            if self.header:
+                header = 0
+                names = None
+
+            else:
+                header = None
+                names = self.columns
+
+            dtypes_read = dtypes.copy()
+            for column in dtypes_read:
+                if dtypes_read[column] == 'int':
+                    dtypes_read[column] = 'float'
+                if dtypes_read[column] == 'bool':
+                    dtypes_read[column] = 'object'
+
+            # Filter csv data chunkwise to avoid loading the full table
+            filter_chunks = bool(filters)
+            read_chunksize = chunksize
+            if filter_chunks and not read_chunksize:
+                read_chunksize = 10 ** 6
+
+            try:
+                data = pd.read_csv(
+                    self.filepath, compression=self.compression, chunksize=read_chunksize,
+                    sep=self.sep, header=header, names=names, usecols=read_usecols, dtype=dtypes_read)
+            except pd.errors.EmptyDataError:
+                data = pd.DataFrame(columns=self.columns)
+                filter_chunks = False
+            except Exception:
+               logging.getLogger("single_cell.utils.csv").exception(
+                   f'loading failed for {self.filepath} with columns {names} and dtypes {dtypes}')
+               raise
 
         def __verify_data(df):
             # Check columns
             cols = self.columns
-            if usecols is not None:
+            if read_usecols is not None:
                 cols = []
-                for col in usecols:
+                for col in read_usecols:
                     if col not in self.columns:
                         raise ValueError(f'requested column {col} not in columns')
                 for col in self.columns:
-                    if col in usecols:
+                    if col in read_usecols:
                         cols.append(col)
             if not list(df.columns.values) == cols:
                 raise CsvParseError("metadata mismatch in {}".format(self.filepath))
 
             # recast column data types
             for column in dtypes:
-                if usecols is not None and column not in usecols:
+                if read_usecols is not None and column not in read_usecols:
                     continue
                 try:
                     if dtypes[column] == 'int':
@@ -257,16 +437,39 @@ class CsvInput(object):
                     logging.getLogger("single_cell.utils.csv").error(
                         f'unable to convert column {column} to {dtypes[column]}')
 
+        def __filter_data(df):
+            if filter_chunks:
+                df = df[_get_filter_mask(df, filters)].copy()
+            if drop_cols:
+                df = df.drop(columns=drop_cols)
+            return df
+
         def return_gen(df_iterator):
             for df in df_iterator:
                 __verify_data(df)
+                df = __filter_data(df)
+                if filter_chunks and len(df.index) == 0:
+                    continue
                 yield df
 
         if chunksize:
             return return_gen(data)
+        elif filter_chunks:
+            chunks = []
+            for df in data:
+                __verify_data(df)
+                chunks.append(__filter_data(df))
+            if len(chunks) == 0:
+                return pd.DataFrame(columns=[col for col in self.columns if usecols is None or col in usecols])
+            chunks = [df for df in chunks if len(df.index) > 0] or chunks[:1]
+            categorical_cols = [col for col in chunks[0] if chunks[0][col].dtype.name == 'category']
+            data = pd.concat(chunks, ignore_index=True)
+            for col in categorical_cols:
+                data[col] = data[col].astype('category')
+            return data
         else:
             __verify_data(data)
-            return data
+            return __filter_data(data)
 
 
 class CsvOutput(object):
@@ -285,6 +488,10 @@ class CsvOutput(object):
     def yaml_file(self):
         return self.filepath + '.yaml'
 
+    @property
+    def columnar_file(self):
+        return self.filepath + '.parquet'
+
     @property
     def header_line(self):
         return self.sep.join(self.columns) + '\n'
@@ -319,7 +526,20 @@ class CsvOutput(object):
         with getFileHandle(self.yaml_file, 'wt') as f:
             yaml.safe_dump(yamldata, f, default_flow_style=False)
 
-    def write_df(self, df):
+    def write_columnar(self, df):
+        """
+        write a parquet sibling of the csv
+        :param df: data to write
+        :type df: pandas.DataFrame
+        """
+        pyarrow = _import_parquet()
+        if pyarrow is None:
+            raise CsvWriterError("pyarrow is required to write {}".format(self.columnar_file))
+
+        table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        pyarrow.parquet.write_table(table, self.columnar_file)
+
+    def write_df(self, df, write_columnar=False):
         if self.columns:
             if not self.columns == df.columns.values:
                 raise CsvWriterError("Writer initialized with wrong col names")
@@ -336,6 +556,9 @@ class CsvOutput(object):
 
         self.__write_yaml()
 
+        if write_columnar:
+            self.write_columnar(df)
+
     def write_csv_data(self, reader, writer):
         reader_gzip = type(reader) == gzip.GzipFile
         writer_gzip = type(writer) == gzip.GzipFile
@@ -581,6 +804,26 @@ def write_dataframe_to_csv_and_yaml(df, outfile, write_header=False, sep=','):
     csvoutput = CsvOutput(outfile, header=write_header, sep=sep)
     csvoutput.write_df(df)
 
+def write_columnar_sibling(infile):
+    """
+    write a parquet copy of a csv file next to it, typed by its yaml metadata
+    :param infile: path to csv
+    :type infile: str
+    :return: path to the parquet file
+    :rtype: str
+    """
+    csvinput = CsvInput(infile, use_columnar=False)
+    df = csvinput.read_csv()
+
+    csvoutput = CsvOutput(
+        infile, header=csvinput.header, columns=csvinput.columns,
+        sep=csvinput.sep, dtypes=csvinput.dtypes
+    )
+    csvoutput.write_columnar(df)
+
+    return csvoutput.columnar_file
+
+
 def get_metadata(infile):
     csvinput = CsvInput(infile)
     return csvinput.header, csvinput.dtypes, csvinput.columns
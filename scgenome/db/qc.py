@@ -6,8 +6,7 @@ import datamanagement.transfer_files
 import scgenome.loaders.align
 import scgenome.loaders.hmmcopy
 import scgenome.loaders.qc
-from scgenome.db.loaders.qc_from_files import _concat_results_tables
-from scgenome.db.loaders.qc_from_files import _aggregate_results_tables
+from scgenome.db.qc_from_files import _load_results_tables
 
 def cache_qc_results(
         ticket_id,
@@ -61,9 +60,35 @@ def get_qc_data(
         sample_ids=None,
         additional_hmmcopy_reads_cols=None,
         do_caching=False,
+        cache=None,
+        max_workers=None,
+        cell_ids=None,
+        library_ids=None,
+        chromosomes=None,
+        memory_profile=None,
     ):
+    """ Load qc data for multiple tickets.
 
-    results_tables = {}
+    Args:
+        ticket_ids (list of str): tickets to load
+        local_directory (str): directory containing a results directory per ticket
+
+    KwArgs:
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        additional_hmmcopy_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
+        do_caching (bool, optional): download results from tantalus before loading. Defaults to False.
+        cache (scgenome.loaders.cache.TableCache or str, optional): cache or cache directory for processed tables. Defaults to None.
+        max_workers (int, optional): number of worker processes loading tickets in parallel, with at most max_workers tickets in flight. Defaults to None, load serially.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+        chromosomes (list of str, optional): Set of chromosomes to filter hmmcopy reads and segments for. Defaults to None.
+        memory_profile (str, optional): 'compact' to load hmmcopy reads with downcast dtypes and a bin index. Defaults to None.
+
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    load_tasks = []
 
     for ticket_id in ticket_ids:
         if do_caching:
@@ -71,14 +96,18 @@ def get_qc_data(
 
         ticket_directory = os.path.join(local_directory, ticket_id)
 
-        ticket_results = scgenome.loaders.qc.load_qc_data(
-            ticket_directory, sample_ids=sample_ids,
-            additional_hmmcopy_reads_cols=additional_hmmcopy_reads_cols)
-
-        results_tables = _aggregate_results_tables(results_tables, ticket_results)
-   
-    results_tables = _concat_results_tables(results_tables)
-
-    scgenome.utils.union_categories(results_tables.values())
-
-    return results_tables
+        load_tasks.append((
+            scgenome.loaders.qc.load_qc_data,
+            (ticket_directory,),
+            dict(
+                sample_ids=sample_ids,
+                additional_hmmcopy_reads_cols=additional_hmmcopy_reads_cols,
+                cache=cache,
+                cell_ids=cell_ids,
+                library_ids=library_ids,
+                chromosomes=chromosomes,
+                memory_profile=memory_profile,
+            ),
+        ))
+
+    return _load_results_tables(load_tasks, max_workers=max_workers)
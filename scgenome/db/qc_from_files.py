@@ -1,43 +1,112 @@
 import os
 import logging
-import datamanagement.transfer_files
+import collections
+import multiprocessing
+import concurrent.futures
 
 import scgenome.loaders.align
 import scgenome.loaders.hmmcopy
 import scgenome.loaders.qc
+import scgenome.utils
 
 
 def get_qc_data_from_filenames(annotation_metrics_list, hmmcopy_reads_list, hmmcopy_segs_list, 
     hmmcopy_metrics_list, alignment_metrics_list, gc_metrics_list, 
-    sample_ids=None, additional_hmmcopy_reads_cols=None
+    sample_ids=None, additional_hmmcopy_reads_cols=None, cache=None,
+    max_workers=None, cell_ids=None, library_ids=None, chromosomes=None,
+    memory_profile=None,
 ):
 
-    results_tables = {}
-
     data = zip(annotation_metrics_list, hmmcopy_reads_list, hmmcopy_segs_list, 
         hmmcopy_metrics_list, alignment_metrics_list, gc_metrics_list
     )
 
+    load_tasks = []
+
     for ann_metrics, hmm_reads, hmm_segs, hmm_metrics, align_metrics, gc_metrics in data:
-        
-        qc_results = scgenome.loaders.qc.load_qc_data_from_files(hmm_reads, hmm_segs, 
-            hmm_metrics, align_metrics, gc_metrics, annotation_metrics=ann_metrics, 
-            sample_id=sample_ids, additional_hmmcopy_reads_cols=additional_hmmcopy_reads_cols
-        )
+        load_tasks.append((
+            scgenome.loaders.qc.load_qc_data_from_files,
+            (hmm_reads, hmm_segs, hmm_metrics, align_metrics, gc_metrics),
+            dict(
+                annotation_metrics=ann_metrics, sample_id=sample_ids,
+                additional_hmmcopy_reads_cols=additional_hmmcopy_reads_cols,
+                cache=cache, cell_ids=cell_ids, library_ids=library_ids,
+                chromosomes=chromosomes, memory_profile=memory_profile,
+            ),
+        ))
 
-        results_tables = _aggregate_results_tables(results_tables, qc_results)
+    return _load_results_tables(load_tasks, max_workers=max_workers)
 
-    results_tables = _concat_results_tables(results_tables)
 
-    scgenome.utils.union_categories(results_tables.values())
+def _load_results_tables(load_tasks, max_workers=None):
+    """ Load and merge results tables for multiple libraries, optionally in worker processes.
 
-    return results_tables
+    At most max_workers libraries are loaded at a time, and a library is only
+    submitted once an earlier result has been collected. Peak memory is the
+    collected per library tables, which are needed for the merged output,
+    plus at most max_workers results in flight, rather than every library
+    result waiting to be unpickled at once.
 
+    Args:
+        load_tasks (list): tuples of (load_func, args, kwargs), one per library
 
-def _concat_results_tables(results_tables):
-    for table_name, table_data in results_tables.items():
-        results_tables[table_name] = scgenome.utils.concat_with_categories(table_data)
-    return results_tables
+    KwArgs:
+        max_workers (int, optional): number of worker processes, None or 1 to load serially. Defaults to None.
+
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    results_tables = {}
+
+    if max_workers is None or max_workers <= 1:
+        for load_func, args, kwargs in load_tasks:
+            results_tables = _aggregate_results_tables(results_tables, load_func(*args, **kwargs))
+
+    else:
+        load_tasks = iter(load_tasks)
+
+        # Spawned rather than forked workers, forking after numba or openmp
+        # threads have started, for instance by umap, can deadlock
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = collections.deque()
+
+            def submit_next():
+                for load_func, args, kwargs in load_tasks:
+                    futures.append(executor.submit(load_func, *args, **kwargs))
+                    return
+
+            for _ in range(max_workers):
+                submit_next()
+
+            # Aggregate in submission order so row order matches serial loading,
+            # releasing each future once its tables have been collected
+            while futures:
+                future = futures.popleft()
+                results_tables = _aggregate_results_tables(results_tables, future.result())
+                submit_next()
+
+    return _merge_results_tables(results_tables)
+
+
+def _merge_results_tables(results_tables):
+    """ Concatenate per library tables, then unify categories across the concatenated tables.
+
+    Args:
+        results_tables (dict): lists of pandas.DataFrame keyed by table name
+
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    merged_tables = {}
+    for table_name in list(results_tables.keys()):
+        merged_tables[table_name] = scgenome.utils.concat_with_categories(results_tables.pop(table_name))
+
+    scgenome.utils.union_categories(merged_tables.values())
+
+    return merged_tables
 
 
 def _aggregate_results_tables(results_tables, ticket_results):
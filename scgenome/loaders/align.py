@@ -3,6 +3,7 @@ from collections import defaultdict
 
 import pandas as pd
 import scgenome.loaders.utils
+import scgenome.loaders.cache
 import scgenome.utils
 import scgenome.csvutils
 import yaml
@@ -41,30 +42,29 @@ table_suffixes = defaultdict(lambda: _table_suffixes_v0_2_25, {
 })
 
 
-def load_align_data_from_files(align_metrics, gc_metrics=None):
+def load_align_data_from_files(align_metrics, gc_metrics=None, cache=None,
+    cell_ids=None, sample_ids=None, library_ids=None):
 
     results_tables = {}
     
-    results_tables["align_metrics"] = process_alignment_data(align_metrics, "align_metrics")
+    results_tables["align_metrics"] = process_alignment_data(align_metrics, "align_metrics", cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
     
     if gc_metrics:
-        results_tables["gc_metrics"] = process_alignment_data(gc_metrics, "gc_metrics")
+        results_tables["gc_metrics"] = process_alignment_data(gc_metrics, "gc_metrics", cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
 
     scgenome.utils.union_categories(results_tables.values())
 
     return results_tables
 
 
-def load_align_data(
-        results_dir,
-):
-    """ Load copy number tables
-    
+def find_align_filepaths(results_dir):
+    """ Find align tables
+
     Args:
-        results_dir (str): results directory to load from.
-    
+        results_dir (str): results directory to search.
+
     Returns:
-        dict: pandas.DataFrame tables keyed by table name
+        dict: table filepaths keyed by table name
     """
 
     analysis_dirs = scgenome.loaders.utils.find_results_directories(
@@ -86,7 +86,7 @@ def load_align_data(
 
     version = manifest['meta']['version']
 
-    results_tables = {}
+    filepaths = {}
 
     for table_name, suffix in table_suffixes[version]:
         filenames = scgenome.loaders.utils.find_filenames(manifest['filenames'], suffix)
@@ -98,16 +98,47 @@ def load_align_data(
 
         filepath = os.path.join(align_results_dir, filename)
 
-        results_tables[table_name] = process_alignment_data(filepath, table_name)
+        filepaths[table_name] = filepath
+
+    return filepaths
+
+
+def load_align_data(
+        results_dir,
+        cache=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+):
+    """ Load copy number tables
+    
+    Args:
+        results_dir (str): results directory to load from.
+
+    KwArgs:
+        cache (scgenome.loaders.cache.TableCache or str, optional): cache or cache directory for processed tables. Defaults to None.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+    
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    filepaths = find_align_filepaths(results_dir)
+
+    results_tables = {}
+
+    for table_name, filepath in filepaths.items():
+        results_tables[table_name] = process_alignment_data(filepath, table_name, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
 
     scgenome.utils.union_categories(results_tables.values())
 
     return results_tables
 
 
-def process_alignment_data(filepath, table_name):
-
-        csv_input = scgenome.csvutils.CsvInput(filepath)
+def process_alignment_data(filepath, table_name, cache=None,
+        cell_ids=None, sample_ids=None, library_ids=None):
 
         dtypes_override = None
         if table_name == 'align_metrics':
@@ -121,10 +152,24 @@ def process_alignment_data(filepath, table_name):
             dtypes_override = yaml.load(open(dtypes_filename))
             dtypes_override = {a['name']: a['dtype'] for a in dtypes_override}
 
-        data = csv_input.read_csv(dtypes_override=dtypes_override)
+        return scgenome.loaders.cache.cached_load(
+            cache, _read_alignment_data, filepath,
+            dtypes_override=dtypes_override,
+            cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
+
+
+def _read_alignment_data(filepath, dtypes_override=None, cell_ids=None, sample_ids=None, library_ids=None):
+
+        csv_input = scgenome.csvutils.CsvInput(filepath)
+
+        filters = scgenome.loaders.utils.get_read_filters(
+            csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
+
+        data = csv_input.read_csv(dtypes_override=dtypes_override, filters=filters)
 
-        data['sample_id'] = [a.split('-')[0] for a in data['cell_id']]
-        data['library_id'] = [a.split('-')[1] for a in data['cell_id']]
+        data['cell_id'] = pd.Categorical(data['cell_id'])
+        data['sample_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 0)
+        data['library_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 1)
 
         for col in _categorical_cols:
             if col in data:
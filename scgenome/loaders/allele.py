@@ -11,6 +11,10 @@ import scgenome.csvutils
 def load_haplotype_allele_data(
         results_dir,
         filter_sample_id=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+        chromosomes=None,
     ):
     """ Load the haplotype allele count data from the pseudobulk results paths
     
@@ -19,6 +23,10 @@ def load_haplotype_allele_data(
 
     KwArgs:
         filter_sample_id (str): specific sample for which to obtain results
+        cell_ids (list of str): restrict to set of cell ids
+        sample_ids (list of str): restrict to set of sample ids
+        library_ids (list of str): restrict to set of library ids
+        chromosomes (list of str): restrict to set of chromosomes
 
     Returns:
         dict of pandas.DataFrame: Haplotype allele data
@@ -55,31 +63,48 @@ def load_haplotype_allele_data(
     files = scgenome.loaders.utils.get_pseudobulk_files(
         pseudobulk_dir[0], suffix)
 
-    return process_allele_data(files)
+    return process_allele_data(files, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
 
 
-def load_haplotype_allele_data_from_file(files):
-    return process_allele_data(scgenome.loaders.utils._prep_filenames_for_loading(files))
+def load_haplotype_allele_data_from_file(files, cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None):
+    return process_allele_data(
+        scgenome.loaders.utils._prep_filenames_for_loading(files),
+        cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
 
 
-def process_allele_data(files):
+def process_allele_data(files, cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None):
     allele_counts = []
 
     for sample_id, library_id, filepath in files:
         logging.info('Loading haplotype allele counts from {}'.format(filepath))
 
+        if sample_id is not None and sample_ids is not None and sample_id not in sample_ids:
+            logging.info(f'skipping {sample_id}, not in {sample_ids}')
+            continue
+
+        if library_id is not None and library_ids is not None and library_id not in library_ids:
+            logging.info(f'skipping {library_id}, not in {library_ids}')
+            continue
+
         csv_input = scgenome.csvutils.CsvInput(filepath)
+
+        filters = scgenome.loaders.utils.get_read_filters(
+            csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids,
+            chromosomes=chromosomes, chromosome_col='chromosome')
+
         data = csv_input.read_csv(
             dtypes_override={
                 'chromosome': 'category',
                 'cell_id': 'category',
-        })
+            },
+            filters=filters,
+        )
 
         if library_id is not None:
-            data['library_id'] = pd.Series([library_id], dtype="category")
+            data['library_id'] = pd.Series([library_id] * len(data.index), index=data.index, dtype="category")
 
         if sample_id is not None:
-            data['sample_id'] = pd.Series([sample_id], dtype="category")
+            data['sample_id'] = pd.Series([sample_id] * len(data.index), index=data.index, dtype="category")
 
         logging.info(f'Loaded haplotype allele counts table with shape {data.shape}, memory {data.memory_usage().sum()}')
 
@@ -3,6 +3,7 @@ from collections import defaultdict
 
 import pandas as pd
 import scgenome.loaders.utils
+import scgenome.loaders.cache
 import scgenome.utils
 import scgenome.csvutils
 import yaml
@@ -27,14 +28,15 @@ table_suffixes = defaultdict(lambda: _table_suffixes_v0_2_25, {
 })
 
 
-def load_annotation_data_from_file(filepath, table_name="annotation_metrics"):
+def load_annotation_data_from_file(filepath, table_name="annotation_metrics", cache=None,
+    cell_ids=None, sample_ids=None, library_ids=None):
     
     results_tables = {}
 
     if table_name  == 'annotation_metrics':
-        data = process_annotation_file(filepath, is_anno_metrics_table=True)
+        data = process_annotation_file(filepath, is_anno_metrics_table=True, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
     else:
-        data = process_annotation_file(filepath, is_anno_metrics_table=False)
+        data = process_annotation_file(filepath, is_anno_metrics_table=False, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
 
     results_tables[table_name] = data
 
@@ -43,16 +45,14 @@ def load_annotation_data_from_file(filepath, table_name="annotation_metrics"):
     return results_tables
 
 
-def load_annotation_data(
-        results_dir,
-):
-    """ Load copy number tables
-    
+def find_annotation_filepaths(results_dir):
+    """ Find annotation tables
+
     Args:
-        results_dir (str): results directory to load from.
-    
+        results_dir (str): results directory to search.
+
     Returns:
-        dict: pandas.DataFrame tables keyed by table name
+        dict: table filepaths keyed by table name
     """
 
     analysis_dirs = scgenome.loaders.utils.find_results_directories(
@@ -74,7 +74,7 @@ def load_annotation_data(
 
     version = manifest['meta']['version']
 
-    results_tables = {}
+    filepaths = {}
 
     for table_name, suffix in table_suffixes[version]:
         filenames = scgenome.loaders.utils.find_filenames(manifest['filenames'], suffix)
@@ -86,10 +86,42 @@ def load_annotation_data(
 
         filepath = os.path.join(annotation_results_dir, filename)
 
+        filepaths[table_name] = filepath
+
+    return filepaths
+
+
+def load_annotation_data(
+        results_dir,
+        cache=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+):
+    """ Load copy number tables
+    
+    Args:
+        results_dir (str): results directory to load from.
+
+    KwArgs:
+        cache (scgenome.loaders.cache.TableCache or str, optional): cache or cache directory for processed tables. Defaults to None.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+    
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    filepaths = find_annotation_filepaths(results_dir)
+
+    results_tables = {}
+
+    for table_name, filepath in filepaths.items():
         if table_name  == 'annotation_metrics':
-            data = process_annotation_file(filepath, is_anno_metrics_table=True)
+            data = process_annotation_file(filepath, is_anno_metrics_table=True, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
         else:
-            data = process_annotation_file(filepath, is_anno_metrics_table=False)
+            data = process_annotation_file(filepath, is_anno_metrics_table=False, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
 
         results_tables[table_name] = data
 
@@ -98,9 +130,8 @@ def load_annotation_data(
     return results_tables
 
 
-def process_annotation_file(filepath, is_anno_metrics_table=False):
-    csv_input = scgenome.csvutils.CsvInput(filepath)
-
+def process_annotation_file(filepath, is_anno_metrics_table=False, cache=None,
+        cell_ids=None, sample_ids=None, library_ids=None):
     dtypes_override = None
     if is_anno_metrics_table:
         dtypes_directory = os.path.join(os.path.dirname(__file__), 'dtypes')
@@ -108,10 +139,23 @@ def process_annotation_file(filepath, is_anno_metrics_table=False):
         dtypes_override = yaml.load(open(dtypes_filename))
         dtypes_override = {a['name']: a['dtype'] for a in dtypes_override}
 
-    data = csv_input.read_csv(dtypes_override=dtypes_override)
+    return scgenome.loaders.cache.cached_load(
+        cache, _read_annotation_file, filepath,
+        dtypes_override=dtypes_override,
+        cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
+
+
+def _read_annotation_file(filepath, dtypes_override=None, cell_ids=None, sample_ids=None, library_ids=None):
+    csv_input = scgenome.csvutils.CsvInput(filepath)
+
+    filters = scgenome.loaders.utils.get_read_filters(
+        csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
+
+    data = csv_input.read_csv(dtypes_override=dtypes_override, filters=filters)
 
-    data['sample_id'] = [a.split('-')[0] for a in data['cell_id']]
-    data['library_id'] = [a.split('-')[1] for a in data['cell_id']]
+    data['cell_id'] = pd.Categorical(data['cell_id'])
+    data['sample_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 0)
+    data['library_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 1)
 
     for col in _categorical_cols:
         if col in data:
@@ -63,10 +63,10 @@ def load_breakpoint_count_data(files):
         data = csv_input.read_csv()
 
         if library_id is not None:
-            data['library_id'] = pd.Series([library_id], dtype="category")
+            data['library_id'] = pd.Series([library_id] * len(data.index), index=data.index, dtype="category")
 
         if sample_id is not None:
-            data['sample_id'] = pd.Series([sample_id], dtype="category")
+            data['sample_id'] = pd.Series([sample_id] * len(data.index), index=data.index, dtype="category")
 
         breakpoint_count_data.append(data)
 
@@ -107,6 +107,11 @@ def load_breakpoint_data(
 
     if 'pseudobulk' in analysis_dirs:
         breakpoint_calling_dir = analysis_dirs['pseudobulk']
+
+        if len(breakpoint_calling_dir) != 1:
+            raise ValueError(f'found {len(breakpoint_calling_dir)} dirs for pseudobulk')
+        breakpoint_calling_dir = breakpoint_calling_dir[0]
+
         annotation_suffix = 'destruct.csv.gz'
         count_suffix = 'cell_counts_destruct.csv.gz'
 
@@ -0,0 +1,206 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+
+
+# Increment to invalidate existing caches when table processing changes
+_cache_version = 1
+
+default_max_size = 20 * 2 ** 30
+
+
+def _normalize_param(value):
+    """ Parameter value with list likes as sorted lists of str, for stable and complete serialization.
+    """
+    if isinstance(value, dict):
+        return {str(k): _normalize_param(v) for k, v in value.items()}
+
+    if isinstance(value, (list, tuple, set, frozenset, np.ndarray, pd.Index, pd.Series)):
+        return sorted(str(a) for a in value)
+
+    return value
+
+
+class TableCache(object):
+    def __init__(self, directory, max_size=default_max_size):
+        """ On disk cache of processed tables with LRU eviction.
+
+        Args:
+            directory (str): directory in which to store cached tables.
+
+        KwArgs:
+            max_size (int, optional): maximum total size in bytes of cached tables. Defaults to 20GB.
+        """
+        self.directory = directory
+        self.max_size = max_size
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_key(self, filepath, load_func, **params):
+        """ Cache key from source file identity and load parameters.
+
+        The identity covers the csv and, when present, its .yaml dtypes
+        sidecar and .parquet sibling.
+
+        Args:
+            filepath (str): source table filename
+            load_func (callable): function used to load and process the table
+
+        KwArgs:
+            params: additional parameters affecting the loaded table
+
+        Returns:
+            str: hex digest key
+        """
+        stat = os.stat(filepath)
+
+        # The yaml dtypes sidecar and the parquet sibling are read in place
+        # of, or alongside, the csv, so regenerating either must change the key
+        sidecars = {}
+        for sidecar_filepath in (filepath + '.yaml', filepath + '.parquet'):
+            if os.path.exists(sidecar_filepath):
+                sidecar_stat = os.stat(sidecar_filepath)
+                sidecars[os.path.basename(sidecar_filepath)] = (sidecar_stat.st_mtime, sidecar_stat.st_size)
+
+        key_data = {
+            'cache_version': _cache_version,
+            'filepath': os.path.abspath(filepath),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'sidecars': sidecars,
+            'load_func': f'{load_func.__module__}.{load_func.__qualname__}',
+            'params': _normalize_param(params),
+        }
+
+        key_data = json.dumps(key_data, sort_keys=True, default=str)
+
+        return hashlib.sha1(key_data.encode()).hexdigest()
+
+    def _get_cache_filename(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def load(self, filepath, load_func, **params):
+        """ Load a table from the cache, or load and cache it.
+
+        Args:
+            filepath (str): source table filename
+            load_func (callable): function called as load_func(filepath, **params) on a cache miss
+
+        KwArgs:
+            params: keyword arguments to load_func, included in the cache key
+
+        Returns:
+            pandas.DataFrame: loaded table
+        """
+        key = self.get_key(filepath, load_func, **params)
+        cache_filename = self._get_cache_filename(key)
+
+        if os.path.exists(cache_filename):
+            try:
+                data = pd.read_pickle(cache_filename)
+            except Exception:
+                logging.exception(f'failed to read cached table {cache_filename}, reloading {filepath}')
+            else:
+                logging.info(f'loaded {filepath} from cache {cache_filename}')
+
+                # Update modification time for LRU eviction
+                os.utime(cache_filename)
+
+                return data
+
+        data = load_func(filepath, **params)
+
+        # Write to a temporary file first so that concurrent loads never
+        # observe a partially written table
+        temp_filename = cache_filename + '.' + uuid.uuid4().hex + '.tmp'
+        data.to_pickle(temp_filename)
+        os.replace(temp_filename, cache_filename)
+
+        logging.info(f'cached {filepath} to {cache_filename}')
+
+        self.evict()
+
+        return data
+
+    def _list_cache_files(self):
+        cache_files = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.pickle'):
+                continue
+            cache_filename = os.path.join(self.directory, filename)
+            try:
+                stat = os.stat(cache_filename)
+            except FileNotFoundError:
+                continue
+            cache_files.append((stat.st_mtime, stat.st_size, cache_filename))
+        return cache_files
+
+    def evict(self):
+        """ Remove least recently used tables until the cache is within max_size.
+        """
+        if self.max_size is None:
+            return
+
+        cache_files = sorted(self._list_cache_files())
+        total_size = sum(a[1] for a in cache_files)
+
+        for mtime, size, cache_filename in cache_files:
+            if total_size <= self.max_size:
+                break
+
+            logging.info(f'evicting {cache_filename} from cache')
+
+            try:
+                os.remove(cache_filename)
+            except FileNotFoundError:
+                pass
+
+            total_size -= size
+
+    def clear(self):
+        """ Remove all cached tables.
+        """
+        for mtime, size, cache_filename in self._list_cache_files():
+            os.remove(cache_filename)
+
+
+def get_cache(cache):
+    """ Get a table cache from a cache or cache directory.
+
+    Args:
+        cache (TableCache or str): cache, cache directory, or None for no caching
+
+    Returns:
+        TableCache: table cache or None
+    """
+    if cache is None or isinstance(cache, TableCache):
+        return cache
+
+    return TableCache(cache)
+
+
+def cached_load(cache, load_func, filepath, **params):
+    """ Load a table with load_func, optionally through a cache.
+
+    Args:
+        cache (TableCache or str): cache, cache directory, or None for no caching
+        load_func (callable): function called as load_func(filepath, **params)
+        filepath (str): source table filename
+
+    KwArgs:
+        params: keyword arguments to load_func, included in the cache key
+
+    Returns:
+        pandas.DataFrame: loaded table
+    """
+    cache = get_cache(cache)
+
+    if cache is None:
+        return load_func(filepath, **params)
+
+    return cache.load(filepath, load_func, **params)
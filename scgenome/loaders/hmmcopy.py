@@ -1,10 +1,13 @@
 import os
 from collections import defaultdict
 
+import numpy as np
 import pandas as pd
 import scgenome.loaders.utils
+import scgenome.loaders.cache
 import scgenome.utils
 import scgenome.csvutils
+import scgenome.refgenome
 import yaml
 
 standard_hmmcopy_reads_cols = [
@@ -25,6 +28,8 @@ _categorical_cols = [
     'library_id',
 ]
 
+memory_profiles = (None, 'compact')
+
 _table_suffixes_v0_0_0 = (
     ('hmmcopy_reads', '_multiplier0_reads.csv.gz'),
     ('hmmcopy_segs', '_multiplier0_segments.csv.gz'),
@@ -56,19 +61,36 @@ table_suffixes = defaultdict(lambda: _table_suffixes_v0_2_25, {
 })
 
 
+def get_hmmcopy_reads_cols(additional_reads_cols=None):
+    """ Columns to load from the hmmcopy reads table
+
+    KwArgs:
+        additional_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
+
+    Returns:
+        list of str: reads table columns
+    """
+    hmmcopy_reads_cols = standard_hmmcopy_reads_cols.copy()
+    if additional_reads_cols is not None:
+        hmmcopy_reads_cols.extend(additional_reads_cols)
+
+    return hmmcopy_reads_cols
+
+
 def load_hmmcopy_data_from_filename(hmmcopy_reads, hmmcopy_segs, hmmcopy_metrics, 
-    additional_reads_cols=None
+    additional_reads_cols=None, cache=None,
+    cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None,
+    memory_profile=None,
 ):
     
     results_tables = {}
 
-    hmmcopy_reads_cols = standard_hmmcopy_reads_cols.copy()
-    if additional_reads_cols is not None:
-        hmmcopy_reads_cols.extend(additional_reads_cols)
+    hmmcopy_reads_cols = get_hmmcopy_reads_cols(additional_reads_cols)
         
-    results_tables["hmmcopy_reads"] = process_hmmcopy_data(hmmcopy_reads, "hmmcopy_reads", usecols=hmmcopy_reads_cols)
-    results_tables["hmmcopy_segs"] = process_hmmcopy_data(hmmcopy_segs, "hmmcopy_segs")
-    results_tables["hmmcopy_metrics"] = process_hmmcopy_data(hmmcopy_metrics, "hmmcopy_metrics")
+    results_tables["hmmcopy_reads"] = process_hmmcopy_data(hmmcopy_reads, "hmmcopy_reads", usecols=hmmcopy_reads_cols, cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes,
+        memory_profile=memory_profile)
+    results_tables["hmmcopy_segs"] = process_hmmcopy_data(hmmcopy_segs, "hmmcopy_segs", cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
+    results_tables["hmmcopy_metrics"] = process_hmmcopy_data(hmmcopy_metrics, "hmmcopy_metrics", cache=cache, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
 
     # FIXUP: older hmmcopy results have total_mapped_reads instead of total_mapped_reads_hmmcopy
     results_tables['hmmcopy_metrics'] = results_tables['hmmcopy_metrics'].rename(
@@ -80,20 +102,14 @@ def load_hmmcopy_data_from_filename(hmmcopy_reads, hmmcopy_segs, hmmcopy_metrics
 
 
 
-def load_hmmcopy_data(
-        results_dir,
-        additional_reads_cols=None,
-):
-    """ Load copy number tables
-    
+def find_hmmcopy_filepaths(results_dir):
+    """ Find hmmcopy tables
+
     Args:
-        results_dir (str): results directory to load from.
+        results_dir (str): results directory to search.
 
-    KwArgs:
-        additional_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
-    
     Returns:
-        dict: pandas.DataFrame tables keyed by table name
+        dict: table filepaths keyed by table name
     """
 
     analysis_dirs = scgenome.loaders.utils.find_results_directories(
@@ -106,10 +122,6 @@ def load_hmmcopy_data(
     assert len(hmmcopy_results_dir) == 1
     hmmcopy_results_dir = hmmcopy_results_dir[0]
 
-    hmmcopy_reads_cols = standard_hmmcopy_reads_cols.copy()
-    if additional_reads_cols is not None:
-        hmmcopy_reads_cols.extend(additional_reads_cols)
-
     manifest_filename = os.path.join(hmmcopy_results_dir, 'metadata.yaml')
     manifest = yaml.load(open(manifest_filename))
 
@@ -119,7 +131,7 @@ def load_hmmcopy_data(
 
     version = manifest['meta']['version']
 
-    results_tables = {}
+    filepaths = {}
 
     for table_name, suffix in table_suffixes[version]:
         filenames = scgenome.loaders.utils.find_filenames(manifest['filenames'], suffix)
@@ -131,11 +143,54 @@ def load_hmmcopy_data(
 
         filepath = os.path.join(hmmcopy_results_dir, filename)
 
+        filepaths[table_name] = filepath
+
+    return filepaths
+
+
+def load_hmmcopy_data(
+        results_dir,
+        additional_reads_cols=None,
+        cache=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+        chromosomes=None,
+        memory_profile=None,
+):
+    """ Load copy number tables
+    
+    Args:
+        results_dir (str): results directory to load from.
+
+    KwArgs:
+        additional_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
+        cache (scgenome.loaders.cache.TableCache or str, optional): cache or cache directory for processed tables. Defaults to None.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+        chromosomes (list of str, optional): Set of chromosomes to filter reads and segments for. Defaults to None.
+        memory_profile (str, optional): 'compact' to load reads with int8 state, int32 coordinates and reads, float32 values and a bin index. Defaults to None.
+    
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    hmmcopy_reads_cols = get_hmmcopy_reads_cols(additional_reads_cols)
+
+    filepaths = find_hmmcopy_filepaths(results_dir)
+
+    results_tables = {}
+
+    for table_name, filepath in filepaths.items():
         usecols = None
         if table_name == 'hmmcopy_reads':
             usecols = hmmcopy_reads_cols
         
-        results_tables[table_name] = process_hmmcopy_data(filepath, table_name, usecols=usecols)
+        results_tables[table_name] = process_hmmcopy_data(
+            filepath, table_name, usecols=usecols, cache=cache,
+            cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes,
+            memory_profile=memory_profile)
 
     return results_tables
     # FIXUP: older hmmcopy results have total_mapped_reads instead of total_mapped_reads_hmmcopy
@@ -147,9 +202,7 @@ def load_hmmcopy_data(
     return results_tables
 
 
-def process_hmmcopy_data(filepath, table_name, usecols=None):
-    csv_input = scgenome.csvutils.CsvInput(filepath)
-
+def _get_dtypes_override(table_name):
     dtypes_override = None
     if table_name == 'hmmcopy_metrics':
         dtypes_directory = os.path.join(os.path.dirname(__file__), 'dtypes')
@@ -166,14 +219,155 @@ def process_hmmcopy_data(filepath, table_name, usecols=None):
         dtypes_filename = os.path.join(dtypes_directory, 'hmmcopy_segments_defs.yaml')
         dtypes_override = yaml.load(open(dtypes_filename))
         dtypes_override = {a['name']: a['dtype'] for a in dtypes_override}
+    return dtypes_override
+
+
+def _get_compact_dtypes():
+    dtypes_directory = os.path.join(os.path.dirname(__file__), 'dtypes')
+    dtypes_filename = os.path.join(dtypes_directory, 'hmmcopy_reads_compact_defs.yaml')
+    compact_dtypes = yaml.load(open(dtypes_filename))
+    compact_dtypes = {a['name']: a['dtype'] for a in compact_dtypes}
+    return compact_dtypes
+
 
-    data = csv_input.read_csv(usecols=usecols, dtypes_override=dtypes_override)
+def process_hmmcopy_data(filepath, table_name, usecols=None, cache=None,
+        cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None,
+        memory_profile=None):
+    if memory_profile not in memory_profiles:
+        raise ValueError(f'unknown memory profile {memory_profile}, expected one of {memory_profiles}')
 
-    data['sample_id'] = [a.split('-')[0] for a in data['cell_id']]
-    data['library_id'] = [a.split('-')[1] for a in data['cell_id']]
+    # Compact dtypes are only defined for reads
+    if table_name != 'hmmcopy_reads':
+        memory_profile = None
+
+    dtypes_override = _get_dtypes_override(table_name)
+
+    return scgenome.loaders.cache.cached_load(
+        cache, _read_hmmcopy_data, filepath,
+        usecols=usecols, dtypes_override=dtypes_override,
+        cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes,
+        memory_profile=memory_profile)
+
+
+def _set_categoricals(data):
+    data['cell_id'] = pd.Categorical(data['cell_id'])
+    data['sample_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 0)
+    data['library_id'] = scgenome.loaders.utils.get_cell_id_field(data['cell_id'], 1)
 
     for col in _categorical_cols:
         if col in data:
             data[col] = pd.Categorical(data[col])
 
+
+def _read_hmmcopy_data(filepath, usecols=None, dtypes_override=None,
+        cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None,
+        memory_profile=None):
+    csv_input = scgenome.csvutils.CsvInput(filepath)
+
+    filters = scgenome.loaders.utils.get_read_filters(
+        csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
+
+    if memory_profile == 'compact':
+        data = _read_compact_hmmcopy_data(
+            csv_input, usecols=usecols, dtypes_override=dtypes_override, filters=filters)
+
+    else:
+        data = csv_input.read_csv(usecols=usecols, dtypes_override=dtypes_override, filters=filters)
+
+    _set_categoricals(data)
+
     return data
+
+
+def _get_genome_bin_index(data):
+    """ Index of each row's bin in the reference genome, so that the same bin
+    has the same index whichever libraries, cells or chromosomes were loaded
+    """
+    if len(data.index) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    bin_size = int((data['end'] - data['start']).max()) + 1
+
+    genome_info = scgenome.refgenome.info
+    chr_codes = genome_info.get_chromosome_codes(data['chr'])
+
+    if (chr_codes < 0).any():
+        unknown_chromosomes = sorted(set(data.loc[chr_codes < 0, 'chr'].astype(str)))
+        raise ValueError(
+            f'chromosomes {unknown_chromosomes} not in reference genome {genome_info.version}, '
+            'set the genome version with scgenome.refgenome.set_genome_version')
+
+    return genome_info.get_bin_index(chr_codes, data['start'].values, bin_size)
+
+
+def _read_compact_hmmcopy_data(csv_input, usecols=None, dtypes_override=None, filters=None, chunksize=10 ** 6):
+    """ Read hmmcopy reads in chunks, downcasting each chunk, and add a genome wide bin index
+    """
+    compact_dtypes = _get_compact_dtypes()
+
+    chunks = []
+    for chunk in csv_input.read_csv(chunksize=chunksize, usecols=usecols, dtypes_override=dtypes_override, filters=filters):
+        scgenome.loaders.utils.downcast_columns(chunk, compact_dtypes)
+        for col in _categorical_cols:
+            if col in chunk:
+                chunk[col] = pd.Categorical(chunk[col])
+        chunks.append(chunk)
+
+    if len(chunks) == 0:
+        data = csv_input.read_csv(usecols=usecols, dtypes_override=dtypes_override, filters=filters)
+        scgenome.loaders.utils.downcast_columns(data, compact_dtypes)
+
+    else:
+        data = scgenome.utils.concat_with_categories(chunks, ignore_index=True)
+
+    if 'chr' in data and 'start' in data and 'end' in data:
+        data['bin'] = _get_genome_bin_index(data)
+        scgenome.loaders.utils.downcast_columns(data, {'bin': compact_dtypes['bin']})
+
+    return data
+
+
+def iter_hmmcopy_reads(
+        filepath,
+        chunksize=10 ** 6,
+        additional_reads_cols=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+        chromosomes=None,
+):
+    """ Iterate over chunks of an hmmcopy reads table with filters applied per chunk
+    
+    Args:
+        filepath (str): hmmcopy reads table filename.
+
+    KwArgs:
+        chunksize (int, optional): number of rows to read per chunk. Defaults to 10 ** 6.
+        additional_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+        chromosomes (list of str, optional): Set of chromosomes to filter for. Defaults to None.
+    
+    Yields:
+        pandas.DataFrame: filtered reads chunk
+    """
+
+    hmmcopy_reads_cols = get_hmmcopy_reads_cols(additional_reads_cols)
+
+    csv_input = scgenome.csvutils.CsvInput(filepath)
+
+    filters = scgenome.loaders.utils.get_read_filters(
+        csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
+
+    reads_chunks = csv_input.read_csv(
+        chunksize=chunksize, usecols=hmmcopy_reads_cols,
+        dtypes_override=_get_dtypes_override('hmmcopy_reads'),
+        filters=filters)
+
+    for data in reads_chunks:
+        data = data.reset_index(drop=True)
+
+        _set_categoricals(data)
+
+        yield data
@@ -1,16 +1,21 @@
 import os
+import time
 import yaml
+import logging
+import concurrent.futures
 import pandas as pd
 
+import scgenome.utils
 import scgenome.loaders.utils
-from scgenome.loaders.align import load_align_data
-from scgenome.loaders.align import load_align_data_from_files
+from scgenome.loaders.align import find_align_filepaths
+from scgenome.loaders.align import process_alignment_data
 
-from scgenome.loaders.hmmcopy import load_hmmcopy_data
-from scgenome.loaders.hmmcopy import load_hmmcopy_data_from_filename
+from scgenome.loaders.hmmcopy import find_hmmcopy_filepaths
+from scgenome.loaders.hmmcopy import get_hmmcopy_reads_cols
+from scgenome.loaders.hmmcopy import process_hmmcopy_data
 
-from scgenome.loaders.annotation import load_annotation_data
-from scgenome.loaders.annotation import load_annotation_data_from_file
+from scgenome.loaders.annotation import find_annotation_filepaths
+from scgenome.loaders.annotation import process_annotation_file
 
 
 def _calculate_annotation_metrics(results_tables):
@@ -72,40 +77,96 @@ def load_cell_state_prediction(results_dir):
     return data
 
 
+def _load_tables(load_tasks, max_workers=None):
+    """ Load a set of tables, optionally in parallel, and log load times.
+
+    Args:
+        load_tasks (dict): tuples of (load_func, args, kwargs) keyed by table name
+
+    KwArgs:
+        max_workers (int, optional): number of threads for loading tables, None or 1 to load serially. Defaults to None.
+
+    Returns:
+        dict: pandas.DataFrame tables keyed by table name
+    """
+
+    def timed_load(table_name):
+        load_func, args, kwargs = load_tasks[table_name]
+        start_time = time.time()
+        data = load_func(*args, **kwargs)
+        return data, time.time() - start_time
+
+    start_time = time.time()
+
+    if max_workers is None or max_workers <= 1:
+        loaded_tables = {table_name: timed_load(table_name) for table_name in load_tasks}
+
+    else:
+        # Decompression and parsing in pandas release the GIL, so threads
+        # avoid pickling the tables back from worker processes
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {table_name: executor.submit(timed_load, table_name) for table_name in load_tasks}
+            loaded_tables = {table_name: future.result() for table_name, future in futures.items()}
+
+    results_tables = {}
+    for table_name, (data, load_time) in loaded_tables.items():
+        logging.info(f'loaded {table_name} with shape {data.shape} in {load_time:.2f}s')
+        results_tables[table_name] = data
+
+    logging.info(f'loaded {len(results_tables)} tables in {time.time() - start_time:.2f}s')
+
+    return results_tables
+
+
 def load_qc_data_from_files(hmmcopy_reads, hmmcopy_segs, 
     hmmcopy_metrics, alignment_metrics, gc_metrics, annotation_metrics=None, 
-    sample_id=None, additional_hmmcopy_reads_cols=None,
+    sample_id=None, additional_hmmcopy_reads_cols=None, cache=None,
+    max_workers=None, cell_ids=None, library_ids=None, chromosomes=None,
+    memory_profile=None,
 ):
 
-    results_tables = load_align_data_from_files(alignment_metrics, 
-        gc_metrics=gc_metrics
-    )
+    cell_filters = dict(cell_ids=cell_ids, sample_ids=sample_id, library_ids=library_ids)
 
-    hmmcopy_results_tables = load_hmmcopy_data_from_filename(hmmcopy_reads, 
-        hmmcopy_segs, hmmcopy_metrics,
-        additional_reads_cols=additional_hmmcopy_reads_cols
-    )
-    results_tables.update(hmmcopy_results_tables)
+    load_tasks = {}
+
+    load_tasks['align_metrics'] = (process_alignment_data, (alignment_metrics, 'align_metrics'), dict(cache=cache, **cell_filters))
+
+    if gc_metrics:
+        load_tasks['gc_metrics'] = (process_alignment_data, (gc_metrics, 'gc_metrics'), dict(cache=cache, **cell_filters))
+
+    hmmcopy_reads_cols = get_hmmcopy_reads_cols(additional_hmmcopy_reads_cols)
+    load_tasks['hmmcopy_reads'] = (process_hmmcopy_data, (hmmcopy_reads, 'hmmcopy_reads'), dict(
+        usecols=hmmcopy_reads_cols, cache=cache, chromosomes=chromosomes, memory_profile=memory_profile, **cell_filters))
+    load_tasks['hmmcopy_segs'] = (process_hmmcopy_data, (hmmcopy_segs, 'hmmcopy_segs'), dict(cache=cache, chromosomes=chromosomes, **cell_filters))
+    load_tasks['hmmcopy_metrics'] = (process_hmmcopy_data, (hmmcopy_metrics, 'hmmcopy_metrics'), dict(cache=cache, **cell_filters))
 
     if annotation_metrics:
-        annotation_results_tables = load_annotation_data_from_file(annotation_metrics)
-    else:
-        annotation_results_tables = _calculate_annotation_metrics(results_tables)
-    results_tables.update(annotation_results_tables)
+        load_tasks['annotation_metrics'] = (process_annotation_file, (annotation_metrics,), dict(is_anno_metrics_table=True, cache=cache, **cell_filters))
 
-  
+    results_tables = _load_tables(load_tasks, max_workers=max_workers)
 
-    if sample_id is not None:
-        results_tables = _sample_id_filter(results_tables, sample_id)
+    # FIXUP: older hmmcopy results have total_mapped_reads instead of total_mapped_reads_hmmcopy
+    results_tables['hmmcopy_metrics'] = results_tables['hmmcopy_metrics'].rename(
+        columns={'total_mapped_reads': 'total_mapped_reads_hmmcopy'})
+
+    if 'annotation_metrics' not in results_tables:
+        results_tables['annotation_metrics'] = _calculate_annotation_metrics(results_tables)
 
-    
     scgenome.utils.union_categories(results_tables.values())
+
     return results_tables
 
+
 def load_qc_data(
         results_dir,
         sample_ids=None,
         additional_hmmcopy_reads_cols=None,
+        cache=None,
+        max_workers=None,
+        cell_ids=None,
+        library_ids=None,
+        chromosomes=None,
+        memory_profile=None,
     ):
     """ Load qc data (align, hmmcopy, annotation)
     
@@ -113,7 +174,15 @@ def load_qc_data(
         results_dir (str): results directory to load from.
         sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
         additional_hmmcopy_reads_cols (list of str, optional): Additional columns to obtain from the reads table. Defaults to None.
+        cache (scgenome.loaders.cache.TableCache or str, optional): cache or cache directory for processed tables. Defaults to None.
+        max_workers (int, optional): number of threads for loading tables in parallel. Defaults to None, load serially.
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+        chromosomes (list of str, optional): Set of chromosomes to filter hmmcopy reads and segments for. Defaults to None.
+        memory_profile (str, optional): 'compact' to load hmmcopy reads with downcast dtypes and a bin index. Defaults to None.
     """
+
+    cell_filters = dict(cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
     
     ticket_results_dirs = scgenome.loaders.utils.find_results_directories(
         results_dir)
@@ -121,27 +190,33 @@ def load_qc_data(
     if len(ticket_results_dirs['align']) != 1:
         raise ValueError(f"found {len(ticket_results_dirs['align'])} directories with align results")
 
-    results_tables = load_align_data(ticket_results_dirs['align'][0])
-
     if len(ticket_results_dirs['hmmcopy']) != 1:
         raise ValueError(f"found {len(ticket_results_dirs['hmmcopy'])} directories with hmmcopy results")
 
-    hmmcopy_results_tables = load_hmmcopy_data(
-        ticket_results_dirs['hmmcopy'][0],
-        additional_reads_cols=additional_hmmcopy_reads_cols)
+    load_tasks = {}
+
+    for table_name, filepath in find_align_filepaths(ticket_results_dirs['align'][0]).items():
+        load_tasks[table_name] = (process_alignment_data, (filepath, table_name), dict(cache=cache, **cell_filters))
 
-    results_tables.update(hmmcopy_results_tables)
+    hmmcopy_reads_cols = get_hmmcopy_reads_cols(additional_hmmcopy_reads_cols)
+    for table_name, filepath in find_hmmcopy_filepaths(ticket_results_dirs['hmmcopy'][0]).items():
+        usecols = None
+        if table_name == 'hmmcopy_reads':
+            usecols = hmmcopy_reads_cols
+        load_tasks[table_name] = (process_hmmcopy_data, (filepath, table_name), dict(
+            usecols=usecols, cache=cache, chromosomes=chromosomes, memory_profile=memory_profile, **cell_filters))
 
     # Load annotation tables if they exist otherwise create merge of hmmcopy/align
     if 'annotation' in ticket_results_dirs:
         if len(ticket_results_dirs['annotation']) != 1:
             raise ValueError(f"found {len(ticket_results_dirs['annotation'])} directories with annotation results")
 
-        annotation_results_tables = load_annotation_data(ticket_results_dirs['annotation'][0])
+        annotation_filepaths = find_annotation_filepaths(ticket_results_dirs['annotation'][0])
+        load_tasks['annotation_metrics'] = (process_annotation_file, (annotation_filepaths['annotation_metrics'],), dict(is_anno_metrics_table=True, cache=cache, **cell_filters))
 
-        results_tables['annotation_metrics'] = annotation_results_tables['annotation_metrics']
+    results_tables = _load_tables(load_tasks, max_workers=max_workers)
 
-    else:
+    if 'annotation_metrics' not in results_tables:
         results_tables['annotation_metrics'] = _calculate_annotation_metrics(results_tables)
 
     # For older results annotation metrics will not contain s phase, load directly
@@ -154,17 +229,6 @@ def load_qc_data(
         results_tables['annotation_metrics'] = results_tables['annotation_metrics'].merge(
             cell_state[['cell_id', 'is_s_phase', 'is_s_phase_prob']].drop_duplicates())
 
-    if sample_ids is not None:
-        results_tables = _sample_id_filter(results_tables, sample_ids)
-
     scgenome.utils.union_categories(results_tables.values())
 
     return results_tables
-
-
-def _sample_id_filter(results_tables, sample_ids):
-    # Optionally select specific samples
-    for table_name, table_data in results_tables.items():
-        results_tables[table_name] = table_data[table_data['sample_id'].isin(sample_ids)]
-
-    return results_tables
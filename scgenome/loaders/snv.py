@@ -26,14 +26,15 @@ categorical_columns = [
 ]
 
 def load_snv_count_data_from_filenames(files, positions, filter_sample_id=None, 
-    filter_library_id=None):
+    filter_library_id=None, cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None):
     return _process_snv_count_data(scgenome.loaders.utils._prep_filenames_for_loading(files),
-        positions, filter_sample_id=filter_sample_id, filter_library_id=filter_library_id
+        positions, filter_sample_id=filter_sample_id, filter_library_id=filter_library_id,
+        cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes
     )
 
 
 def load_snv_count_data(pseudobulk_dir, suffix, positions, filter_sample_id=None, 
-    filter_library_id=None):
+    filter_library_id=None, cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None):
     """ Load per cell SNV count data
     
     Args:
@@ -45,6 +46,10 @@ def load_snv_count_data(pseudobulk_dir, suffix, positions, filter_sample_id=None
         filter_sample_id (str): restrict to specific sample id
         filter_library_id (str): restrict to specific library id
         files: (list of str): optionally pass list of counts filepaths too selectively load count data
+        cell_ids (list of str): restrict to set of cell ids
+        sample_ids (list of str): restrict to set of sample ids
+        library_ids (list of str): restrict to set of library ids
+        chromosomes (list of str): restrict to set of chromosomes
     Returns:
         pandas.DataFrame: SNV alt and ref counts per cell
     """
@@ -53,11 +58,13 @@ def load_snv_count_data(pseudobulk_dir, suffix, positions, filter_sample_id=None
         pseudobulk_dir, suffix)
 
     return _process_snv_count_data(files, positions, filter_sample_id=filter_sample_id, 
-        filter_library_id=filter_library_id
+        filter_library_id=filter_library_id,
+        cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes
     )
 
 
-def _process_snv_count_data(files, positions, filter_sample_id=None, filter_library_id=None):
+def _process_snv_count_data(files, positions, filter_sample_id=None, filter_library_id=None,
+    cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None):
 
     snv_count_data = []
 
@@ -65,16 +72,28 @@ def _process_snv_count_data(files, positions, filter_sample_id=None, filter_libr
         logging.info('Loading snv counts from {}'.format(filepath))
 
         if sample_id is not None and filter_sample_id is not None and sample_id != filter_sample_id:
-            logging.info('skipping {sample_id}', sample_id, filter_sample_id)
+            logging.info(f'skipping {sample_id}, not {filter_sample_id}')
             continue
 
-        if library_id is not None and filter_sample_id is not None and library_id != filter_library_id:
-            logging.info('skipping', library_id, filter_library_id)
+        if library_id is not None and filter_library_id is not None and library_id != filter_library_id:
+            logging.info(f'skipping {library_id}, not {filter_library_id}')
+            continue
+
+        if sample_id is not None and sample_ids is not None and sample_id not in sample_ids:
+            logging.info(f'skipping {sample_id}, not in {sample_ids}')
+            continue
+
+        if library_id is not None and library_ids is not None and library_id not in library_ids:
+            logging.info(f'skipping {library_id}, not in {library_ids}')
             continue
 
         data = []
         csv_input = scgenome.csvutils.CsvInput(filepath)
 
+        filters = scgenome.loaders.utils.get_read_filters(
+            csv_input.columns, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids,
+            chromosomes=chromosomes, chromosome_col='chrom')
+
         chunk_iter = csv_input.read_csv(
             chunksize=10**6,
             dtypes_override={
@@ -85,6 +104,7 @@ def _process_snv_count_data(files, positions, filter_sample_id=None, filter_libr
                 'sample_id': 'category',
                 'library_id': 'category',
             },
+            filters=filters,
         )
 
         for chunk in chunk_iter:
@@ -101,13 +121,17 @@ def _process_snv_count_data(files, positions, filter_sample_id=None, filter_libr
 
             data.append(chunk)
 
+        if len(data) == 0:
+            logging.info(f'skipping {filepath}, no snv counts selected by filters')
+            continue
+
         data = scgenome.utils.concat_with_categories(data, ignore_index=True)
 
         if library_id is not None:
-            data['library_id'] = pd.Series([library_id], dtype="category")
+            data['library_id'] = pd.Series([library_id] * len(data.index), index=data.index, dtype="category")
 
         if sample_id is not None:
-            data['sample_id'] = pd.Series([sample_id], dtype="category")
+            data['sample_id'] = pd.Series([sample_id] * len(data.index), index=data.index, dtype="category")
 
         logging.info(f'Loaded snv counts table with shape {data.shape}, memory {data.memory_usage().sum()}')
 
@@ -120,6 +144,9 @@ def _process_snv_count_data(files, positions, filter_sample_id=None, filter_libr
 
         snv_count_data.append(data)
 
+    if len(snv_count_data) == 0:
+        raise ValueError('no snv counts selected by filters')
+
     snv_count_data = scgenome.utils.concat_with_categories(snv_count_data, ignore_index=True)
 
     logging.info(f'Loaded all snv counts tables with shape {snv_count_data.shape}, memory \
@@ -418,7 +445,11 @@ def load_snv_data_from_files(
     filter_sample_id=None,
     filter_library_id=None,
     snv_annotation=False,
-    snv_counts=False
+    snv_counts=False,
+    cell_ids=None,
+    sample_ids=None,
+    library_ids=None,
+    chromosomes=None,
 ):
 
     """ Load filtered SNV annotation and count data
@@ -443,10 +474,11 @@ def load_snv_data_from_files(
             counts_path,
             positions,
             filter_sample_id=filter_sample_id,
-            filter_library_id=filter_library_id)
+            filter_library_id=filter_library_id,
+            cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
 
         snv_count_data['total_counts'] = snv_count_data['ref_counts'] + snv_count_data['alt_counts']
-        snv_count_data['sample_id'] = snv_count_data['cell_id'].apply(lambda a: a.split('-')[0]).astype('category')
+        snv_count_data['sample_id'] = scgenome.loaders.utils.get_cell_id_field(snv_count_data['cell_id'], 0)
 
         outputs["snv_count_data"] = snv_count_data
 
@@ -460,6 +492,10 @@ def load_snv_data(
         positions=None,
         filter_sample_id=None,
         filter_library_id=None,
+        cell_ids=None,
+        sample_ids=None,
+        library_ids=None,
+        chromosomes=None,
     ):
     """ Load filtered SNV annotation and count data
     
@@ -471,6 +507,10 @@ def load_snv_data(
     Kwargs:
         filter_sample_id (str): restrict to specific sample id
         filter_library_id (str): restrict to specific library id
+        cell_ids (list of str): restrict counts to set of cell ids
+        sample_ids (list of str): restrict counts to set of sample ids
+        library_ids (list of str): restrict counts to set of library ids
+        chromosomes (list of str): restrict counts to set of chromosomes
 
     Returns:
         pandas.DataFrame, pandas.DataFrame: SNV annotations, SNV counts
@@ -482,6 +522,10 @@ def load_snv_data(
     if 'pseudobulk' in analysis_dirs:
         pseudobulk_dir = analysis_dirs['pseudobulk']
 
+        if len(pseudobulk_dir) != 1:
+            raise ValueError(f'found {len(pseudobulk_dir)} dirs for pseudobulk')
+        pseudobulk_dir = pseudobulk_dir[0]
+
         snv_data = load_snv_annotation_results(
             pseudobulk_dir,
             museq_filter=museq_filter,
@@ -491,7 +535,9 @@ def load_snv_data(
 
         positions = snv_data[['chrom', 'coord', 'ref', 'alt']].drop_duplicates()
 
-        snv_count_data = load_snv_count_data(pseudobulk_dir, 'snv_union_counts.csv.gz', positions)
+        snv_count_data = load_snv_count_data(
+            pseudobulk_dir, 'snv_union_counts.csv.gz', positions,
+            cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
         snv_count_data['total_counts'] = snv_count_data['ref_counts'] + snv_count_data['alt_counts']
 
         return {
@@ -550,10 +596,11 @@ def load_snv_data(
             suffix,
             positions,
             filter_sample_id=filter_sample_id,
-            filter_library_id=filter_library_id)
+            filter_library_id=filter_library_id,
+            cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids, chromosomes=chromosomes)
 
         snv_count_data['total_counts'] = snv_count_data['ref_counts'] + snv_count_data['alt_counts']
-        snv_count_data['sample_id'] = snv_count_data['cell_id'].apply(lambda a: a.split('-')[0]).astype('category')
+        snv_count_data['sample_id'] = scgenome.loaders.utils.get_cell_id_field(snv_count_data['cell_id'], 0)
 
         return {
             'snv_count_data': snv_count_data,
@@ -1,13 +1,135 @@
 import os
 import yaml
+import functools
 import collections
 import packaging.version
+import numpy as np
+import pandas as pd
 
 
 def find_filenames(filenames, suffix):
     return [f for f in filenames if f.endswith(suffix)]
 
 
+def get_cell_id_field(cell_ids, field_idx):
+    """ Extract a '-' delimited field of cell ids, eg sample id or library id.
+
+    The field is computed once per unique cell id and mapped back to rows
+    using the categorical codes of the cell ids.
+
+    Args:
+        cell_ids (pandas.Series): cell ids, preferably categorical
+        field_idx (int): index of the field, 0 for sample id, 1 for library id
+
+    Returns:
+        pandas.Categorical: field values with sorted categories
+    """
+    cell_ids = pd.Categorical(cell_ids)
+
+    field_values = cell_ids.categories.astype(str).str.split('-').str[field_idx]
+    field_codes, field_categories = pd.factorize(field_values, sort=True)
+
+    # Append -1 so that missing cell ids with code -1 map to missing
+    field_codes = np.append(field_codes, -1)
+
+    return pd.Categorical.from_codes(
+        field_codes[cell_ids.codes], categories=field_categories)
+
+
+def downcast_columns(data, dtypes):
+    """ Downcast numeric columns in place, rejecting values out of range of the new dtype.
+
+    Args:
+        data (pandas.DataFrame): table to downcast
+        dtypes (dict): dtype keyed by column, non-numeric dtypes and columns not in data are ignored
+
+    Raises:
+        ValueError: values missing from an integer column or out of range of the new dtype
+    """
+    for column, dtype in dtypes.items():
+        if column not in data:
+            continue
+
+        try:
+            dtype = np.dtype(dtype)
+        except TypeError:
+            continue
+
+        if dtype.kind not in 'iuf':
+            continue
+
+        values = data[column]
+
+        if dtype.kind in 'iu':
+            if values.isnull().any():
+                raise ValueError(f'column {column} has missing values, cannot convert to {dtype.name}')
+            info = np.iinfo(dtype)
+        else:
+            values = values[np.isfinite(values)]
+            info = np.finfo(dtype)
+
+        if len(values.index) > 0:
+            min_value, max_value = values.min(), values.max()
+            if min_value < info.min or max_value > info.max:
+                raise ValueError(f'column {column} has values [{min_value}, {max_value}] out of range of {dtype.name}')
+
+        data[column] = data[column].astype(dtype)
+
+
+def _filter_cell_ids(values, cell_ids=None, sample_ids=None, library_ids=None):
+    values = pd.Series(values).astype(str)
+
+    keep = np.ones(len(values.index), dtype=bool)
+
+    if cell_ids is not None:
+        keep &= values.isin(cell_ids).values
+
+    fields = values.str.split('-')
+
+    if sample_ids is not None:
+        keep &= fields.str[0].isin(sample_ids).values
+
+    if library_ids is not None:
+        keep &= fields.str[1].isin(library_ids).values
+
+    return keep
+
+
+def get_read_filters(columns, cell_ids=None, sample_ids=None, library_ids=None, chromosomes=None, chromosome_col='chr'):
+    """ Filters on cells and chromosomes for scgenome.csvutils.CsvInput.read_csv
+
+    Sample and library ids are matched against fields of the cell id, and
+    filters are only created for columns present in the table.
+
+    Args:
+        columns (list of str): columns of the table to be read
+
+    KwArgs:
+        cell_ids (list of str, optional): Set of cell ids to filter for. Defaults to None.
+        sample_ids (list of str, optional): Set of sample ids to filter for. Defaults to None.
+        library_ids (list of str, optional): Set of library ids to filter for. Defaults to None.
+        chromosomes (list of str, optional): Set of chromosomes to filter for. Defaults to None.
+        chromosome_col (str, optional): name of the chromosome column. Defaults to 'chr'.
+
+    Returns:
+        dict: filters keyed by column
+    """
+    filters = {}
+
+    if 'cell_id' in columns:
+        if sample_ids is not None or library_ids is not None:
+            filters['cell_id'] = functools.partial(
+                _filter_cell_ids, cell_ids=cell_ids, sample_ids=sample_ids, library_ids=library_ids)
+
+        elif cell_ids is not None:
+            filters['cell_id'] = list(cell_ids)
+
+    if chromosomes is not None and chromosome_col in columns:
+        filters[chromosome_col] = list(chromosomes)
+
+    return filters
+
+
 def _find_manifest_filenames(results_dir):
     for dirpath, dirnames, filenames in os.walk(results_dir):
         for filename in filenames:
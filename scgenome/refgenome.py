@@ -1,43 +1,171 @@
+import functools
+import importlib.resources
+
 import numpy as np
 import pandas as pd
-import pkg_resources
+
+
+default_genome_version = 'hg19'
+
+_genome_versions = {
+    'hg19': {
+        'package_fasta_index': 'data/GRCh37-lite.fa.fai',
+        'chromosomes': [str(a) for a in range(1, 23)] + ['X', 'Y'],
+    },
+}
+
+_genome_version = default_genome_version
 
 
 def read_chromosome_lengths(genome_fasta_index):
-    fai = pd.read_csv(genome_fasta_index, sep='\t', header=None, names=['chrom', 'length', 'V3', 'V4', 'V5'])
+    fai = pd.read_csv(genome_fasta_index, sep='\t', header=None, names=['chrom', 'length', 'V3', 'V4', 'V5'], dtype={'chrom': str})
     fai = fai.set_index('chrom')['length']
     return fai.to_dict()
 
 
 class RefGenomeInfo(object):
     def __init__(self, version):
-        if version == 'hg19':
-            self.chromosomes = [str(a) for a in range(1, 23)] + ['X', 'Y']
+        """ Chromosome lengths and genome coordinates of a reference genome.
+
+        Args:
+            version (str): genome version, either packaged or added with register_genome_version
+        """
+        if version not in _genome_versions:
+            raise ValueError(f'unknown genome version {version}, expected one of {list(_genome_versions)}')
+
+        genome = _genome_versions[version]
+
+        if 'package_fasta_index' in genome:
+            resource = importlib.resources.files('scgenome').joinpath(genome['package_fasta_index'])
+            with importlib.resources.as_file(resource) as genome_fasta_index:
+                chromosome_lengths = read_chromosome_lengths(genome_fasta_index)
+        else:
+            chromosome_lengths = read_chromosome_lengths(genome['genome_fasta_index'])
+
+        self.version = version
+
+        self.chromosomes = genome['chromosomes']
+        if self.chromosomes is None:
+            self.chromosomes = list(chromosome_lengths.keys())
+
+        self.chromosome_length = pd.Series(chromosome_lengths).reindex(self.chromosomes).astype(int)
+        self.chromosome_length.index.name = 'chr'
+
+        self.chromosome_end = np.cumsum(self.chromosome_length)
+        self.chromosome_start = self.chromosome_end.shift(1)
+        self.chromosome_start[0] = 0
+        self.chromosome_start = self.chromosome_start.astype(int)
+        self.chromosome_mid = (self.chromosome_start + self.chromosome_end) / 2.
+
+        self.chromosome_info = pd.DataFrame({
+            'chromosome_length': self.chromosome_length,
+            'chromosome_end': self.chromosome_end,
+            'chromosome_start': self.chromosome_start,
+            'chromosome_mid': self.chromosome_mid,
+        }).reset_index()
+
+        # Genome offset of each chromosome indexed by chromosome code
+        self.chromosome_index = pd.Index(self.chromosomes, name='chr')
+        self.chromosome_offsets = self.chromosome_start.values.astype(np.int64)
+
+    def get_chromosome_codes(self, chromosomes):
+        """ Codes of chromosomes in the reference chromosome order.
+
+        Args:
+            chromosomes (pandas.Series or numpy.ndarray): chromosome names, categorical series are
+                mapped through their categories only
 
-            genome_fasta_index = pkg_resources.resource_filename('scgenome', 'data/GRCh37-lite.fa.fai')
+        Returns:
+            numpy.ndarray: code of each chromosome, -1 for chromosomes not in the reference
+        """
+        if isinstance(chromosomes, pd.Series) and chromosomes.dtype.name == 'category':
+            category_codes = self.chromosome_index.get_indexer(chromosomes.cat.categories.astype(str))
+            category_codes = np.append(category_codes, -1)
+            return category_codes[chromosomes.cat.codes.values]
 
-            self.chromosome_length = pd.Series(read_chromosome_lengths(genome_fasta_index)).reindex(self.chromosomes).astype(int)
-            self.chromosome_length.index.name = 'chr'
+        return self.chromosome_index.get_indexer(np.asarray(chromosomes).astype(str))
 
-            self.chromosome_end = np.cumsum(self.chromosome_length)
-            self.chromosome_start = self.chromosome_end.shift(1)
-            self.chromosome_start[0] = 0
-            self.chromosome_start = self.chromosome_start.astype(int)
-            self.chromosome_mid = (self.chromosome_start + self.chromosome_end) / 2.
+    def to_genome_coords(self, chr_codes, positions):
+        """ Genome wide coordinates of chromosome positions.
 
-            self.chromosome_info = pd.DataFrame({
-                'chromosome_length': self.chromosome_length,
-                'chromosome_end': self.chromosome_end,
-                'chromosome_start': self.chromosome_start,
-                'chromosome_mid': self.chromosome_mid,
-            }).reset_index()
+        Args:
+            chr_codes (numpy.ndarray): chromosome codes as returned by get_chromosome_codes
+            positions (numpy.ndarray): positions within each chromosome
 
-info = None
+        Returns:
+            numpy.ndarray: positions offset by the start of each chromosome
+        """
+        chr_codes = np.asarray(chr_codes)
+        if (chr_codes < 0).any():
+            raise ValueError('chromosomes not in the reference genome')
+
+        return self.chromosome_offsets[chr_codes] + np.asarray(positions)
+
+    def get_bin_index(self, chr_codes, starts, bin_size):
+        """ Genome wide index of fixed size bins, independent of which bins are present.
+
+        Args:
+            chr_codes (numpy.ndarray): chromosome codes as returned by get_chromosome_codes
+            starts (numpy.ndarray): bin start positions within each chromosome
+            bin_size (int): bin size
+
+        Returns:
+            numpy.ndarray: bin index
+        """
+        chr_codes = np.asarray(chr_codes)
+        if (chr_codes < 0).any():
+            raise ValueError('chromosomes not in the reference genome')
+
+        num_chromosome_bins = -(-self.chromosome_length.values // bin_size)
+        chromosome_bin_offsets = np.concatenate([[0], np.cumsum(num_chromosome_bins)[:-1]]).astype(np.int64)
+
+        return chromosome_bin_offsets[chr_codes] + np.asarray(starts, dtype=np.int64) // bin_size
+
+
+@functools.lru_cache(maxsize=8)
+def get_genome_info(version):
+    """ Reference genome info of a genome version, read on first use.
+
+    Args:
+        version (str): genome version
+
+    Returns:
+        RefGenomeInfo: reference genome info
+    """
+    return RefGenomeInfo(version)
+
+
+def register_genome_version(version, genome_fasta_index, chromosomes=None):
+    """ Add a reference genome from a fasta index, such as GRCh38 or a mouse genome.
+
+    Args:
+        version (str): genome version
+        genome_fasta_index (str): path of the .fai index of the genome fasta
+
+    KwArgs:
+        chromosomes (list of str): chromosomes in genome order, defaults to all sequences in the index
+    """
+    _genome_versions[version] = {
+        'genome_fasta_index': genome_fasta_index,
+        'chromosomes': None if chromosomes is None else [str(a) for a in chromosomes],
+    }
+    get_genome_info.cache_clear()
 
 
 def set_genome_version(version):
-    global info
-    info = RefGenomeInfo(version)
+    """ Set the genome version of `info`.
+
+    Args:
+        version (str): genome version
+    """
+    global _genome_version
+    if version not in _genome_versions:
+        raise ValueError(f'unknown genome version {version}, expected one of {list(_genome_versions)}')
+    _genome_version = version
 
-set_genome_version('hg19')
 
+def __getattr__(name):
+    # Reference genome info is read on first access rather than at import
+    if name == 'info':
+        return get_genome_info(_genome_version)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
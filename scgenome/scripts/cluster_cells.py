@@ -14,7 +14,19 @@ from scgenome import cncluster
     '--plot', '-p', type=click.Path(), default=None,
     help='output plot file'
 )
-def main(cn_path, cl_path, plot):
+@click.option(
+    '--scalable', is_flag=True, default=False,
+    help='float32, randomized pca and approximate nearest neighbors for large numbers of cells, requires umap-learn>=0.5'
+)
+@click.option(
+    '--pca-components', type=int, default=None,
+    help='reduce to this many principal components before umap'
+)
+@click.option(
+    '--n-jobs', type=int, default=None,
+    help='number of threads for nearest neighbors and hdbscan'
+)
+def main(cn_path, cl_path, plot, scalable, pca_components, n_jobs):
     """
     Reduces dimensionality of cell copy number found in CN_PATH, cluster the
     cells using their lower dimension embedding, output table into CL_PATH.
@@ -23,7 +35,8 @@ def main(cn_path, cl_path, plot):
     cn = pd.read_table(
         cn_path, index_col=['chr', 'start', 'end', 'width'], dtype={'chr': str}
     )
-    cl = cncluster.umap_hdbscan_cluster(cn)
+    cl = cncluster.umap_hdbscan_cluster(
+        cn, scalable=scalable, pca_components=pca_components, n_jobs=n_jobs)
     cl.to_csv(cl_path, sep='\t', index=False)
 
     if plot:
@@ -6,13 +6,13 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-from hmmlearn._hmmc import _viterbi
 from scipy.stats import binom
 from matplotlib import collections  as mc
 
 import scgenome.refgenome
 import scgenome.utils
 import scgenome.cnplot
+import scgenome.cnmatrix
 
 
 # TODO: possibly deprecated
@@ -73,30 +73,23 @@ def calculate_haplotype_allele_counts(snp_data, haps, bin_size):
 def plot_vaf_cn_profile(ax, hap_data, allele_cn):
     """ Plot genome wide VAF and predicted CN state for haplotype alleles.
     """
-    allele_cn = allele_cn.copy()
-
     chrom_info = plot_vaf_profile(
         ax, hap_data, 'maf',
         size_field_name='total_counts_sum',
         size_scale=100.,
     )   
 
-    allele_cn['cn_ratio'] = allele_cn['minor_cn'] / allele_cn['total_cn']
-
-    allele_cn = allele_cn[allele_cn['chr'].isin(scgenome.refgenome.info.chromosomes)]
+    chr_codes = scgenome.refgenome.info.get_chromosome_codes(allele_cn['chr'])
+    is_ref = chr_codes >= 0
+    chr_codes = chr_codes[is_ref]
 
-    allele_cn.set_index('chr', inplace=True)
-    allele_cn['chromosome_start'] = scgenome.refgenome.info.chromosome_start
-    allele_cn.reset_index(inplace=True)
+    cn_ratio = (allele_cn['minor_cn'].values / allele_cn['total_cn'].values)[is_ref]
 
-    allele_cn['start'] = allele_cn['start'] + allele_cn['chromosome_start']
-    allele_cn['end'] = allele_cn['end'] + allele_cn['chromosome_start']
-
-    lines = np.zeros((allele_cn.shape[0], 2, 2))
-    lines[:, 0, 0] = allele_cn['start'].values
-    lines[:, 1, 0] = allele_cn['end'].values
-    lines[:, 0, 1] = allele_cn['cn_ratio'].values
-    lines[:, 1, 1] = allele_cn['cn_ratio'].values
+    lines = np.zeros((len(chr_codes), 2, 2))
+    lines[:, 0, 0] = scgenome.refgenome.info.to_genome_coords(chr_codes, allele_cn['start'].values[is_ref])
+    lines[:, 1, 0] = scgenome.refgenome.info.to_genome_coords(chr_codes, allele_cn['end'].values[is_ref])
+    lines[:, 0, 1] = cn_ratio
+    lines[:, 1, 1] = cn_ratio
 
     lc = mc.LineCollection(lines, colors='b', linewidths=1.)
     ax.add_collection(lc)
@@ -107,28 +100,24 @@ def plot_vaf_cn_profile(ax, hap_data, allele_cn):
 def plot_vaf_profile(ax, cn_data, value_field_name, cn_field_name=None, size_field_name=None, size_scale=1.):
     """ Plot genome wide VAF profile for haplotype alleles
     """
-    plot_data = cn_data.copy()
-    plot_data = plot_data[plot_data['chr'].isin(scgenome.refgenome.info.chromosomes)]
-
-    plot_data.set_index('chr', inplace=True)
-    plot_data['chromosome_start'] = scgenome.refgenome.info.chromosome_start
-    plot_data.reset_index(inplace=True)
+    chr_codes = scgenome.refgenome.info.get_chromosome_codes(cn_data['chr'])
+    is_ref = chr_codes >= 0
+    chr_codes = chr_codes[is_ref]
 
-    plot_data['start'] = plot_data['start'] + plot_data['chromosome_start']
-    plot_data['end'] = plot_data['end'] + plot_data['chromosome_start']
+    start = scgenome.refgenome.info.to_genome_coords(chr_codes, cn_data['start'].values[is_ref])
 
     c = '0.75'
     cmap = None
     if cn_field_name is not None:
-        c = plot_data[cn_field_name]
-        cmap = scgenome.cnplot.get_cn_cmap(plot_data[cn_field_name].values)
+        c = cn_data[cn_field_name].values[is_ref]
+        cmap = scgenome.cnplot.get_cn_cmap(c)
 
     s = 1
     if size_field_name is not None:
-        s = plot_data[size_field_name] / size_scale
+        s = cn_data[size_field_name].values[is_ref] / size_scale
 
     ax.scatter(
-        plot_data['start'], plot_data[value_field_name], c=c, s=s, alpha=0.1, cmap=cmap)
+        start, cn_data[value_field_name].values[is_ref], c=c, s=s, alpha=0.1, cmap=cmap)
 
     ax.set_xlim((-0.5, scgenome.refgenome.info.chromosome_end.max()))
     ax.set_xlabel('chromosome')
@@ -142,10 +131,11 @@ def plot_vaf_profile(ax, cn_data, value_field_name, cn_field_name=None, size_fie
 
     seaborn.despine(ax=ax, offset=10, trim=True)
 
-    chrom_info = (
-        plot_data[['chr', 'chromosome_start']]
-        .drop_duplicates()
-        .set_index('chr')['chromosome_start'])
+    plot_chr_codes = pd.unique(chr_codes)
+    chrom_info = pd.Series(
+        scgenome.refgenome.info.chromosome_offsets[plot_chr_codes],
+        index=scgenome.refgenome.info.chromosome_index[plot_chr_codes],
+        name='chromosome_start')
 
     return chrom_info
 
@@ -192,6 +182,8 @@ def infer_allele_cn(clone_cn_data, hap_data, loh_error_rate=0.01):
     minor_cn_data = (pd.DataFrame(l, index=cn.set_index(['cluster_id', 'chr', 'start', 'end', 'hap_label']).index)
         .groupby(level=[0, 1, 2, 3]).sum())
 
+    from hmmlearn._hmmc import _viterbi
+
     minor_cn = pd.DataFrame(index=minor_cn_data.index)
     minor_cn['minor_cn'] = None
 
@@ -262,17 +254,8 @@ def calculate_cluster_allele_cn(
     ):
     """ Infer allele and cluster specific copy number from haplotype allele counts
     """
-    clone_cn_state = (
-        cn_data.merge(clusters[['cell_id', 'cluster_id']])
-        .groupby(['chr', 'start', 'end', 'cluster_id'])['state']
-        .median().astype(int).reset_index())
-
-    clone_cn_copy = (
-        cn_data.merge(clusters[['cell_id', 'cluster_id']])
-        .groupby(['chr', 'start', 'end', 'cluster_id'])['copy']
-        .mean().reset_index())
-
-    clone_cn_data = clone_cn_state.merge(clone_cn_copy)
+    clone_cn_data = scgenome.cnmatrix.get_clone_cn_data(cn_data, clusters)
+    clone_cn_data['state'] = clone_cn_data['state'].astype(int)
 
     clone_cn_data['total_cn'] = clone_cn_data['state']
 
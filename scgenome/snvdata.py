@@ -5,10 +5,6 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 
-import wgs_analysis.snvs.mutsig
-import wgs_analysis.plots.snv
-import wgs_analysis.annotation.position
-
 
 def filter_snv_data(
         snv_data,
@@ -87,6 +83,7 @@ def plot_mutation_signatures(snv_data, snv_class_col, results_prefix):
     """
     Infer mutation signature probabilities and plot.
     """
+    import wgs_analysis.snvs.mutsig
 
     sigs, sig_prob = wgs_analysis.snvs.mutsig.load_signature_probabilities()
 
@@ -139,6 +136,9 @@ def run_mutation_signature_analysis(snv_data, results_prefix):
 
 
 def run_bulk_snv_analysis(snv_data, snv_count_data, filtered_cell_ids, results_prefix=None):
+    import wgs_analysis.plots.snv
+    import wgs_analysis.annotation.position
+
     # Filter cells
     snv_count_data = snv_count_data.merge(filtered_cell_ids)
     total_alt_counts = snv_count_data.groupby(['chrom', 'coord', 'ref', 'alt'], observed=True)['alt_counts'].sum().reset_index()
@@ -6,9 +6,6 @@ import pandas as pd
 import scipy.stats
 import scipy.misc
 
-import dollo.tasks
-import dollo.run
-
 import scgenome.snvphylo
 
 
@@ -173,6 +170,9 @@ def log_likelihood_present(c_m, c_t, e_s, n_v, n_t):
 def compute_dollo_ml_tree(snv_log_likelihoods, leaf_name_groups=None):
     """ Compute the ML tree under the dollo model of SNV evolution
     """
+    import dollo.tasks
+    import dollo.run
+
     trees = dollo.tasks.create_trees(
         snv_log_likelihoods,
         sample_col='cluster_id',
@@ -0,0 +1,504 @@
+import os
+import logging
+import yaml
+import numpy as np
+import pandas as pd
+
+import scgenome.refgenome
+import scgenome.csvutils
+
+
+_bases = np.array(['A', 'C', 'G', 'T'])
+
+_qc_version = 'v0.3.1'
+_pseudobulk_version = 'v0.4.0'
+
+
+def _write_table(data, filepath):
+    scgenome.csvutils.CsvOutput(filepath, header=True).write_df(data)
+
+
+def _write_manifest(results_dir, results_type, version, filenames, **meta):
+    manifest = {
+        'meta': dict(type=results_type, version=version, **meta),
+        'filenames': list(filenames),
+    }
+
+    with open(os.path.join(results_dir, 'metadata.yaml'), 'w') as f:
+        yaml.safe_dump(manifest, f, default_flow_style=False)
+
+
+def get_cell_ids(num_cells, sample_ids=('SA000',), library_ids=('A00000A',)):
+    """ Create cell ids of the form sample-library-row-column.
+
+    Args:
+        num_cells (int): number of cells
+
+    KwArgs:
+        sample_ids (list of str): samples, assigned to cells in turn
+        library_ids (list of str): libraries, assigned to cells in turn
+
+    Returns:
+        list of str: cell ids
+    """
+    cell_ids = []
+    for idx in range(num_cells):
+        sample_id = sample_ids[idx % len(sample_ids)]
+        library_id = library_ids[idx % len(library_ids)]
+        cell_ids.append(f'{sample_id}-{library_id}-R{idx // 72 + 1:02d}-C{idx % 72 + 1:02d}')
+    return cell_ids
+
+
+def get_bins(bin_size=500000, chromosomes=None):
+    """ Create a table of fixed size genome bins.
+
+    KwArgs:
+        bin_size (int): bin size
+        chromosomes (list of str): chromosomes to create bins for, defaults to all reference chromosomes
+
+    Returns:
+        pandas.DataFrame: table of chr, start, end
+    """
+    if chromosomes is None:
+        chromosomes = scgenome.refgenome.info.chromosomes
+
+    bins = []
+    for chrom in chromosomes:
+        starts = np.arange(1, scgenome.refgenome.info.chromosome_length[chrom], bin_size)
+        bins.append(pd.DataFrame({
+            'chr': chrom,
+            'start': starts,
+            'end': starts + bin_size - 1,
+        }))
+    bins = pd.concat(bins, ignore_index=True)
+
+    return bins
+
+
+def simulate_clone_cn(bins, num_clones=3, num_changes=10, max_state=6, seed=None):
+    """ Simulate clone copy number profiles as a diploid ancestor with per clone segment changes.
+
+    Args:
+        bins (pandas.DataFrame): table of chr, start, end
+
+    KwArgs:
+        num_clones (int): number of clones
+        num_changes (int): number of copy number changes per clone
+        max_state (int): maximum copy number state
+        seed (int): random seed
+
+    Returns:
+        numpy.ndarray: bins by clones copy number states
+    """
+    rng = np.random.RandomState(seed)
+
+    chr_bins = bins.groupby('chr', sort=False, observed=True).indices
+
+    clone_states = np.full((len(bins.index), num_clones), 2, dtype=int)
+    for clone_idx in range(num_clones):
+        for _ in range(num_changes):
+            idx = chr_bins[rng.choice(list(chr_bins.keys()))]
+            start, end = np.sort(rng.choice(len(idx) + 1, size=2, replace=False))
+            clone_states[idx[start:end], clone_idx] = rng.randint(0, max_state + 1)
+
+    return clone_states
+
+
+def simulate_cn_data(num_cells=100, bin_size=500000, num_clones=3, sample_ids=('SA000',), library_ids=('A00000A',), seed=None):
+    """ Simulate per cell binned copy number data for a set of clones.
+
+    KwArgs:
+        num_cells (int): number of cells
+        bin_size (int): bin size
+        num_clones (int): number of clones
+        sample_ids (list of str): samples, assigned to cells in turn
+        library_ids (list of str): libraries, assigned to cells in turn
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: hmmcopy reads like copy number table
+        pandas.DataFrame: cluster_id for each cell_id
+    """
+    rng = np.random.RandomState(seed)
+
+    bins = get_bins(bin_size=bin_size)
+    bins['gc'] = rng.uniform(0.3, 0.6, size=len(bins.index))
+    bins['map'] = rng.uniform(0.9, 1., size=len(bins.index))
+
+    clone_states = simulate_clone_cn(bins, num_clones=num_clones, seed=rng.randint(2**31))
+
+    cell_ids = get_cell_ids(num_cells, sample_ids=sample_ids, library_ids=library_ids)
+    cluster_ids = rng.randint(num_clones, size=num_cells)
+
+    states = clone_states[:, cluster_ids]
+    copy = states + rng.normal(0., 0.2, size=states.shape)
+    reads = rng.poisson(np.maximum(states, 0.05) * 50)
+
+    num_bins = len(bins.index)
+    cn_data = bins.iloc[np.tile(np.arange(num_bins), num_cells)].reset_index(drop=True)
+    cn_data['reads'] = reads.T.flatten()
+    cn_data['copy'] = copy.T.flatten()
+    cn_data['state'] = states.T.flatten()
+    cn_data['cell_id'] = np.repeat(cell_ids, num_bins)
+
+    clusters = pd.DataFrame({'cell_id': cell_ids, 'cluster_id': cluster_ids})
+
+    return cn_data, clusters
+
+
+def simulate_cell_metrics(cell_ids, seed=None):
+    """ Simulate per cell qc metrics.
+
+    Args:
+        cell_ids (list of str): cell ids
+
+    KwArgs:
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: metrics table
+    """
+    rng = np.random.RandomState(seed)
+
+    num_cells = len(cell_ids)
+
+    metrics = pd.DataFrame({
+        'cell_id': cell_ids,
+        'total_reads': rng.randint(500000, 2000000, size=num_cells),
+        'total_mapped_reads': rng.randint(100000, 500000, size=num_cells),
+        'mean_copy': rng.uniform(1.8, 3.5, size=num_cells),
+        'state_mode': rng.choice([2, 3, 4], size=num_cells),
+        'order': np.arange(num_cells, dtype=float),
+        'experimental_condition': 'A',
+        'quality': rng.uniform(0., 1., size=num_cells),
+        'is_s_phase': rng.uniform(size=num_cells) < 0.1,
+    })
+
+    return metrics
+
+
+def simulate_snv_data(bins, num_snvs=1000, seed=None):
+    """ Simulate snv positions with annotations.
+
+    Args:
+        bins (pandas.DataFrame): table of chr, start, end
+
+    KwArgs:
+        num_snvs (int): number of snvs
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: table of chrom, coord, ref, alt and annotations
+    """
+    rng = np.random.RandomState(seed)
+
+    snv_bins = bins.iloc[rng.choice(len(bins.index), size=num_snvs)]
+
+    snv_data = pd.DataFrame({
+        'chrom': snv_bins['chr'].values,
+        'coord': snv_bins['start'].values + rng.randint(0, snv_bins['end'].values - snv_bins['start'].values),
+    })
+
+    ref_idx = rng.randint(4, size=num_snvs)
+    snv_data['ref'] = _bases[ref_idx]
+    snv_data['alt'] = _bases[(ref_idx + rng.randint(1, 4, size=num_snvs)) % 4]
+    snv_data = snv_data.drop_duplicates(['chrom', 'coord']).reset_index(drop=True)
+
+    num_snvs = len(snv_data.index)
+    snv_data['mappability'] = rng.choice([1., 0.5], p=[0.95, 0.05], size=num_snvs)
+    snv_data['strelka_score'] = np.where(
+        rng.uniform(size=num_snvs) < 0.9, rng.uniform(20., 100., size=num_snvs), rng.uniform(0., 20., size=num_snvs))
+    snv_data['museq_score'] = np.where(
+        rng.uniform(size=num_snvs) < 0.9, rng.uniform(0.9, 1., size=num_snvs), rng.uniform(0., 0.9, size=num_snvs))
+    snv_data['is_cosmic'] = rng.uniform(size=num_snvs) < 0.05
+    snv_data['is_dbsnp'] = rng.uniform(size=num_snvs) < 0.1
+    snv_data['gene_name'] = [f'GENE{a}' for a in rng.randint(1000, size=num_snvs)]
+    snv_data['effect'] = rng.choice(['missense_variant', 'synonymous_variant', 'intron_variant'], size=num_snvs)
+    snv_data['effect_impact'] = rng.choice(['HIGH', 'MODERATE', 'LOW', 'MODIFIER'], size=num_snvs)
+    snv_data['amino_acid_change'] = np.where(
+        snv_data['effect'] == 'missense_variant', 'p.A1T', None)
+    snv_data['tri_nucleotide_context'] = (
+        _bases[rng.randint(4, size=num_snvs)].astype(object) + snv_data['ref'] +
+        _bases[rng.randint(4, size=num_snvs)].astype(object))
+
+    return snv_data
+
+
+def simulate_snv_count_data(snv_data, clusters, coverage=0.1, seed=None):
+    """ Simulate sparse per cell snv read counts, with each snv present in one clone.
+
+    Args:
+        snv_data (pandas.DataFrame): table of chrom, coord, ref, alt
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    KwArgs:
+        coverage (float): proportion of cells with reads for each snv
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: table of chrom, coord, ref, alt, cell_id, ref_counts, alt_counts
+    """
+    rng = np.random.RandomState(seed)
+
+    num_snvs = len(snv_data.index)
+    num_cells = len(clusters.index)
+
+    covered = rng.uniform(size=(num_snvs, num_cells)) < coverage
+    snv_idx, cell_idx = np.nonzero(covered)
+
+    snv_clone = rng.choice(clusters['cluster_id'].unique(), size=num_snvs)
+    is_present = snv_clone[snv_idx] == clusters['cluster_id'].values[cell_idx]
+
+    total_counts = rng.poisson(3, size=len(snv_idx)) + 1
+    alt_counts = np.where(is_present, rng.binomial(total_counts, 0.5), 0)
+
+    snv_count_data = snv_data[['chrom', 'coord', 'ref', 'alt']].iloc[snv_idx].reset_index(drop=True)
+    snv_count_data['cell_id'] = clusters['cell_id'].values[cell_idx]
+    snv_count_data['ref_counts'] = total_counts - alt_counts
+    snv_count_data['alt_counts'] = alt_counts
+
+    return snv_count_data
+
+
+def simulate_allele_data(cn_data, block_size=50000, seed=None):
+    """ Simulate per cell haplotype block allele read counts consistent with cell copy number.
+
+    Args:
+        cn_data (pandas.DataFrame): copy number table with columns chr, start, end, cell_id, state
+
+    KwArgs:
+        block_size (int): haplotype block size
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: table of chromosome, start, end, hap_label, cell_id, allele_id, readcount
+    """
+    rng = np.random.RandomState(seed)
+
+    # One haplotype block per bin, with a minor allele copy number per bin
+    bins = cn_data[['chr', 'start', 'end']].drop_duplicates().reset_index(drop=True)
+    bins['hap_label'] = np.arange(len(bins.index))
+    bins['minor_fraction'] = rng.choice([0., 0.5, 0.33], p=[0.1, 0.7, 0.2], size=len(bins.index))
+
+    allele_data = cn_data[['chr', 'start', 'end', 'cell_id', 'state']].merge(bins)
+    allele_data['end'] = allele_data['start'] + block_size - 1
+
+    total = rng.poisson(np.maximum(allele_data['state'].values, 0.1) * 2)
+    allele_1 = rng.binomial(total, np.where(allele_data['state'].values > 0, allele_data['minor_fraction'].values, 0.5))
+
+    allele_data = pd.concat([
+        allele_data.assign(allele_id=0, readcount=allele_1),
+        allele_data.assign(allele_id=1, readcount=total - allele_1),
+    ], ignore_index=True)
+    allele_data = allele_data[allele_data['readcount'] > 0]
+
+    allele_data = allele_data.rename(columns={'chr': 'chromosome'})[[
+        'chromosome', 'start', 'end', 'hap_label', 'cell_id', 'allele_id', 'readcount']]
+
+    return allele_data.reset_index(drop=True)
+
+
+def simulate_breakpoint_data(bins, clusters, num_breakpoints=100, seed=None):
+    """ Simulate breakpoints with per cell supporting read counts.
+
+    Args:
+        bins (pandas.DataFrame): table of chr, start, end
+        clusters (pandas.DataFrame): cluster_id for each cell_id
+
+    KwArgs:
+        num_breakpoints (int): number of breakpoints
+        seed (int): random seed
+
+    Returns:
+        pandas.DataFrame: breakpoint annotation table
+        pandas.DataFrame: breakpoint cell counts table
+    """
+    rng = np.random.RandomState(seed)
+
+    breakends = []
+    for side in ('1', '2'):
+        breakend_bins = bins.iloc[rng.choice(len(bins.index), size=num_breakpoints)]
+        breakends.append(pd.DataFrame({
+            'chromosome_' + side: breakend_bins['chr'].values,
+            'strand_' + side: rng.choice(['+', '-'], size=num_breakpoints),
+            'position_' + side: breakend_bins['start'].values + rng.randint(0, breakend_bins['end'].values - breakend_bins['start'].values),
+        }))
+
+    breakpoint_data = pd.concat(breakends, axis=1)
+    breakpoint_data.insert(0, 'prediction_id', np.arange(num_breakpoints))
+    breakpoint_data['type'] = rng.choice(['deletion', 'duplication', 'inversion', 'translocation'], size=num_breakpoints)
+    breakpoint_data['num_reads'] = rng.poisson(10, size=num_breakpoints) + 2
+
+    breakpoint_clone = rng.choice(clusters['cluster_id'].unique(), size=num_breakpoints)
+    breakpoint_count_data = []
+    for prediction_id, cluster_id in enumerate(breakpoint_clone):
+        cell_ids = clusters.loc[clusters['cluster_id'] == cluster_id, 'cell_id'].values
+        cell_ids = cell_ids[rng.uniform(size=len(cell_ids)) < 0.2]
+        breakpoint_count_data.append(pd.DataFrame({
+            'cell_id': cell_ids,
+            'cluster_id': prediction_id,
+            'read_count': rng.poisson(1, size=len(cell_ids)) + 1,
+        }))
+    breakpoint_count_data = pd.concat(breakpoint_count_data, ignore_index=True)
+
+    return breakpoint_data, breakpoint_count_data
+
+
+def write_qc_results(results_dir, cn_data, metrics, prefix='synthetic'):
+    """ Write align, hmmcopy and annotation results in the single cell pipeline layout.
+
+    Args:
+        results_dir (str): ticket results directory
+        cn_data (pandas.DataFrame): hmmcopy reads like copy number table
+        metrics (pandas.DataFrame): per cell metrics table
+
+    KwArgs:
+        prefix (str): prefix of results filenames
+    """
+    align_dir = os.path.join(results_dir, 'alignment')
+    hmmcopy_dir = os.path.join(results_dir, 'hmmcopy')
+    annotation_dir = os.path.join(results_dir, 'annotation')
+
+    for directory in (align_dir, hmmcopy_dir, annotation_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    align_filenames = [f'{prefix}_alignment_metrics.csv.gz', f'{prefix}_gc_metrics.csv.gz']
+    _write_table(
+        metrics[['cell_id', 'total_reads', 'total_mapped_reads']],
+        os.path.join(align_dir, align_filenames[0]))
+    _write_table(
+        metrics[['cell_id']].assign(gc_0=1., gc_1=1.),
+        os.path.join(align_dir, align_filenames[1]))
+    _write_manifest(align_dir, 'alignment', _qc_version, align_filenames)
+
+    segs = cn_data[['chr', 'start', 'end', 'state', 'cell_id']].assign(median=1., multiplier=1)
+    hmmcopy_filenames = [f'{prefix}_reads.csv.gz', f'{prefix}_segments.csv.gz', f'{prefix}_metrics.csv.gz']
+    _write_table(cn_data, os.path.join(hmmcopy_dir, hmmcopy_filenames[0]))
+    _write_table(segs, os.path.join(hmmcopy_dir, hmmcopy_filenames[1]))
+    _write_table(
+        metrics[['cell_id', 'total_mapped_reads', 'mean_copy', 'state_mode', 'order', 'experimental_condition']],
+        os.path.join(hmmcopy_dir, hmmcopy_filenames[2]))
+    _write_manifest(hmmcopy_dir, 'hmmcopy', _qc_version, hmmcopy_filenames)
+
+    annotation_filenames = [f'{prefix}_metrics.csv.gz']
+    _write_table(metrics, os.path.join(annotation_dir, annotation_filenames[0]))
+    _write_manifest(annotation_dir, 'annotation', _qc_version, annotation_filenames)
+
+
+def write_pseudobulk_results(results_dir, snv_data, snv_count_data, allele_data, breakpoint_data, breakpoint_count_data):
+    """ Write snv, haplotype allele and breakpoint results in the pseudobulk layout, one set of files per sample and library.
+
+    Args:
+        results_dir (str): ticket results directory
+        snv_data (pandas.DataFrame): snv positions with annotations
+        snv_count_data (pandas.DataFrame): per cell snv counts
+        allele_data (pandas.DataFrame): per cell haplotype allele counts
+        breakpoint_data (pandas.DataFrame): breakpoint annotations
+        breakpoint_count_data (pandas.DataFrame): breakpoint cell counts
+    """
+    pseudobulk_dir = os.path.join(results_dir, 'pseudobulk')
+    os.makedirs(pseudobulk_dir, exist_ok=True)
+
+    snv_cols = ['chrom', 'coord', 'ref', 'alt']
+
+    snv_tables = {
+        'snv_mappability.csv.gz': snv_data[snv_cols + ['mappability']],
+        'snv_strelka.csv.gz': snv_data[snv_cols].assign(score=snv_data['strelka_score']),
+        'snv_museq.csv.gz': snv_data[snv_cols].assign(score=snv_data['museq_score']),
+        'snv_cosmic_status.csv.gz': snv_data.loc[snv_data['is_cosmic'], snv_cols].assign(id='COSM1'),
+        'snv_snpeff.csv.gz': snv_data[snv_cols + ['gene_name', 'effect', 'effect_impact', 'amino_acid_change']],
+        'snv_dbsnp_status.csv.gz': snv_data[snv_cols].assign(exact_match=snv_data['is_dbsnp'].astype(int)),
+        'snv_trinuc.csv.gz': snv_data[snv_cols + ['tri_nucleotide_context']],
+        'destruct.csv.gz': breakpoint_data,
+    }
+
+    cell_tables = {
+        'snv_union_counts.csv.gz': snv_count_data,
+        'allele_counts.csv': allele_data,
+        'cell_counts_destruct.csv.gz': breakpoint_count_data,
+    }
+
+    cell_ids = pd.concat([data['cell_id'] for data in cell_tables.values()]).unique()
+    sample_libraries = sorted(set(tuple(a.split('-')[:2]) for a in cell_ids))
+
+    filenames = []
+    for sample_id, library_id in sample_libraries:
+        cell_prefix = f'{sample_id}-{library_id}-'
+
+        for suffix, data in snv_tables.items():
+            filename = f'{sample_id}_{library_id}_{suffix}'
+            _write_table(data, os.path.join(pseudobulk_dir, filename))
+            filenames.append(filename)
+
+        for suffix, data in cell_tables.items():
+            filename = f'{sample_id}_{library_id}_{suffix}'
+            _write_table(data[data['cell_id'].str.startswith(cell_prefix)], os.path.join(pseudobulk_dir, filename))
+            filenames.append(filename)
+
+    tumour_samples = [{'sample_id': a, 'library_id': b} for a, b in sample_libraries]
+
+    _write_manifest(pseudobulk_dir, 'pseudobulk', _pseudobulk_version, filenames, tumour_samples=tumour_samples)
+
+
+def generate_results(
+        results_dir,
+        num_cells=100,
+        bin_size=500000,
+        num_clones=3,
+        num_snvs=1000,
+        num_breakpoints=100,
+        sample_ids=('SA000',),
+        library_ids=('A00000A',),
+        seed=None,
+    ):
+    """ Simulate a ticket of qc and pseudobulk results and write them to disk.
+
+    Args:
+        results_dir (str): ticket results directory to create
+
+    KwArgs:
+        num_cells (int): number of cells
+        bin_size (int): copy number bin size
+        num_clones (int): number of clones
+        num_snvs (int): number of snvs
+        num_breakpoints (int): number of breakpoints
+        sample_ids (list of str): samples, assigned to cells in turn
+        library_ids (list of str): libraries, assigned to cells in turn
+        seed (int): random seed
+
+    Returns:
+        dict: simulated tables keyed by name, including clusters of cells into clones
+    """
+    rng = np.random.RandomState(seed)
+
+    def next_seed():
+        return rng.randint(2**31)
+
+    cn_data, clusters = simulate_cn_data(
+        num_cells=num_cells, bin_size=bin_size, num_clones=num_clones,
+        sample_ids=sample_ids, library_ids=library_ids, seed=next_seed())
+    bins = cn_data[['chr', 'start', 'end']].drop_duplicates()
+
+    metrics = simulate_cell_metrics(clusters['cell_id'].values, seed=next_seed())
+    snv_data = simulate_snv_data(bins, num_snvs=num_snvs, seed=next_seed())
+    snv_count_data = simulate_snv_count_data(snv_data, clusters, seed=next_seed())
+    allele_data = simulate_allele_data(cn_data, seed=next_seed())
+    breakpoint_data, breakpoint_count_data = simulate_breakpoint_data(
+        bins, clusters, num_breakpoints=num_breakpoints, seed=next_seed())
+
+    logging.info(f'writing {num_cells} cells, {len(bins.index)} bins to {results_dir}')
+
+    write_qc_results(results_dir, cn_data, metrics)
+    write_pseudobulk_results(
+        results_dir, snv_data, snv_count_data, allele_data, breakpoint_data, breakpoint_count_data)
+
+    return {
+        'cn_data': cn_data,
+        'clusters': clusters,
+        'metrics': metrics,
+        'snv_data': snv_data,
+        'snv_count_data': snv_count_data,
+        'allele_data': allele_data,
+        'breakpoint_data': breakpoint_data,
+        'breakpoint_count_data': breakpoint_count_data,
+    }
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+import scgenome.loaders.cache
+
+
+def _load_cells(filepath, cell_ids=None):
+    data = pd.read_csv(filepath)
+    if cell_ids is not None:
+        data = data[data['cell_id'].isin(cell_ids)]
+    return data
+
+
+def test_cache_key_large_cell_ids(tmp_path):
+    cell_ids = np.array([f'SA000-A00000A-R00-C{a:05d}' for a in range(3000)])
+
+    filepath = str(tmp_path / 'cells.csv')
+    pd.DataFrame({'cell_id': cell_ids, 'value': np.arange(3000)}).to_csv(filepath, index=False)
+
+    cache = scgenome.loaders.cache.TableCache(str(tmp_path / 'cache'))
+
+    # Selections differing in a single cell in the middle
+    cell_ids_1 = cell_ids[:2000]
+    cell_ids_2 = cell_ids_1.copy()
+    cell_ids_2[1000] = cell_ids[2500]
+
+    key_1 = cache.get_key(filepath, _load_cells, cell_ids=cell_ids_1)
+    key_2 = cache.get_key(filepath, _load_cells, cell_ids=cell_ids_2)
+    assert key_1 != key_2
+
+    data_1 = cache.load(filepath, _load_cells, cell_ids=cell_ids_1)
+    data_2 = cache.load(filepath, _load_cells, cell_ids=cell_ids_2)
+    assert set(data_1['cell_id']) == set(cell_ids_1)
+    assert set(data_2['cell_id']) == set(cell_ids_2)
+
+    # Equivalent selections share a key whatever their container and order
+    assert cache.get_key(filepath, _load_cells, cell_ids=set(cell_ids_1)) == key_1
+    assert cache.get_key(filepath, _load_cells, cell_ids=list(cell_ids_1[::-1])) == key_1
@@ -0,0 +1,218 @@
+import pytest
+import numpy as np
+import pandas as pd
+import scipy.stats
+import scipy.spatial.distance
+import matplotlib
+matplotlib.use('agg')
+import matplotlib.pyplot as plt
+
+import scgenome.cnclones
+import scgenome.cnplot
+import scgenome.synthetic
+
+
+def _simulate_data():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=60, bin_size=20000000, num_clones=3, sample_ids=('SA000', 'SA001'), seed=0)
+    metrics_data = scgenome.synthetic.simulate_cell_metrics(clusters['cell_id'].values, seed=0)
+    metrics_data['sample_id'] = metrics_data['cell_id'].str.split('-', expand=True)[0]
+    return cn_data, metrics_data
+
+
+def test_clones_without_prefix_leave_no_open_figures():
+    cn_data, metrics_data = _simulate_data()
+
+    plt.close('all')
+    num_figures = len(plt.get_fignums())
+
+    clusters = scgenome.cnclones.calculate_kmeans_clones(cn_data, metrics_data)
+
+    assert len(plt.get_fignums()) == num_figures
+    assert set(clusters['cell_id']) == set(metrics_data['cell_id'])
+
+
+def test_clones_with_prefix_close_figures(tmp_path):
+    cn_data, metrics_data = _simulate_data()
+    results_prefix = str(tmp_path / 'clones_')
+
+    plt.close('all')
+
+    scgenome.cnclones.calculate_kmeans_clones(cn_data, metrics_data, results_prefix=results_prefix)
+
+    assert len(plt.get_fignums()) == 0
+    assert (tmp_path / 'clones_clone_size.pdf').exists()
+    assert (tmp_path / 'clones_cn_state.pdf').exists()
+
+
+def test_deferred_plots_require_filename():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(num_cells=10, bin_size=20000000, seed=0)
+    cn_data = cn_data.merge(clusters)
+
+    with pytest.raises(ValueError):
+        scgenome.cnclones.plot_clones(cn_data, 'cluster_id', plots=scgenome.cnplot.DeferredPlots())
+
+    fig = scgenome.cnplot.make_plot(
+        scgenome.cnplot.DeferredPlots(), None, plt.figure, return_figure=True)
+    assert fig is not None
+    plt.close(fig)
+
+
+def test_deferred_plots_render_in_workers(tmp_path):
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(num_cells=10, bin_size=20000000, seed=0)
+    cn_data = cn_data.merge(clusters)
+
+    plots = scgenome.cnplot.DeferredPlots()
+    scgenome.cnclones.plot_clones(cn_data, 'cluster_id', plots_prefix=str(tmp_path / 'clones_'), plots=plots)
+
+    plt.close('all')
+
+    filenames = plots.render(max_workers=2)
+
+    assert len(filenames) == 4
+    assert all((tmp_path / a).exists() for a in ('clones_clone_cn.pdf', 'clones_total_cn_profiles.pdf'))
+    assert len(plt.get_fignums()) == 0
+
+
+def _calculate_cell_clone_distances_reference(cn_data, clusters):
+    """ Per clone corrwith implementation of calculate_cell_clone_distances
+    """
+    clone_cn_data = (
+        cn_data
+            .merge(clusters[['cell_id', 'cluster_id']].drop_duplicates())
+            .groupby(['chr', 'start', 'end', 'cluster_id'])
+            .agg({'copy': np.mean})
+            .reset_index()
+    )
+
+    cell_cn_matrix = (
+        cn_data
+            .set_index(['chr', 'start', 'end', 'cell_id'])['copy']
+            .unstack(level=['cell_id']).fillna(0)
+    )
+
+    clone_cn_matrix = (
+        clone_cn_data
+            .set_index(['chr', 'start', 'end', 'cluster_id'])['copy']
+            .unstack(level=['cluster_id']).fillna(0)
+    )
+
+    distance_methods = {
+        'pearsonr': lambda u, v: 1. - scipy.stats.pearsonr(u, v)[0],
+        'spearmanr': lambda u, v: 1. - scipy.stats.spearmanr(u, v)[0],
+        'cityblock': scipy.spatial.distance.cityblock,
+    }
+
+    distances = []
+    for metric, method in distance_methods.items():
+        metric_distances = pd.DataFrame({
+            cluster_id: cell_cn_matrix.corrwith(clone_cn_matrix[cluster_id], method=method)
+            for cluster_id in clone_cn_matrix.columns})
+        metric_distances.columns.name = 'cluster_id'
+        distances.append(metric_distances.stack().rename(metric))
+
+    return pd.concat(distances, axis=1).reset_index()
+
+
+def test_calculate_cell_clone_distances_reference():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=40, bin_size=10000000, num_clones=3, seed=0)
+
+    rng = np.random.RandomState(1)
+
+    # Missing copy values and missing bins
+    cn_data.loc[rng.choice(cn_data.index, size=200, replace=False), 'copy'] = np.nan
+    cn_data = cn_data.drop(rng.choice(cn_data.index, size=100, replace=False))
+
+    # Clone with a single cell
+    clusters.loc[0, 'cluster_id'] = 3
+
+    distances = scgenome.cnclones.calculate_cell_clone_distances(cn_data, clusters, None)
+    expected = _calculate_cell_clone_distances_reference(cn_data, clusters)
+
+    distances = distances.set_index(['cell_id', 'cluster_id']).sort_index()
+    expected = expected.set_index(['cell_id', 'cluster_id']).sort_index()
+
+    assert distances.index.equals(expected.index)
+    for metric in ('pearsonr', 'spearmanr', 'cityblock'):
+        np.testing.assert_allclose(distances[metric].values, expected[metric].values, rtol=1e-4, atol=1e-4)
+
+
+def _compute_mitotic_errors_reference(cn_data, clusters, chromosome_state_diff_threshold=0.75):
+    """ Merge and groupby implementation of compute_mitotic_errors
+    """
+    clone_cn_data = (
+        cn_data
+            .merge(clusters)
+            .groupby(['chr', 'start', 'end', 'cluster_id'])
+            .agg({'copy': np.mean, 'state': np.median})
+            .reset_index()
+    )
+    clone_cn_data['state'] = clone_cn_data['state'].round().astype(int)
+
+    clone_cell_cn = cn_data.merge(clusters[['cell_id', 'cluster_id']])
+    clone_cell_cn = clone_cell_cn.merge(
+        clone_cn_data[['chr', 'start', 'end', 'cluster_id', 'state']].rename(columns={'state': 'clone_cn'}),
+        on=['chr', 'start', 'end', 'cluster_id'])
+    clone_cell_cn['state_diff'] = clone_cell_cn['state'] - clone_cell_cn['clone_cn']
+    clone_cell_cn['bin_size'] = clone_cell_cn['end'] - clone_cell_cn['start'] + 1
+
+    size_state_diff = clone_cell_cn.groupby(['chr', 'cell_id', 'state_diff'])['bin_size'].sum().rename('state_size').reset_index()
+    size_total = clone_cell_cn.groupby(['chr', 'cell_id'])['bin_size'].sum().astype(float).rename('total_size').reset_index()
+    mean_state_diff = size_state_diff.merge(size_total)
+    mean_state_diff['mean_diff'] = mean_state_diff['state_size'] / mean_state_diff['total_size']
+
+    mean_state_diff = mean_state_diff[mean_state_diff['chr'] != 'Y']
+    mean_state_diff = mean_state_diff[mean_state_diff['state_diff'] != 0]
+    mean_state_diff = mean_state_diff[mean_state_diff['mean_diff'] > chromosome_state_diff_threshold]
+
+    return mean_state_diff
+
+
+def test_compute_mitotic_errors_reference():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=30, bin_size=10000000, num_clones=3, seed=0)
+
+    rng = np.random.RandomState(2)
+
+    # Whole chromosome gains and losses in some cells
+    for cell_id in rng.choice(clusters['cell_id'], size=10, replace=False):
+        chrom = rng.choice(['1', '2', '7', 'X'])
+        is_cell_chrom = (cn_data['cell_id'] == cell_id) & (cn_data['chr'] == chrom)
+        cn_data.loc[is_cell_chrom, 'state'] = np.maximum(cn_data.loc[is_cell_chrom, 'state'] + rng.choice([-1, 1]), 0)
+
+    # Missing bins
+    cn_data = cn_data.drop(rng.choice(cn_data.index, size=100, replace=False))
+
+    # Cells assigned to several clusters
+    clusters = pd.concat([clusters, clusters.iloc[:3].assign(cluster_id=lambda df: (df['cluster_id'] + 1) % 3)])
+
+    mean_state_diff = scgenome.cnclones.compute_mitotic_errors(cn_data, clusters, chunk_size=7)
+    expected = _compute_mitotic_errors_reference(cn_data, clusters)
+
+    assert len(expected.index) > 0
+
+    cols = ['chr', 'cell_id', 'state_diff']
+    mean_state_diff = mean_state_diff.astype({'chr': str, 'cell_id': str}).sort_values(cols).reset_index(drop=True)
+    expected = expected.astype({'chr': str, 'cell_id': str}).sort_values(cols).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(mean_state_diff[cols], expected[cols], check_dtype=False)
+    np.testing.assert_array_equal(mean_state_diff['state_size'].values, expected['state_size'].values)
+    np.testing.assert_allclose(mean_state_diff['total_size'].values, expected['total_size'].values)
+    np.testing.assert_allclose(mean_state_diff['mean_diff'].values, expected['mean_diff'].values)
+
+
+def test_compute_mitotic_errors_empty():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=10, bin_size=20000000, num_clones=2, seed=0)
+
+    mean_state_diff = scgenome.cnclones.compute_mitotic_errors(cn_data, clusters)
+
+    assert len(mean_state_diff.index) == 0
+    assert list(mean_state_diff.columns) == ['chr', 'cell_id', 'state_diff', 'state_size', 'total_size', 'mean_diff']
+
+    # No cells of the clusters in the copy number data
+    other_clusters = clusters.assign(cell_id=lambda df: df['cell_id'] + '-other')
+    mean_state_diff = scgenome.cnclones.compute_mitotic_errors(cn_data, other_clusters)
+
+    assert len(mean_state_diff.index) == 0
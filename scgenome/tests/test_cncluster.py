@@ -0,0 +1,78 @@
+import numpy as np
+import scipy.spatial
+import sklearn.cluster
+
+import scgenome.cncluster
+import scgenome.synthetic
+import scgenome.cnmatrix
+
+
+def _compute_bic_reference(kmeans, X):
+    """ Per cluster cdist implementation of compute_bic
+    """
+    centers = [kmeans.cluster_centers_]
+    labels = kmeans.labels_
+    n_clusters = kmeans.n_clusters
+    cluster_sizes = np.bincount(labels)
+    N, d = X.shape
+
+    cl_var = (1.0 / (N - n_clusters) / d) * sum([sum(scipy.spatial.distance.cdist(X[np.where(labels == i)], [centers[0][i]],
+             'euclidean')**2) for i in range(n_clusters)])
+
+    const_term = 0.5 * n_clusters * np.log(N) * (d+1)
+
+    bic = np.sum([cluster_sizes[i] * np.log(cluster_sizes[i]) -
+               cluster_sizes[i] * np.log(N) -
+             ((cluster_sizes[i] * d) / 2) * np.log(2*np.pi*cl_var) -
+             ((cluster_sizes[i] - 1) * d/ 2) for i in range(n_clusters)]) - const_term
+
+    return bic
+
+
+def _get_features():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=80, bin_size=10000000, num_clones=4, seed=0)
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data)
+    return cn, cn.get_values('copy', fill_value=0, dtype=np.float64).T
+
+
+def test_compute_bic():
+    cn, X = _get_features()
+
+    for k in (2, 4, 7):
+        model = sklearn.cluster.KMeans(n_clusters=k, n_init=3, random_state=k).fit(X)
+        assert np.isclose(scgenome.cncluster.compute_bic(model, X), _compute_bic_reference(model, X), rtol=1e-10)
+
+
+def test_kmeans_scores():
+    cn, X = _get_features()
+
+    for score in scgenome.cncluster.kmeans_scorers:
+        clusters = scgenome.cncluster.kmeans_cluster(cn, max_k=8, score=score, random_state=0)
+        assert set(clusters['cell_id']) == set(cn.cell_ids)
+        assert clusters['cluster_id'].nunique() >= 2
+
+
+def test_kmeans_silhouette_deterministic():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=1200, bin_size=20000000, num_clones=4, seed=0)
+    cn = scgenome.cnmatrix.get_cn_matrix(cn_data)
+
+    # More cells than the silhouette sample size, so the score depends on the seed
+    clusters = [
+        scgenome.cncluster.kmeans_cluster(cn, min_k=3, max_k=4, score='silhouette', random_state=0)
+        for _ in range(2)]
+    assert (clusters[0]['cluster_id'].values == clusters[1]['cluster_id'].values).all()
+
+    X = cn.get_values('copy', fill_value=0, dtype=np.float64).T
+    scores = [scgenome.cncluster._fit_kmeans(X, 4, random_state=0, score='silhouette')[1] for _ in range(2)]
+    assert scores[0] == scores[1]
+
+
+def test_kmeans_parallel_matches_serial():
+    cn, X = _get_features()
+
+    serial = scgenome.cncluster.kmeans_cluster(cn, max_k=6, random_state=0)
+    parallel = scgenome.cncluster.kmeans_cluster(cn, max_k=6, random_state=0, max_workers=2)
+
+    assert (serial['cluster_id'].values == parallel['cluster_id'].values).all()
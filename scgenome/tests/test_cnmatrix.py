@@ -0,0 +1,128 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+import scgenome.cnmatrix
+import scgenome.synthetic
+
+
+def _simulate_cn_data():
+    cn_data, clusters = scgenome.synthetic.simulate_cn_data(
+        num_cells=20, bin_size=20000000, num_clones=3, seed=0)
+
+    rng = np.random.RandomState(1)
+
+    # Missing copy values and missing bins
+    cn_data.loc[rng.choice(cn_data.index, size=20, replace=False), 'copy'] = np.nan
+    cn_data = cn_data.drop(rng.choice(cn_data.index, size=20, replace=False)).reset_index(drop=True)
+
+    return cn_data, clusters
+
+
+def test_from_cn_data_duplicate_bins():
+    cn_data, clusters = _simulate_cn_data()
+    cn_data = pd.concat([cn_data, cn_data.iloc[:1]], ignore_index=True)
+
+    with pytest.raises(ValueError, match='duplicate'):
+        scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+
+def test_from_cn_data_integer_nan():
+    cn_data, clusters = _simulate_cn_data()
+    cn_data['state'] = cn_data['state'].astype(float)
+    cn_data.loc[0, 'state'] = np.nan
+
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+    assert cn.data['state'].dtype == np.float32
+    assert np.isnan(cn.get_frame('state').loc[
+        (cn_data.loc[0, 'chr'], cn_data.loc[0, 'start'], cn_data.loc[0, 'end']), cn_data.loc[0, 'cell_id']])
+    assert np.isnan(cn.data['state'][cn.present]).sum() == 1
+
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data.dropna(subset=['state']))
+
+    assert cn.data['state'].dtype == np.int8
+
+
+def test_subset_cells():
+    cn_data, clusters = _simulate_cn_data()
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+    cell_ids = list(cn.cell_ids[[5, 1, 3]])
+    subset = cn.subset_cells(cell_ids)
+
+    assert list(subset.cell_ids) == cell_ids
+    assert subset.shape == (cn.shape[0], 3)
+    for field in cn.fields:
+        pd.testing.assert_frame_equal(subset.get_frame(field), cn.get_frame(field)[cell_ids])
+    np.testing.assert_array_equal(subset.present, cn.present[:, [5, 1, 3]])
+
+    with pytest.raises(ValueError):
+        cn.subset_cells(['unknown'])
+
+
+def test_to_cn_data_round_trip():
+    cn_data, clusters = _simulate_cn_data()
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+    round_trip = cn.to_cn_data()
+
+    assert len(round_trip.index) == len(cn_data.index)
+
+    cols = ['chr', 'start', 'end', 'cell_id']
+    round_trip = round_trip.astype({'chr': str, 'cell_id': str}).sort_values(cols).reset_index(drop=True)
+    expected = cn_data.astype({'chr': str, 'cell_id': str}).sort_values(cols).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(round_trip[cols + ['gc']], expected[cols + ['gc']])
+    np.testing.assert_array_equal(round_trip['state'].values, expected['state'].values)
+    np.testing.assert_allclose(round_trip['copy'].values, expected['copy'].values, rtol=1e-6)
+    np.testing.assert_allclose(round_trip['reads'].values, expected['reads'].values)
+
+
+def test_get_clone_profiles():
+    cn_data, clusters = _simulate_cn_data()
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+    profiles = cn.get_clone_profiles(clusters)
+
+    expected = (
+        cn_data
+            .merge(clusters)
+            .groupby(['cluster_id', 'chr', 'start'])
+            .agg({'copy': np.mean, 'state': np.median}))
+
+    for field in ('copy', 'state'):
+        values = profiles.get_frame(field).droplevel('end').stack().rename(field)
+        values.index = values.index.set_names(['chr', 'start', 'cluster_id'])
+        values = values.reorder_levels(['cluster_id', 'chr', 'start'])
+        values.index = values.index.set_levels(values.index.levels[1].astype(str), level='chr')
+
+        merged = pd.concat([values, expected[field].rename('expected')], axis=1, join='outer')
+        np.testing.assert_allclose(merged[field].values, merged['expected'].values, rtol=1e-5)
+
+
+def test_clone_profiles_memo_invalidation():
+    cn_data, clusters = _simulate_cn_data()
+    cn = scgenome.cnmatrix.CNMatrix.from_cn_data(cn_data)
+
+    profiles = cn.get_clone_profiles(clusters)
+    assert cn.get_clone_profiles(clusters.copy()) is profiles
+
+    # Changed clusters
+    changed_clusters = clusters.copy()
+    changed_clusters.loc[0, 'cluster_id'] = (changed_clusters.loc[0, 'cluster_id'] + 1) % 3
+    assert cn.get_clone_profiles(changed_clusters) is not profiles
+
+    # Matrix values changed in place
+    cn.data['copy'][:, :] += 1.
+    changed_profiles = cn.get_clone_profiles(clusters)
+    assert changed_profiles is not profiles
+    np.testing.assert_allclose(
+        changed_profiles.get_values('copy'), profiles.get_values('copy') + 1., rtol=1e-5)
+
+    # Tables modified in place between calls
+    profiles = scgenome.cnmatrix.get_clone_profiles(cn_data, clusters)
+    cn_data['copy'] += 1.
+    changed_profiles = scgenome.cnmatrix.get_clone_profiles(cn_data, clusters)
+    np.testing.assert_allclose(
+        changed_profiles.get_values('copy'), profiles.get_values('copy') + 1., rtol=1e-5)
@@ -0,0 +1,108 @@
+import os
+import pytest
+import numpy as np
+import pandas as pd
+
+import scgenome.csvutils
+
+
+dtypes_override = {
+    'chr': 'category',
+    'cell_id': 'category',
+}
+
+
+def _write_test_csv(filepath, write_columnar=True):
+    rng = np.random.RandomState(0)
+    num_rows = 1000
+
+    data = pd.DataFrame({
+        'chr': rng.choice(['1', '2', 'X'], num_rows),
+        'start': np.arange(num_rows) * 1000 + 1,
+        'cell_id': rng.choice([f'SA000-A00000A-R01-C{i:02d}' for i in range(10)], num_rows),
+        'copy': rng.uniform(0, 5, num_rows),
+        'state': rng.randint(0, 6, num_rows),
+        'is_s_phase': rng.choice([True, False], num_rows),
+    })
+    data.loc[rng.rand(num_rows) < 0.1, 'copy'] = np.nan
+
+    csv_output = scgenome.csvutils.CsvOutput(filepath)
+    csv_output.write_df(data, write_columnar=write_columnar)
+
+    return data
+
+
+def _read_both(filepath, **kwargs):
+    csv_data = scgenome.csvutils.CsvInput(filepath, use_columnar=False).read_csv(
+        dtypes_override=dtypes_override, **kwargs)
+
+    columnar_input = scgenome.csvutils.CsvInput(filepath)
+    assert columnar_input.has_columnar
+    columnar_data = columnar_input.read_csv(dtypes_override=dtypes_override, **kwargs)
+
+    return csv_data, columnar_data
+
+
+def _assert_frames_equal(left, right):
+    left = left.reset_index(drop=True)
+    right = right.reset_index(drop=True)
+    for col in left:
+        if left[col].dtype.name == 'category':
+            assert right[col].dtype.name == 'category'
+            assert set(left[col].cat.categories) == set(right[col].cat.categories)
+            left[col] = left[col].astype(str)
+            right[col] = right[col].astype(str)
+    pd.testing.assert_frame_equal(left, right)
+
+
+def test_read_columnar_sibling(tmp_path):
+    pytest.importorskip('pyarrow')
+
+    filepath = str(tmp_path / 'test.csv.gz')
+    data = _write_test_csv(filepath)
+
+    assert os.path.exists(filepath + '.parquet')
+
+    csv_data, columnar_data = _read_both(filepath)
+
+    _assert_frames_equal(csv_data, columnar_data)
+    assert list(columnar_data.columns) == list(data.columns)
+    np.testing.assert_array_equal(columnar_data['start'].values, data['start'].values)
+    np.testing.assert_array_equal(columnar_data['copy'].values, data['copy'].values)
+
+
+def test_read_columnar_sibling_usecols_filters(tmp_path):
+    pytest.importorskip('pyarrow')
+
+    filepath = str(tmp_path / 'test.csv.gz')
+    data = _write_test_csv(filepath)
+
+    cell_ids = data['cell_id'].unique()[:3]
+    filters = {'cell_id': cell_ids, 'chr': lambda chromosomes: chromosomes != 'X'}
+
+    csv_data, columnar_data = _read_both(filepath, usecols=['chr', 'start', 'copy'], filters=filters)
+
+    _assert_frames_equal(csv_data, columnar_data)
+    assert list(columnar_data.columns) == ['chr', 'start', 'copy']
+
+    expected = data[data['cell_id'].isin(cell_ids) & (data['chr'] != 'X')]
+    np.testing.assert_array_equal(columnar_data['start'].values, expected['start'].values)
+
+    csv_chunks, columnar_chunks = _read_both(filepath, chunksize=100, filters=filters)
+    _assert_frames_equal(pd.concat(list(csv_chunks)), pd.concat(list(columnar_chunks)))
+
+
+def test_write_columnar_sibling(tmp_path):
+    pytest.importorskip('pyarrow')
+
+    filepath = str(tmp_path / 'test.csv.gz')
+    _write_test_csv(filepath, write_columnar=False)
+
+    assert not scgenome.csvutils.CsvInput(filepath).has_columnar
+
+    columnar_file = scgenome.csvutils.write_columnar_sibling(filepath)
+    assert columnar_file == filepath + '.parquet'
+
+    csv_data, columnar_data = _read_both(filepath)
+
+    _assert_frames_equal(csv_data, columnar_data)
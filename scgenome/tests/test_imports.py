@@ -0,0 +1,57 @@
+import sys
+import json
+import subprocess
+
+
+heavy_modules = [
+    'umap',
+    'numba',
+    'hdbscan',
+    'sklearn',
+    'hmmlearn',
+    'matplotlib',
+    'seaborn',
+]
+
+
+def _import_in_subprocess(module_name):
+    """ Import a module in a fresh interpreter, returning wall time and loaded heavy modules.
+    """
+    code = (
+        'import sys, time, json\n'
+        'start = time.perf_counter()\n'
+        f'import {module_name}\n'
+        'duration = time.perf_counter() - start\n'
+        f'loaded = [m for m in {heavy_modules!r} if m in sys.modules]\n'
+        'print(json.dumps({"duration": duration, "loaded": loaded}))\n'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code],
+        check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_loaders_qc():
+    result = _import_in_subprocess('scgenome.loaders.qc')
+
+    assert result['loaded'] == []
+    assert result['duration'] < 5.
+
+
+def test_import_cnplot():
+    result = _import_in_subprocess('scgenome.cnplot')
+
+    assert 'umap' not in result['loaded']
+    assert 'numba' not in result['loaded']
+    assert 'hdbscan' not in result['loaded']
+    assert 'sklearn' not in result['loaded']
+
+
+def test_import_cnclones():
+    result = _import_in_subprocess('scgenome.cnclones')
+
+    assert 'seaborn' not in result['loaded']
+    assert 'umap' not in result['loaded']
+    assert 'numba' not in result['loaded']
+    assert 'hdbscan' not in result['loaded']
+    assert 'sklearn' not in result['loaded']
@@ -0,0 +1,49 @@
+import pytest
+
+import scgenome.utils
+import scgenome.refgenome
+
+
+def test_register_genome_version(tmp_path):
+    fasta_index = str(tmp_path / 'test.fa.fai')
+    with open(fasta_index, 'w') as f:
+        f.write('chr1\t1000\t6\t60\t61\n')
+        f.write('chr2\t500\t1030\t60\t61\n')
+        f.write('chrM\t100\t1550\t60\t61\n')
+
+    scgenome.refgenome.register_genome_version('test', fasta_index, chromosomes=['chr1', 'chr2'])
+
+    try:
+        scgenome.refgenome.set_genome_version('test')
+
+        info = scgenome.refgenome.info
+        assert info.version == 'test'
+        assert info.chromosomes == ['chr1', 'chr2']
+        assert list(info.chromosome_length) == [1000, 500]
+        assert list(info.chromosome_offsets) == [0, 1000]
+        assert list(info.to_genome_coords(info.get_chromosome_codes(['chr2', 'chr1']), [10, 20])) == [1010, 20]
+        assert list(info.get_chromosome_codes(['chrM'])) == [-1]
+
+        assert scgenome.utils.chrom_names == ['chr1', 'chr2']
+        assert list(scgenome.utils.chrom_idxs['chr']) == ['chr1', 'chr2']
+        assert list(scgenome.utils.chrom_idxs['chr_index']) == [0, 1]
+
+        scgenome.refgenome.set_genome_version(scgenome.refgenome.default_genome_version)
+
+        assert scgenome.refgenome.info.version == 'hg19'
+        assert scgenome.utils.chrom_names[-1] == 'Y'
+
+    finally:
+        scgenome.refgenome.set_genome_version(scgenome.refgenome.default_genome_version)
+        del scgenome.refgenome._genome_versions['test']
+        scgenome.refgenome.get_genome_info.cache_clear()
+
+
+def test_unknown_genome_version():
+    with pytest.raises(ValueError):
+        scgenome.refgenome.set_genome_version('unknown')
+
+    with pytest.raises(ValueError):
+        scgenome.refgenome.get_genome_info('unknown')
+
+    assert scgenome.refgenome.info.version == scgenome.refgenome.default_genome_version
@@ -0,0 +1,112 @@
+import pytest
+import pandas as pd
+
+import scgenome.synthetic
+import scgenome.loaders.qc
+import scgenome.loaders.hmmcopy
+import scgenome.loaders.snv
+import scgenome.loaders.allele
+import scgenome.loaders.breakpoint
+import scgenome.db.qc_from_files
+
+
+def test_load_synthetic_results(tmp_path):
+    results_dir = str(tmp_path / 'SC-0000')
+
+    simulated = scgenome.synthetic.generate_results(
+        results_dir, num_cells=20, bin_size=5000000, num_snvs=100, num_breakpoints=10,
+        sample_ids=('SA000', 'SA001'), seed=0)
+
+    num_cells = len(simulated['clusters'].index)
+    num_bins = len(simulated['cn_data'][['chr', 'start', 'end']].drop_duplicates().index)
+
+    qc_data = scgenome.loaders.qc.load_qc_data(results_dir)
+
+    assert qc_data['hmmcopy_reads'].shape[0] == num_cells * num_bins
+    assert qc_data['annotation_metrics']['cell_id'].nunique() == num_cells
+    assert set(qc_data['hmmcopy_reads']['sample_id'].unique()) == {'SA000', 'SA001'}
+
+    snv_data = scgenome.loaders.snv.load_snv_data(results_dir)
+
+    assert snv_data['snv_data'].shape[0] > 0
+    assert snv_data['snv_count_data']['sample_id'].notnull().all()
+    assert (snv_data['snv_count_data']['total_counts'] > 0).all()
+
+    allele_data = scgenome.loaders.allele.load_haplotype_allele_data(results_dir)
+
+    assert allele_data['allele_counts']['readcount'].sum() == simulated['allele_data']['readcount'].sum()
+
+    breakpoint_data = scgenome.loaders.breakpoint.load_breakpoint_data(results_dir)
+
+    assert breakpoint_data['breakpoint_count_data'].shape[0] == simulated['breakpoint_count_data'].shape[0]
+
+
+def test_load_snv_data_filtered_library(tmp_path):
+    results_dir = str(tmp_path / 'SC-0000')
+
+    simulated = scgenome.synthetic.generate_results(
+        results_dir, num_cells=20, bin_size=5000000, num_snvs=100, num_breakpoints=10,
+        sample_ids=('SA000',), library_ids=('A00000A', 'A00000B'), seed=0)
+
+    # Cells from a single library, the other library is filtered to nothing
+    cell_ids = simulated['clusters'].loc[
+        simulated['clusters']['cell_id'].str.contains('-A00000A-'), 'cell_id'].values[:3]
+
+    snv_data = scgenome.loaders.snv.load_snv_data(results_dir, cell_ids=cell_ids)
+
+    snv_count_data = snv_data['snv_count_data']
+    assert snv_count_data.shape[0] > 0
+    assert set(snv_count_data['cell_id'].unique()) <= set(cell_ids)
+    assert set(snv_count_data['library_id'].unique()) == {'A00000A'}
+
+
+def test_load_results_tables_parallel(tmp_path):
+    load_tasks = []
+    for idx, library_id in enumerate(('A00000A', 'A00000B', 'A00000C')):
+        results_dir = str(tmp_path / f'SC-000{idx}')
+        scgenome.synthetic.generate_results(
+            results_dir, num_cells=10, bin_size=5000000, num_snvs=10, num_breakpoints=5,
+            library_ids=(library_id,), seed=idx)
+        load_tasks.append((scgenome.loaders.qc.load_qc_data, (results_dir,), {}))
+
+    serial = scgenome.db.qc_from_files._load_results_tables(load_tasks)
+    parallel = scgenome.db.qc_from_files._load_results_tables(load_tasks, max_workers=2)
+
+    assert set(serial.keys()) == set(parallel.keys())
+    for table_name in serial:
+        pd.testing.assert_frame_equal(serial[table_name], parallel[table_name])
+    assert serial['hmmcopy_reads']['library_id'].nunique() == 3
+
+
+def test_compact_bin_index_consistent_across_filters(tmp_path):
+    results_dir = str(tmp_path / 'SC-0000')
+
+    simulated = scgenome.synthetic.generate_results(
+        results_dir, num_cells=10, bin_size=5000000, num_snvs=10, num_breakpoints=5, seed=0)
+
+    cell_ids = simulated['clusters']['cell_id'].values
+
+    reads_chr = scgenome.loaders.qc.load_qc_data(
+        results_dir, chromosomes=['2', 'X'], cell_ids=cell_ids[:2], memory_profile='compact')['hmmcopy_reads']
+    reads_all = scgenome.loaders.qc.load_qc_data(
+        results_dir, cell_ids=cell_ids[2:], memory_profile='compact')['hmmcopy_reads']
+
+    bins_chr = reads_chr[['chr', 'start', 'bin']].drop_duplicates().astype({'chr': str})
+    bins_all = reads_all[['chr', 'start', 'bin']].drop_duplicates().astype({'chr': str})
+
+    merged = bins_chr.merge(bins_all, on=['chr', 'start'], suffixes=('_chr', '_all'))
+
+    assert len(merged.index) == len(bins_chr.index) > 0
+    assert (merged['bin_chr'] == merged['bin_all']).all()
+    assert bins_all['bin'].is_unique
+
+
+def test_compact_bin_index_unknown_chromosomes():
+    data = pd.DataFrame({
+        'chr': pd.Categorical(['chr1', 'chr1', '2']),
+        'start': [1, 5000001, 1],
+        'end': [5000000, 10000000, 5000000],
+    })
+
+    with pytest.raises(ValueError, match='chr1'):
+        scgenome.loaders.hmmcopy._get_genome_bin_index(data)
@@ -1,16 +1,76 @@
+import functools
 import pandas as pd
 import numpy as np
-import collections
 
 from . import refgenome
 
 
-chrom_names = refgenome.info.chromosomes
+@functools.lru_cache(maxsize=8)
+def _get_chrom_idxs(info):
+    chrom_idxs = pd.Series(info.chromosomes)
+    chrom_idxs.name = 'chr'
+    chrom_idxs.index.name = 'chr_index'
+    return chrom_idxs.reset_index()
 
-chrom_idxs = pd.Series(chrom_names)
-chrom_idxs.name = 'chr'
-chrom_idxs.index.name = 'chr_index'
-chrom_idxs = chrom_idxs.reset_index()
+
+def __getattr__(name):
+    # Chromosome names and indices follow the current reference genome, read on first access
+    if name == 'chrom_names':
+        return refgenome.info.chromosomes
+    if name == 'chrom_idxs':
+        return _get_chrom_idxs(refgenome.info)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _get_categorical_columns(dfs):
+    """ Names of columns that are categorical in any of the dataframes.
+    """
+    cat_cols = []
+    for df in dfs:
+        for col in df:
+            if df[col].dtype.name == 'category' and col not in cat_cols:
+                cat_cols.append(col)
+    return cat_cols
+
+
+def _get_categories(values):
+    """ Categories of a column as a pandas index, None and nan excluded.
+
+    For categoricals only the categories are read, the values are not scanned.
+    """
+    if values.dtype.name == 'category':
+        return values.cat.categories
+
+    categories = pd.Index(pd.unique(values.values))
+    return categories[~categories.isnull()]
+
+
+def _union_index(indices):
+    """ Union of a list of pandas indices, sorted if the values are orderable.
+    """
+    categories = indices[0]
+    for index in indices[1:]:
+        categories = categories.append(index[~index.isin(categories)])
+
+    try:
+        categories = categories.sort_values()
+    except TypeError:
+        pass
+
+    return categories
+
+
+def _recode_categorical(values, dtype):
+    """ Categorical of a column with the categories of dtype.
+
+    Categoricals are recoded by a lookup of their categories in dtype, without
+    converting values.
+    """
+    if values.dtype.name == 'category':
+        remap = np.append(dtype.categories.get_indexer(values.cat.categories), -1)
+        return pd.Categorical.from_codes(remap[values.cat.codes.values], dtype=dtype)
+
+    return pd.Categorical(values, dtype=dtype)
 
 
 def union_categories(dfs, cat_cols=None):
@@ -22,68 +82,46 @@ def union_categories(dfs, cat_cols=None):
     KwArgs:
         cat_cols (list of str): columns to unify categoricals, default None for any categorical.
     """
+    dfs = list(dfs)
 
     # Infer all categorical columns if not given
     if cat_cols is None:
-        cat_cols = set()
-        for df in dfs:
-            for col in df:
-                if df[col].dtype.name == 'category':
-                    cat_cols.add(col)
-
-    # Get a list of categories for each column
-    col_categories = collections.defaultdict(set)
+        cat_cols = _get_categorical_columns(dfs)
+
     for col in cat_cols:
-        for df in dfs:
-            if col in df:
-                col_categories[col].update(df[col].values)
+        col_dfs = [df for df in dfs if col in df]
+        if len(col_dfs) == 0:
+            continue
 
-    # Remove None and nan as they cannot be in the list of categories
-    for col in col_categories:
-        col_categories[col] = col_categories[col] - set([None, np.nan])
+        dtype = pd.CategoricalDtype(_union_index([_get_categories(df[col]) for df in col_dfs]))
 
-    # Create a pandas index for each set of categories
-    for col, categories in col_categories.items():
-        col_categories[col] = pd.Index(categories)
-
-    # Set all categorical columns as having teh same set of categories
-    for col in cat_cols:
-        for df in dfs:
-            if col in df:
-                df[col] = df[col].astype('category')
-                df[col] = df[col].cat.set_categories(col_categories[col])
+        for df in col_dfs:
+            df[col] = _recode_categorical(df[col], dtype)
 
 
 def concat_with_categories(dfs, **kwargs):
     """ Concatenate dataframes retaining categorical columns
     """
-    # Infer all categorical columns
-    cat_cols = set()
-    for df in dfs:
-        for col in df:
-            if df[col].dtype.name == 'category':
-                cat_cols.add(col)
+    dfs = list(dfs)
 
-    # Get a list of categories for each column
-    col_categories = collections.defaultdict(set)
-    for df in dfs:
-        for col in cat_cols:
-            col_categories[col].update(df[col].values)
+    # Infer all categorical columns
+    cat_cols = _get_categorical_columns(dfs)
 
-    # Remove None and nan as they cannot be in the list of categories
-    for col in col_categories:
-        col_categories[col] = col_categories[col] - set([None, np.nan])
+    # Column order of the concatenated dataframes
+    columns = pd.concat([df.iloc[:0] for df in dfs], **kwargs).columns
 
-    # Create a pandas index for each set of categories
-    for col, categories in col_categories.items():
-        col_categories[col] = pd.Index(categories)
+    data = pd.concat([df.drop(columns=cat_cols, errors='ignore') for df in dfs], **kwargs)
 
-    # Set all categorical columns as having teh same set of categories
-    for df in dfs:
-        for col in cat_cols:
-            df[col] = df[col].astype('category')
-            df[col] = df[col].cat.set_categories(col_categories[col])
+    # Categoricals are concatenated by codes on the union of categories, rows
+    # of dataframes without the column are missing
+    for col in sorted(cat_cols, key=columns.get_loc):
+        dtype = pd.CategoricalDtype(_union_index([_get_categories(df[col]) for df in dfs if col in df]))
 
-    return pd.concat(dfs, **kwargs)
+        values = pd.api.types.union_categoricals([
+            _recode_categorical(df[col], dtype) if col in df else
+            pd.Categorical.from_codes(np.full(len(df.index), -1, dtype=np.int8), dtype=dtype)
+            for df in dfs])
 
+        data.insert(columns.get_loc(col), col, values)
 
+    return data
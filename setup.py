@@ -9,6 +9,9 @@ setup(name='scgenome',
       install_requires=[
           'click', 'numpy', 'matplotlib', 'pandas', 'adjusttext'
       ],
+      extras_require={
+          'columnar': ['pyarrow'],
+      },
       entry_points={
         'console_scripts': [
             'cluster_cells = scgenome.scripts.cluster_cells:main',